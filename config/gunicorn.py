@@ -0,0 +1,68 @@
+## Gunicorn settings for serving config.wsgi in production (docker/production/django/start.sh). Every value can be overridden through the environment, so the same file works on a 1-CPU box and a 16-CPU
+#  one. Run it with: gunicorn config.wsgi:application --config config/gunicorn.py
+
+import multiprocessing
+from os import getenv
+
+bind = getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+workers = int(getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))   ## the usual (2 x CPUs) + 1: while one worker waits on Postgres/Redis another can use the CPU
+
+worker_class = "gthread"   ## The views, the ORM and the cache clients are all synchronous, so threads are what lets one worker overlap requests that wait on I/O. An async (ASGI/uvicorn) worker would
+                           # only run this code in a thread pool anyway, through sync_to_async, and buy nothing
+threads = int(getenv("GUNICORN_THREADS", "4"))
+
+preload_app = True   ## Django, the settings and every app are imported once in the master and the workers are forked from it: workers start in milliseconds instead of each importing everything,
+                     # and the imported code is shared copy-on-write. Nothing opens a connection or a pool at import time (the password hashing pool is created per worker on first use, see
+                     # core_apps/user_auth/hashing.py), and post_fork below drops anything inherited just in case. The catch: a code change needs a full restart, not just a HUP
+
+max_requests = int(getenv("GUNICORN_MAX_REQUESTS", "2000"))   ## recycle a worker after this many requests, so a slow leak can't grow forever; the jitter keeps all workers from restarting at once
+max_requests_jitter = int(getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+timeout = int(getenv("GUNICORN_TIMEOUT", "30"))   ## a worker silent for this long is killed and replaced
+graceful_timeout = int(getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))   ## on HUP/TERM (a reload or a deploy) workers get this long to finish the requests they are serving
+keepalive = int(getenv("GUNICORN_KEEPALIVE", "5"))   ## nginx reuses upstream connections for this many seconds
+
+forwarded_allow_ips = getenv("GUNICORN_FORWARDED_ALLOW_IPS", "*")   ## only nginx can reach the api container, so trust its X-Forwarded-* headers
+
+accesslog = None   ## nginx already writes the access log (with X-Request-ID and X-Django-User); errors go through loguru like everything else
+errorlog = "-"
+loglevel = getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):   ## Each worker is its own process. Without a shared cache (REDIS_URL unset -> LocMemCache) the workers would not share auth lockouts, OTPs, cached users, the email outbox
+                           # or metrics, and a user could be locked out in one worker and not in the next. Refuse to start more than one worker like that. GUNICORN_ALLOW_LOCAL_CACHE=1 overrides
+                           # this for a throwaway box.
+    from django.conf import settings
+
+    backend = settings.CACHES["default"]["BACKEND"]
+    if server.cfg.workers > 1 and backend.endswith("LocMemCache"):
+        message = f"{server.cfg.workers} gunicorn workers but the default cache is {backend}: set REDIS_URL so the workers share one cache"
+        if getenv("GUNICORN_ALLOW_LOCAL_CACHE") != "1":
+            server.log.error(f"{message} (or GUNICORN_ALLOW_LOCAL_CACHE=1 to start anyway)")
+            raise SystemExit(1)
+        server.log.warning(f"{message}. Starting anyway because GUNICORN_ALLOW_LOCAL_CACHE=1.")
+
+    hashers = server.cfg.workers * settings.PASSWORD_HASH_WORKERS   ## every worker forks its own password hashing pool (core_apps/user_auth/hashing.py)
+    if hashers > multiprocessing.cpu_count():
+        server.log.warning(
+            f"{server.cfg.workers} workers x PASSWORD_HASH_WORKERS={settings.PASSWORD_HASH_WORKERS} is {hashers} hashing processes "
+            f"on {multiprocessing.cpu_count()} CPUs: lower PASSWORD_HASH_WORKERS (0 hashes inline)"
+        )
+
+
+def post_fork(server, worker):   ## connections are per process; one inherited from the master would be shared by every worker
+    from django.db import connections
+
+    connections.close_all()
+
+
+def worker_exit(server, worker):   ## a worker being recycled or shut down writes what it still holds in memory instead of losing it
+    from loguru import logger
+
+    from core_apps.common import metrics
+    from core_apps.common.view_recorder import view_recorder
+
+    view_recorder.flush()
+    metrics.registry.flush()
+    logger.complete()
@@ -11,11 +11,14 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import logging.config
 from dotenv import load_dotenv
 from os import getenv, path
 from loguru import logger
 from datetime import timedelta, date
 import cloudinary
+from celery.schedules import crontab
+from core_apps.common.log_context import add_request_context, json_log_format
 
 
 
@@ -86,6 +89,8 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 
 MIDDLEWARE = [
+    'core_apps.common.middleware.RequestContextMiddleware',   ## first, so the request id and query count cover everything below it (sessions, auth, the view)
+    'core_apps.common.middleware.ServerTimingMiddleware',   ## reads what RequestContextMiddleware collected; see PERF_SAMPLE_RATE below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -197,6 +202,7 @@ DEFAULT_PHONE_NUMBER = "+919999999999"
 #      We have to configure it under the REST_FRAMEWORK{} settings here
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "EXCEPTION_HANDLER": "core_apps.user_auth.exceptions.exception_handler",   ## a saturated password hashing pool becomes a 503 with Retry-After
     
     "DEFAULT_AUTHENTICATION_CLASSES":[
         "core_apps.common.cookie_auth.CookieAuthentication"
@@ -204,7 +210,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "core_apps.common.pagination.drf.EstimatedCountPageNumberPagination",   ## PageNumberPagination with a planner-estimated count on big tables (core_apps/common/pagination)
     "PAGE_SIZE": 10,
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
@@ -274,9 +280,72 @@ CELERY_RESULT_BACKEND_ALWAYS_RETRY = True
 CELERY_TASK_TIME_LIMIT = 5 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 60
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_BEAT_SCHEDULE = {   ## the DatabaseScheduler copies these entries into its tables on startup, so they also show up (and can be paused) in the admin
+    "rollup-content-views": {
+        "task": "core_apps.common.tasks.rollup_content_views",
+        "schedule": crontab(minute="*/15"),
+    },
+    "archive-content-views": {
+        "task": "core_apps.common.tasks.archive_content_views",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "drain-email-outbox": {
+        "task": "core_apps.user_auth.tasks.drain_email_outbox",
+        "schedule": crontab(),
+    },
+}
 CELERY_WORKER_SEND_TASK_EVENTS = True
 
 
+## Shared cache. When REDIS_URL is set (the redis service in local.yml), every process (web and celery workers) talks to the same Redis through django-redis. Without it each process falls
+# back to its own in-memory cache, which is fine for running things locally but means nothing cached is shared between processes.
+REDIS_URL = getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "nextgen-bank",
+        }
+    }
+
+METRICS_FLUSH_INTERVAL = 10   ## seconds between pushes of each process's counters/histograms (core_apps/common/metrics.py) into the shared cache, done by a background thread
+
+## ContentView.record_view only buffers the view in memory (core_apps/common/view_recorder.py). Each process writes its buffer with one bulk upsert once it is CONTENT_VIEW_FLUSH_INTERVAL seconds
+# old or holds CONTENT_VIEW_BUFFER_SIZE distinct views. CONTENT_VIEW_BUFFERING = False writes every view straight away (still one upsert).
+CONTENT_VIEW_BUFFERING = getenv("CONTENT_VIEW_BUFFERING", "True") == "True"
+CONTENT_VIEW_FLUSH_INTERVAL = 5
+CONTENT_VIEW_BUFFER_SIZE = 10_000
+
+## ContentView keeps the last CONTENT_VIEW_RETENTION_DAYS days; older rows are moved to ContentViewArchive every night, CONTENT_VIEW_ARCHIVE_BATCH_SIZE rows per transaction. The admin and
+# stats read the ContentViewDaily rollups (core_apps/common/rollups.py), refreshed every 15 minutes by the beat schedule above.
+CONTENT_VIEW_RETENTION_DAYS = 90
+CONTENT_VIEW_ARCHIVE_BATCH_SIZE = 5000
+
+## Admin search (core_apps/common/search.py). The default searches with icontains, which PostgreSQL serves from the pg_trgm GIN indexes added by the user_auth and user_profile migrations.
+# Databases without trigram indexes (SQLite) can use "core_apps.common.search.InvertedIndexSearchBackend" instead: a SearchToken word index kept up to date on save (fill it once with
+# python manage.py rebuild_search_index) that matches search words against the start of indexed words.
+ADMIN_SEARCH_BACKEND = getenv("ADMIN_SEARCH_BACKEND", "core_apps.common.search.DatabaseSearchBackend")
+
+## API and admin list pages count rows with core_apps.common.pagination.estimated_count: on PostgreSQL the table statistics or the planner's estimate, unless that estimate is below
+# PAGINATION_EXACT_COUNT_THRESHOLD rows, in which case an exact COUNT(*) is cheap enough.
+PAGINATION_EXACT_COUNT_THRESHOLD = 10_000
+
+## ServerTimingMiddleware adds PERF_SAMPLE_RATE of all requests (0 to 1) to per-endpoint wall/db/auth histograms, read with python manage.py show_endpoint_timings or at <ADMIN_URL>perf/endpoints/ (superusers only).
+# Counting queries and cache lookups happens for every request anyway (it is cheap); the sample rate only bounds the metric writes. PERF_SERVER_TIMING also returns the numbers to the client in a
+# Server-Timing header, which shows up in the browser's network tab; keep it off in production so timings of internal work aren't handed to everyone.
+PERF_SAMPLE_RATE = float(getenv("PERF_SAMPLE_RATE", "0.1"))
+PERF_SERVER_TIMING = getenv("PERF_SERVER_TIMING", "False") == "True"
+
+
 CLOUDINARY_CLOUD_NAME = getenv("CLOUDINARY_CLOUD_NAME")
 CLOUDINARY_API_KEY = getenv("CLOUDINARY_API_KEY")
 CLOUDINARY_API_SECRET = getenv("CLOUDINARY_API_SECRET")
@@ -295,6 +364,30 @@ COOKIE_HTTPONLY = True
 COOKIE_SECURE = getenv("COOKIE_SECURE", "True") == "True"
 
 
+## CookieAuthentication keeps a compact snapshot of each authenticated user (core_apps/common/user_cache.py) so API requests don't SELECT the user row every time. Entries live
+# AUTH_USER_CACHE_LOCAL_TTL seconds in each process's own LRU (at most AUTH_USER_CACHE_MAX_SIZE of them) and AUTH_USER_CACHE_TTL seconds in the shared cache; any write to a user drops them.
+AUTH_USER_CACHE_ENABLED = getenv("AUTH_USER_CACHE_ENABLED", "True") == "True"
+AUTH_USER_CACHE_TTL = 300
+AUTH_USER_CACHE_LOCAL_TTL = 5
+AUTH_USER_CACHE_MAX_SIZE = 10_000
+
+## Validated access tokens are also cached per process (core_apps/common/cookie_auth.py), each one until its own exp, so repeat requests with the same cookie skip signature verification.
+# Rejected tokens are remembered for AUTH_TOKEN_NEGATIVE_TTL seconds, in a separate AUTH_TOKEN_NEGATIVE_CACHE_MAX_SIZE cache, so a client replaying a bad token doesn't cost a full decode
+# every time and a flood of bad tokens can't push the valid ones out.
+AUTH_TOKEN_CACHE_ENABLED = getenv("AUTH_TOKEN_CACHE_ENABLED", "True") == "True"
+AUTH_TOKEN_CACHE_MAX_SIZE = 10_000
+AUTH_TOKEN_NEGATIVE_CACHE_MAX_SIZE = 1_000
+AUTH_TOKEN_NEGATIVE_TTL = 5
+
+## Password hashing (PBKDF2) can run in a per-process pool of PASSWORD_HASH_WORKERS processes (core_apps/user_auth/hashing.py) instead of on the request worker. At most PASSWORD_HASH_MAX_PENDING
+# hashes may be queued or running per web process; a request that can't get a slot within PASSWORD_HASH_ADMISSION_TIMEOUT seconds gets a 503. The default, 0, hashes inline: every gunicorn
+# worker would otherwise fork a pool of its own ((2 x CPUs + 1) x PASSWORD_HASH_WORKERS processes in all), and hashlib's PBKDF2 releases the GIL, so the worker's other threads keep serving
+# anyway. Set it when running few gunicorn workers on a box with spare cores (config/gunicorn.py warns when workers x PASSWORD_HASH_WORKERS exceeds the CPU count).
+PASSWORD_HASH_WORKERS = int(getenv("PASSWORD_HASH_WORKERS", "0"))
+PASSWORD_HASH_MAX_PENDING = int(getenv("PASSWORD_HASH_MAX_PENDING", "16"))
+PASSWORD_HASH_ADMISSION_TIMEOUT = 2.0
+
+
 LOGGING_CONFIG = None 
 # By default, Django automatically sets up its own logging configuration when the project starts. It uses a setting called LOGGING inside your settings.py file and applies it through:
 
@@ -308,6 +401,9 @@ LOGGING_CONFIG = None
 # HERE WE ARE JUST DISABLING THE DJANGO LOGGING CONFIG, NOT THE LOGS ITSELF FROM DJANGO OR OTHER LIBRARIES, WHICH WILL BE ANYHOW GENERATED
 
 
+WARNING_LEVEL_NO = logger.level("WARNING").no   ## looked up once here instead of inside the sink filters below, which run for every single record
+ERROR_LEVEL_NO = logger.level("ERROR").no
+
 LOGURU_LOGGING = {
     
     "handlers" : [    ## Handlers are responsible for dispatching log messages to their appropriate destinations such as to console or a specific file or email etc
@@ -321,7 +417,7 @@ LOGURU_LOGGING = {
                                                  
             "level": "DEBUG",  ## By this we mean that we are going to store log message of level debug and the levels above debug(info, success and warning)
             
-            "filter": lambda record: record["level"].no <= logger.level("WARNING").no,  ## this filter function checks if the log records is less than or equal to warning level. This means
+            "filter": lambda record: record["level"].no <= WARNING_LEVEL_NO,  ## this filter function checks if the log records is less than or equal to warning level. This means
                                                                                      # that this log file will include the debug, info and warning logs but exclude error and critical logs
                                                                                      # The filter function is called for each log record.It checks if the log level number (record["level"].no)
                                                                                      # is less than or equal to the numeric value of WARNING.
@@ -345,7 +441,10 @@ LOGURU_LOGGING = {
             
             "retention": "30 days",
             
-            "compression": "zip"                                                                                                                                        
+            "compression": "zip",
+
+            "enqueue": True,   ## The request thread only puts the record on a queue; a background thread formats it, writes the file and does the 10MB rotation + zip compression.
+                                # Without this, the request that happened to cross 10MB waited for the whole old file to be zipped
         },
         
         {
@@ -353,7 +452,7 @@ LOGURU_LOGGING = {
                                                  
             "level": "ERROR", 
             
-            "filter": lambda record: record["level"].no >= logger.level("ERROR").no, ## capturing error and critical logs
+            "filter": lambda record: record["level"].no >= ERROR_LEVEL_NO, ## capturing error and critical logs
                                                                                      
             "format": "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}", 
             
@@ -365,16 +464,45 @@ LOGURU_LOGGING = {
             
             "backtrace": True,
             
-            "diagnose": True                                                                                                                                       
-        }
-        
-        
-    ]
+            "diagnose": True,
+
+            "enqueue": True,
+        },
+
+        {
+            "sink": BASE_DIR / "logs/requests.jsonl",   ## Every record as one compact JSON object per line, with the request_id, user_id, route, db_queries and duration_ms of the request (or
+                                                        # Celery task) that logged it, so one request can be followed across nginx ($upstream_http_x_request_id), Django and the workers
+
+            "level": getenv("REQUEST_LOG_LEVEL", "INFO"),   ## RequestContextMiddleware's one-line-per-request summary is logged at DEBUG, so it is left out unless REQUEST_LOG_LEVEL=DEBUG
+                                                             # (the per-request lines are the bulk of this file on a busy server)
+
+            "format": json_log_format,
+
+            "buffering": 65536,   ## passed on to open(): the background thread writes 64KB at a time instead of one write() per line. Lines can sit in the buffer until it fills, the file rotates
+                                  # or the process exits (logger.complete()/logger.remove() flush it)
+
+            "rotation": "50MB",
+
+            "retention": "7 days",
+
+            "compression": "zip",
+
+            "enqueue": True,
+        },
+
+
+    ],
+
+    "patcher": add_request_context,   ## runs once per record, in the thread that logged it (the context lives in a contextvar), before any sink sees the record
 }
 
 logger.configure(**LOGURU_LOGGING)
 
 
+LOG_LEVEL = getenv("LOG_LEVEL", "DEBUG")   ## Level of the stdlib root logger (Django, celery and other libraries); records below it are discarded before a LogRecord is built. DEBUG
+                                           # forwards everything, as before; what keeps that cheap is the InterceptHandler (interceptor.py), which no longer walks the stack per record.
+                                           # django.db.backends only logs SQL when DEBUG is on, so production pays nothing for it. Set LOG_LEVEL=INFO to drop library debug output
+
 LOGGING = {
     
     "version": 1,
@@ -383,9 +511,12 @@ LOGGING = {
     
     "handlers": {"loguru" :{"class": "interceptor.InterceptHandler"}},
     
-    "root": {"handlers": ["loguru"], "level": "DEBUG"}
+    "root": {"handlers": ["loguru"], "level": LOG_LEVEL}
 }
 
+logging.config.dictConfig(LOGGING)   ## LOGGING_CONFIG = None above means Django never applies LOGGING itself, so it is applied here; otherwise the InterceptHandler is never installed
+
+
 
 
 
@@ -43,6 +43,14 @@ DEFAULT_FROM_EMAIL = getenv("DEFAULT_FROM_EMAIL") ## This is the default email a
                                                   ## come from mehran@gmail.com. Instead of hardcoding it, you take it from an environment variable so you can set a different "from" email in production,
                                                   # staging, or local testing. THIS IS THE EMAIL ADDRESS THAT DJANGO USES TO SEND THE EMAIL
 
+EMAIL_BATCH_SIZE = 50   ## how many queued emails one deliver_emails task (core_apps/user_auth/tasks.py) renders and sends over a single SMTP connection
+
+EMAIL_BATCH_WINDOW = 1.0   ## seconds emails wait on the shared outbox so those of concurrent requests go out in one batch (core_apps/user_auth/emails.py); 0 sends each call's emails on their own
+
+EMAIL_RETRY_BACKOFF = 5   ## seconds before the first retry of emails that failed to send; doubles on every retry
+
+EMAIL_RETRY_BACKOFF_MAX = 600   ## upper limit for that retry delay, in seconds
+
 DOMAIN = getenv("DOMAIN") ## This represents your project’s domain name (e.g., mywebsite.com).
 
 MAX_UPLOAD_SIZE = 1 * 1024 * 1024 ## This sets the maximum allowed file size for uploads in your project. Here, it’s set to 1 MB (because 1 * 1024 * 1024 = 1,048,576 bytes = 1 MB). This is used to prevent users
@@ -56,6 +64,14 @@ CSRF_TRUSTED_ORIGINS = ["http://localhost:8080"]  ## CSRF protection exists to m
 
 LOCKOUT_DURATION = timedelta(minutes=1)  ## here LOCKOUT_DURATION is a variable, which is defined so that if a user tries to login multiple times and fails, he is then locked out for 1 minute
 
-LOGGIN_ATTEMPTS : 3   ## here LOGGIN_ATTEMPTS is also a variable and defines the number of login attempts a user can make before being locked out and in this case is 3 attempts
+LOGIN_ATTEMPTS = 3   ## here LOGIN_ATTEMPTS is also a variable and defines the number of login attempts a user can make before being locked out and in this case is 3 attempts
 
 OTP_EXPIRATION = timedelta(minutes=1)   ## here OTP_EXPIRATION is a variable as well and basically defines the time validity of the OTP i.e. after the specified time, the OTP would expire and wont work
+
+OTP_BACKEND = "core_apps.user_auth.otp.CacheOTPBackend"   ## where issued OTPs live (see core_apps/user_auth/otp.py). The cache backend keeps them out of the user table entirely; swap in DatabaseOTPBackend to use the
+                                                          # User.otp / otp_expiry_time columns, or InMemoryOTPBackend for single-process setups
+
+OTP_MAX_ATTEMPTS = 5   ## number of wrong codes accepted for one issued OTP before it is thrown away and the user has to request a new one
+
+PERF_SAMPLE_RATE = 1.0   ## locally every request is timed and gets a Server-Timing header (see base.py); production keeps the 10% default and no header
+PERF_SERVER_TIMING = True
@@ -0,0 +1,51 @@
+from os import getenv
+from django.core.exceptions import ImproperlyConfigured
+from .base import *
+
+## Settings for docker/production/django/start.sh and release.sh (gunicorn). Everything environment-specific comes from the environment (env_file in the compose file); nothing here falls back to a
+# development value.
+
+SECRET_KEY = getenv("SECRET_KEY")
+
+DEBUG = False
+
+SITE_NAME = getenv("SITE_NAME")
+
+ALLOWED_HOSTS = [host.strip() for host in getenv("ALLOWED_HOSTS", getenv("DOMAIN", "")).split(",") if host.strip()]   ## comma separated; defaults to DOMAIN
+
+ADMIN_URL = getenv("ADMIN_URL")
+
+CSRF_TRUSTED_ORIGINS = [f"https://{host}" for host in ALLOWED_HOSTS]
+
+if not REDIS_URL:   ## gunicorn runs several worker processes (config/gunicorn.py refuses to start more than one on LocMemCache): lockouts, OTPs, cached users, the email outbox and metrics have to
+                    # live in one shared cache, so a missing REDIS_URL is a configuration error here rather than a silent fallback
+    raise ImproperlyConfigured("REDIS_URL must be set in production")
+
+## nginx terminates TLS and forwards the original scheme
+SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+SECURE_SSL_REDIRECT = getenv("SECURE_SSL_REDIRECT", "True") == "True"
+SECURE_HSTS_SECONDS = int(getenv("SECURE_HSTS_SECONDS", "60"))   ## start small; raise it once HTTPS is known to work everywhere
+SECURE_HSTS_INCLUDE_SUBDOMAINS = True
+SECURE_CONTENT_TYPE_NOSNIFF = True
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
+COOKIE_SECURE = True   ## the JWT cookies (see COOKIE_* in base.py)
+
+EMAIL_BACKEND = "djcelery_email.backends.CeleryEmailBackend"
+EMAIL_HOST = getenv("EMAIL_HOST")
+EMAIL_PORT = getenv("EMAIL_PORT")
+DEFAULT_FROM_EMAIL = getenv("DEFAULT_FROM_EMAIL")
+EMAIL_BATCH_SIZE = 50
+EMAIL_BATCH_WINDOW = 1.0
+EMAIL_RETRY_BACKOFF = 5
+EMAIL_RETRY_BACKOFF_MAX = 600
+
+DOMAIN = getenv("DOMAIN")
+
+MAX_UPLOAD_SIZE = 1 * 1024 * 1024
+
+LOCKOUT_DURATION = timedelta(minutes=int(getenv("LOCKOUT_MINUTES", "15")))
+LOGIN_ATTEMPTS = int(getenv("LOGIN_ATTEMPTS", "5"))
+OTP_EXPIRATION = timedelta(minutes=5)
+OTP_BACKEND = "core_apps.user_auth.otp.CacheOTPBackend"
+OTP_MAX_ATTEMPTS = 5
@@ -29,7 +29,12 @@ from django.urls import path
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
 from django.conf import settings
+
+from core_apps.common.views import endpoint_timings
+
 urlpatterns = [
+    path(f"{settings.ADMIN_URL}perf/endpoints/", endpoint_timings, name="perf-endpoints"),   ## before admin.site.urls, whose catch-all would otherwise answer this path
+
     path(settings.ADMIN_URL, admin.site.urls),
     
     ## These url for DRF spectactular are by default provided
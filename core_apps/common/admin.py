@@ -1,14 +1,110 @@
+import re
+
 from django.contrib import admin
-from typing import Any
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from django.contrib.admin.utils import lookup_spawns_duplicates
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.contenttypes.admin import GenericTabularInline
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.db.models import Exists, Q, QuerySet, prefetch_related_objects
 from django.http import HttpRequest
 from django.utils.translation import gettext_lazy as _
 
-from .models import ContentView
+from .models import ContentView, ContentViewDaily
+from .pagination import EstimatedCountPaginator
+from .search import search, search_index, split_lookup
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+$")
+MAX_EXACT_NUMBER = 2**31 - 1
+
+
+class OnlyFieldsChangeList(ChangeList):
+    def get_queryset(self, request: HttpRequest, exclude_parameters: Any = None) -> QuerySet:
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.model_admin.list_only:
+            queryset = queryset.only(*self.model_admin.list_only)
+        if self.model_admin.list_prefetch_related:
+            queryset = queryset.prefetch_related(*self.model_admin.list_prefetch_related)
+        return queryset
+
+    def get_results(self, request: HttpRequest) -> None:
+        super().get_results(request)
+        if self.model_admin.list_page_prefetch_related:
+            self.result_list = list(self.result_list)
+            prefetch_related_objects(
+                self.result_list,
+                *(prefetch(self.result_list) for prefetch in self.model_admin.list_page_prefetch_related),
+            )
+
+
+## content_object for one changelist page, with each target's foreign keys joined (their __str__ often reads one, e.g.
+# Profile shows its user's name); only the content types on the page get a queryset
+def content_object_prefetch(objects: List[Any]) -> GenericPrefetch:
+    models = {
+        ContentType.objects.get_for_id(content_type_id).model_class()
+        for content_type_id in {obj.content_type_id for obj in objects}
+    }
+    return GenericPrefetch(
+        "content_object",
+        [model._default_manager.select_related() for model in models if model is not None],
+    )
+
+
+## Keeps a changelist page at a fixed number of queries: list_select_related joins what the columns and __str__ read,
+# list_only limits the loaded columns ("user__email" for related ones), list_prefetch_related covers generic relations
+# and list_page_prefetch_related builds lookups from the page's rows. Pages are counted with EstimatedCountPaginator
+class ChangeListQueryMixin:
+    list_only: Sequence[str] = ()
+    list_prefetch_related: Sequence[str] = ()
+    list_page_prefetch_related: Sequence[Callable[[List[Any]], Any]] = ()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request: HttpRequest, **kwargs: Any):
+        return OnlyFieldsChangeList
+
+
+## Admin search through search.py. A term that looks like an email is matched exactly on search_email_fields, an all-digit one
+# on search_number_fields, and the general search only matches when that finds nothing (same query, behind NOT EXISTS)
+class SearchMixin:
+    search_email_fields: Sequence[str] = ()
+    search_number_fields: Sequence[str] = ()
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        search_index.register(self.model, self.search_fields)
+
+    def exact_match(self, queryset: QuerySet, term: str) -> Optional[QuerySet]:
+        condition = Q()
+        if EMAIL_RE.match(term):
+            for lookup in self.search_email_fields:
+                condition |= Q(**{f"{lookup}__iexact": term})
+        elif term.isdigit() and int(term) <= MAX_EXACT_NUMBER:
+            for lookup in self.search_number_fields:
+                condition |= Q(**{lookup: int(term)})
+        return queryset.filter(condition) if condition else None
+
+    def get_search_results(
+        self, request: HttpRequest, queryset: QuerySet, search_term: str
+    ) -> Tuple[QuerySet, bool]:
+        term = search_term.strip()
+        search_fields = self.get_search_fields(request)
+        if not term or not search_fields:
+            return queryset, False
+
+        may_have_duplicates = any(
+            lookup_spawns_duplicates(self.opts, split_lookup(lookup)[1]) for lookup in search_fields
+        )
+        results = search(queryset, search_fields, term)
+        exact = self.exact_match(queryset, term)
+        if exact is not None:
+            results = exact | results.filter(~Exists(exact))
+        return results, may_have_duplicates
 
 
 @admin.register(ContentView)
-class ContentViewAdmin(admin.ModelAdmin):
+class ContentViewAdmin(ChangeListQueryMixin, admin.ModelAdmin):
     list_display = [
         "content_object",
         "content_type",
@@ -17,8 +113,11 @@ class ContentViewAdmin(admin.ModelAdmin):
         "last_viewed",
         "created_at",
     ]
-    list_filter = ["content_type", "last_viewed", "created_at"]
-    date_hierarchy = "last_viewed"
+    list_select_related = ["content_type", "user"]
+    list_page_prefetch_related = [content_object_prefetch]
+    # No date_hierarchy or created_at filter here: both scan the whole table. Use the
+    # daily rollups below for anything by date.
+    list_filter = ["content_type", "last_viewed"]
     readonly_fields = [
         "content_type",
         "object_id",
@@ -44,6 +143,30 @@ class ContentViewAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(ContentViewDaily)
+class ContentViewDailyAdmin(ChangeListQueryMixin, admin.ModelAdmin):
+    list_display = ["day", "content_object", "content_type", "views", "unique_viewers"]
+    list_select_related = ["content_type"]
+    list_page_prefetch_related = [content_object_prefetch]
+    list_filter = ["content_type"]
+    date_hierarchy = "day"
+    ordering = ["-day", "-views"]
+    readonly_fields = [
+        "day",
+        "content_type",
+        "object_id",
+        "content_object",
+        "views",
+        "unique_viewers",
+    ]
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj: Any = None) -> bool:
+        return False
+
+
 class ContentViewInline(GenericTabularInline):
     model = ContentView
     extra = 0
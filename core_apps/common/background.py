@@ -0,0 +1,41 @@
+import os
+import threading
+import time
+from typing import Callable
+
+from loguru import logger
+
+
+## Calls flush every interval() seconds from a daemon thread, started by the first start() in each process (threads don't survive
+# fork(), so each gunicorn worker starts its own). interval() is re-read before every sleep
+class PeriodicFlusher:
+    def __init__(self, flush: Callable[[], None], interval: Callable[[], float], name: str) -> None:
+        self.flush = flush
+        self.interval = interval
+        self.name = name
+        self._lock = threading.Lock()
+        self._pid = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            threading.Thread(target=self._run, name=self.name, daemon=True).start()
+            self._pid = pid
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(max(0.01, self.interval()))
+            try:
+                self.flush()
+            except Exception:
+                logger.exception(f"{self.name} failed")
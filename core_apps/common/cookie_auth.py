@@ -1,12 +1,29 @@
-from typing import Optional, Tuple
+import hashlib
+import time
+from typing import Optional, Tuple, Union
 
 from django.conf import settings
+from django.utils.translation import gettext_lazy as _
 from loguru import logger
 from rest_framework.request import Request
 from rest_framework_simplejwt.authentication import AuthUser, JWTAuthentication
-from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import Token
 
+from .cache import TTLCache
+from .log_context import add_auth_time, set_user_id
+from .user_cache import user_cache
+
+# Validated access tokens keyed by a hash of the raw token. A browser sends the same
+# cookie on every request for the token's whole lifetime, so after the first request
+# the signature check and claim validation are skipped until the token's own ``exp``.
+validated_tokens = TTLCache(maxsize=getattr(settings, "AUTH_TOKEN_CACHE_MAX_SIZE", 10_000))
+
+# Rejected tokens, remembered for AUTH_TOKEN_NEGATIVE_TTL seconds. Kept apart and
+# smaller, so a client spraying garbage tokens can't evict the valid ones above.
+rejected_tokens = TTLCache(maxsize=getattr(settings, "AUTH_TOKEN_NEGATIVE_CACHE_MAX_SIZE", 1_000))
+
 
 class CookieAuthentication(JWTAuthentication):
     def authenticate(self, request: Request) -> Optional[Tuple[AuthUser, Token]]:
@@ -19,9 +36,58 @@ class CookieAuthentication(JWTAuthentication):
             raw_token = request.COOKIES.get(settings.COOKIE_NAME)
 
         if raw_token is not None:
+            started = time.perf_counter()
             try:
                 validated_token = self.get_validated_token(raw_token)
-                return self.get_user(validated_token), validated_token
+                user = self.get_user(validated_token)
+                set_user_id(user.pk)
+                return user, validated_token
             except TokenError as e:
                 logger.error(f"Token validation error: {str(e)}")
-        return None
\ No newline at end of file
+            finally:
+                add_auth_time(time.perf_counter() - started)
+        return None
+
+    def get_validated_token(self, raw_token: Union[bytes, str]) -> Token:
+        if not settings.AUTH_TOKEN_CACHE_ENABLED:
+            return super().get_validated_token(raw_token)
+
+        if isinstance(raw_token, str):
+            raw_token = raw_token.encode()
+        key = hashlib.sha256(raw_token).digest()
+
+        cached = validated_tokens.get(key)
+        if cached is not None:
+            return cached
+        if len(rejected_tokens):
+            rejected = rejected_tokens.get(key)
+            if rejected is not None:
+                raise InvalidToken(rejected)
+
+        try:
+            validated_token = super().get_validated_token(raw_token)
+        except InvalidToken as e:
+            rejected_tokens.set(key, e.detail, ttl=settings.AUTH_TOKEN_NEGATIVE_TTL)
+            raise
+
+        remaining = validated_token.get("exp", 0) - time.time()
+        if remaining > 0:
+            validated_tokens.set(key, validated_token, ttl=remaining)
+        return validated_token
+
+    def get_user(self, validated_token: Token) -> AuthUser:
+        if not settings.AUTH_USER_CACHE_ENABLED or api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        user = user_cache.get(user_id, jti) if user_id is not None else None
+
+        if user is None:
+            ticket = user_cache.begin_load(user_id)
+            user = super().get_user(validated_token)
+            user_cache.store(user, jti, ticket)
+        elif api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
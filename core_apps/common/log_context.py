@@ -0,0 +1,140 @@
+## Per-request (or per-task) context added to every loguru record, and the JSON line format of logs/requests.jsonl. The settings import
+# this module for add_request_context, so it must not import models or the database layer.
+
+import json
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestContext:
+    __slots__ = (
+        "request_id", "user_id", "route", "started",
+        "db_queries", "db_time", "cache_hits", "cache_misses", "auth_time",
+    )
+
+    def __init__(self, request_id: str, route: str = "", user_id: Any = None) -> None:
+        self.request_id = request_id
+        self.user_id = user_id
+        self.route = route
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.auth_time = 0.0
+
+    @property
+    def duration_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    ## connection.execute_wrapper callable counting queries and their time
+    def count_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def current_context() -> Optional[RequestContext]:
+    return _context.get()
+
+
+## keeps a well-formed id sent by the proxy (nginx's $request_id), otherwise makes one
+def new_request_id(incoming: Optional[str] = None) -> str:
+    if incoming and REQUEST_ID_RE.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def activate(context: RequestContext) -> Token:
+    return _context.set(context)
+
+
+def deactivate(token: Token) -> None:
+    _context.reset(token)
+
+
+@contextmanager
+def request_context(request_id: str, route: str = "", user_id: Any = None) -> Iterator[RequestContext]:
+    context = RequestContext(request_id, route, user_id)
+    token = activate(context)
+    try:
+        yield context
+    finally:
+        deactivate(token)
+
+
+def set_user_id(user_id: Any) -> None:
+    context = _context.get()
+    if context is not None:
+        context.user_id = user_id
+
+
+def count_cache_lookup(hit: bool) -> None:
+    context = _context.get()
+    if context is not None:
+        if hit:
+            context.cache_hits += 1
+        else:
+            context.cache_misses += 1
+
+
+def add_auth_time(seconds: float) -> None:
+    context = _context.get()
+    if context is not None:
+        context.auth_time += seconds
+
+
+## loguru patcher: copies the active context into record["extra"]
+def add_request_context(record: Dict[str, Any]) -> None:
+    context = _context.get()
+    if context is None:
+        return
+    extra = record["extra"]
+    extra["request_id"] = context.request_id
+    extra["user_id"] = context.user_id
+    extra["route"] = context.route
+    extra["db_queries"] = context.db_queries
+    extra["duration_ms"] = round(context.duration_ms, 2)
+
+
+CONTEXT_KEYS = ("request_id", "user_id", "route", "db_queries", "duration_ms")
+
+
+## one record as a compact JSON object, context keys only when set
+def json_line(record: Dict[str, Any]) -> str:
+    extra = record["extra"]
+    line = {
+        "ts": record["time"].isoformat(timespec="milliseconds"),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    for key in CONTEXT_KEYS:
+        value = extra.get(key)
+        if value is not None:
+            line[key] = value
+    exception = record["exception"]
+    if exception is not None and exception.type is not None:
+        line["exception"] = f"{exception.type.__name__}: {exception.value}"
+    return json.dumps(line, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+## format callable for the JSON sink; the line goes through extra so loguru doesn't re-parse it
+def json_log_format(record: Dict[str, Any]) -> str:
+    record["extra"]["json"] = json_line(record)
+    return "{extra[json]}\n"
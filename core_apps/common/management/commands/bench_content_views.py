@@ -0,0 +1,83 @@
+import random
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core_apps.common.models import ContentView
+from core_apps.common.view_recorder import view_recorder
+from core_apps.user_auth.models import User
+
+
+## ContentView.record_view as it was before the buffered recorder
+def legacy_record_view(content_object, user, viewer_ip) -> None:
+    content_type = ContentType.objects.get_for_model(content_object)
+    try:
+        view, created = ContentView.objects.get_or_create(
+            content_type=content_type,
+            object_id=content_object.id,
+            user=user,
+            viewer_ip=viewer_ip,
+            defaults={"last_viewed": timezone.now()},
+        )
+        if not created:
+            view.last_viewed = timezone.now()
+            view.save()
+    except IntegrityError:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Views per second for ContentView recording: legacy get_or_create, unbuffered upsert, buffered recorder."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--views", type=int, default=20_000)
+        parser.add_argument("--objects", type=int, default=50)
+        parser.add_argument("--viewers", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                User(
+                    email=f"bench.view.{index}@example.com",
+                    username=f"BENCH-VIEW-{index}",
+                    first_name="Bench",
+                    last_name="Viewer",
+                    id_no=990_000_000 + index,
+                    security_question=User.SecurityQuestions.MAIDEN_NAME,
+                    security_answer="bench",
+                    password="!",
+                )
+                for index in range(max(options["objects"], options["viewers"]))
+            )
+            objects = users[: options["objects"]]
+            # One viewer in four is anonymous, so both flush paths are exercised.
+            viewers = [
+                (None if index % 4 == 0 else user, f"10.0.{index // 250}.{index % 250}")
+                for index, user in enumerate(users[: options["viewers"]])
+            ]
+
+            rng = random.Random(7)
+            events = [(rng.choice(objects), *rng.choice(viewers)) for _ in range(options["views"])]
+
+            def run(label, record, flush=lambda: None):
+                ContentView.objects.all().delete()
+                started = time.perf_counter()
+                for content_object, user, viewer_ip in events:
+                    record(content_object, user, viewer_ip)
+                flush()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{label:>22}: {len(events) / elapsed:,.0f} views/s "
+                    f"({ContentView.objects.count():,} rows)"
+                )
+
+            run("legacy get_or_create", legacy_record_view)
+            with override_settings(CONTENT_VIEW_BUFFERING=False):
+                run("unbuffered upsert", ContentView.record_view)
+            run("buffered recorder", ContentView.record_view, view_recorder.flush)
+
+            transaction.set_rollback(True)
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core_apps.common.cookie_auth import CookieAuthentication, validated_tokens
+from core_apps.user_auth.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Authentications per second on one core for CookieAuthentication, "
+        "with and without the validated-token cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20000)
+
+    def handle(self, *args, **options):
+        requests = options["requests"]
+
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email="bench.jwt@example.com",
+                password="bench-password",
+                first_name="Bench",
+                last_name="User",
+                id_no=999999998,
+                security_question=User.SecurityQuestions.MAIDEN_NAME,
+                security_answer="bench",
+            )
+            request = RequestFactory().get("/", HTTP_COOKIE=f"access={AccessToken.for_user(user)}")
+            authentication = CookieAuthentication()
+
+            for enabled in (False, True):
+                validated_tokens.clear()
+                with override_settings(AUTH_TOKEN_CACHE_ENABLED=enabled):
+                    authentication.authenticate(request)  # warm the user cache
+                    started = time.perf_counter()
+                    for _ in range(requests):
+                        authentication.authenticate(request)
+                    elapsed = time.perf_counter() - started
+
+                label = "with token cache" if enabled else "without token cache"
+                self.stdout.write(f"{label:>20}: {requests / elapsed:,.0f} authentications/s")
+
+            transaction.set_rollback(True)
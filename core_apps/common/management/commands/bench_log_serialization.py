@@ -0,0 +1,64 @@
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from loguru import logger
+
+from core_apps.common.log_context import add_request_context, json_log_format, request_context
+
+TEXT_FORMAT = "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Per-record cost of the log formats inside a request context: the plain text format, "
+        "loguru's serialize=True and the compact JSON lines of logs/requests.jsonl, formatted only "
+        "and written to a line-buffered and a 64KB-buffered file. Logs go to a temporary directory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        count = options["records"]
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                directory = Path(directory)
+                for label, sink_options in (
+                    ("text, no I/O", {"sink": self.discard, "format": TEXT_FORMAT}),
+                    ("serialize=True, no I/O", {"sink": self.discard, "format": "{message}", "serialize": True}),
+                    ("compact JSON, no I/O", {"sink": self.discard, "format": json_log_format}),
+                    ("compact JSON, line-buffered file", {
+                        "sink": directory / "line.jsonl", "format": json_log_format, "buffering": 1,
+                    }),
+                    ("compact JSON, 64KB-buffered file", {
+                        "sink": directory / "buffered.jsonl", "format": json_log_format, "buffering": 65536,
+                    }),
+                ):
+                    logger.remove()
+                    logger.configure(patcher=add_request_context)
+                    logger.add(level="INFO", **sink_options)
+                    rate, size = self.measure(count, sink_options)
+                    logger.remove()
+                    self.stdout.write(f"{label:>34}: {rate:,.0f} records/s, {size:,.0f} bytes/record")
+        finally:
+            logger.remove()
+            logger.configure(**settings.LOGURU_LOGGING)
+
+    def discard(self, message) -> None:
+        self.last_size = len(message)
+
+    def measure(self, count: int, sink_options: dict):
+        self.last_size = 0
+        with request_context("0f3c1e5a9b7d4c2e8a6b1d3f5e7c9a0b", route="api/v1/profiles/<uuid:id>/", user_id=42) as context:
+            context.db_queries = 3
+            started = time.perf_counter()
+            for n in range(count):
+                logger.info("benchmark record {} of {}", n, count)
+            elapsed = time.perf_counter() - started
+        logger.complete()
+        path = sink_options["sink"]
+        size = path.stat().st_size / count if isinstance(path, Path) else self.last_size
+        return count / elapsed, size
@@ -0,0 +1,100 @@
+import logging
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from loguru import logger
+
+from interceptor import InterceptHandler
+
+FORMAT = "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}"
+
+
+## the handler before the level cache and caller copying, kept only for comparison
+class LegacyInterceptHandler(logging.Handler):
+    def emit(self, record):
+        try:
+            level = logger.level(record.levelname).name
+        except Exception:
+            level = record.levelno
+        frame, depth = logging.currentframe(), 2
+        while frame.f_code.co_filename == logging.__file__:
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
+
+class Command(BaseCommand):
+    help = (
+        "Stdlib records/s through the loguru bridge and admin login page latency with DEBUG "
+        "logging (SQL included), for the legacy and current InterceptHandler with synchronous and "
+        "enqueued file sinks. Logs go to a temporary directory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=50_000)
+        parser.add_argument("--requests", type=int, default=300)
+
+    def handle(self, *args, **options):
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for label, handler_class, enqueue in (
+                    ("legacy handler, sync sink", LegacyInterceptHandler, False),
+                    ("current handler, sync sink", InterceptHandler, False),
+                    ("current handler, enqueued sink", InterceptHandler, True),
+                ):
+                    self.configure(Path(directory) / f"{handler_class.__name__}-{enqueue}.log", handler_class, enqueue)
+                    rate, slowest = self.records_per_second(options["records"])
+                    latency = self.request_latency(options["requests"])
+                    logger.complete()
+                    self.stdout.write(
+                        f"{label:>30}: {rate:,.0f} records/s, slowest record {slowest:.1f} ms, login page "
+                        f"{latency['mean']:.2f} ms mean / {latency['p95']:.2f} ms p95 with DEBUG logging"
+                    )
+        finally:
+            logger.remove()
+            logger.configure(**settings.LOGURU_LOGGING)
+            root.handlers[:] = saved_handlers
+            root.setLevel(saved_level)
+
+    def configure(self, path: Path, handler_class, enqueue: bool) -> None:
+        logger.remove()
+        # 1 MB rotation so the run crosses several rotations: with a synchronous sink the
+        # record that triggers one waits for the zip, which shows up as "slowest record".
+        logger.add(path, level="DEBUG", format=FORMAT, rotation="1 MB", compression="zip", enqueue=enqueue)
+        root = logging.getLogger()
+        root.handlers[:] = [handler_class()]
+        root.setLevel(logging.DEBUG)
+
+    def records_per_second(self, count: int):
+        bench_logger = logging.getLogger("bench.logging")
+        slowest = 0.0
+        started = time.perf_counter()
+        for n in range(count):
+            before = time.perf_counter()
+            bench_logger.debug("benchmark record %s of %s", n, count)
+            slowest = max(slowest, time.perf_counter() - before)
+        return count / (time.perf_counter() - started), slowest * 1000
+
+    def request_latency(self, count: int) -> dict:
+        client = Client()
+        url = reverse("admin:login")
+        timings = []
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            connection.force_debug_cursor = True
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.force_debug_cursor = False
+        return {"mean": statistics.mean(timings), "p95": statistics.quantiles(timings, n=20)[-1]}
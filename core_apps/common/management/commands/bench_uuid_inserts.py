@@ -0,0 +1,83 @@
+import time
+import uuid
+
+from django.apps.registry import Apps
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, models
+
+from core_apps.common.ids import uuid7
+
+GENERATORS = {"v4": uuid.uuid4, "v7": uuid7}
+
+
+def bench_model(registry: Apps, version: str):
+    meta = type("Meta", (), {"app_label": "common", "db_table": f"bench_uuid_{version}", "apps": registry})
+    return type(
+        f"BenchUUID{version}",
+        (models.Model,),
+        {
+            "__module__": __name__,
+            "id": models.UUIDField(primary_key=True),
+            "payload": models.CharField(max_length=32),
+            "Meta": meta,
+        },
+    )
+
+
+def primary_key_index_size(connection, table: str):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT pg_relation_size(indexrelid) FROM pg_index "
+                "WHERE indrelid = %s::regclass AND indisprimary",
+                [table],
+            )
+            return cursor.fetchone()[0]
+        if connection.vendor == "sqlite":
+            try:
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s",
+                    [f"sqlite_autoindex_{table}_1"],
+                )
+            except DatabaseError:  # SQLite built without the dbstat table
+                return None
+            return cursor.fetchone()[0]
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert rate and primary-key index size for uuid4 vs uuid7 primary keys, "
+        "using throwaway tables in the default database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2_000_000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows, batch_size = options["rows"], options["batch_size"]
+        connection = connections["default"]
+        registry = Apps()
+
+        for version, generate in GENERATORS.items():
+            model = bench_model(registry, version)
+            with connection.schema_editor() as editor:
+                editor.create_model(model)
+            try:
+                started = time.perf_counter()
+                for start in range(0, rows, batch_size):
+                    model.objects.bulk_create(
+                        [model(id=generate(), payload="x" * 32) for _ in range(min(batch_size, rows - start))]
+                    )
+                elapsed = time.perf_counter() - started
+
+                size = primary_key_index_size(connection, model._meta.db_table)
+                size_label = f"{size / 1024 / 1024:,.1f} MiB" if size is not None else "n/a"
+                self.stdout.write(
+                    f"uuid{version[1:]}: {rows:,} rows, {rows / elapsed:,.0f} inserts/s, "
+                    f"primary key index {size_label}"
+                )
+            finally:
+                with connection.schema_editor() as editor:
+                    editor.delete_model(model)
@@ -0,0 +1,96 @@
+import http.client
+import statistics
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests/s and latency percentiles of GET <url> from --concurrency keep-alive clients, e.g. "
+        "python manage.py loadtest http://nginx/api/v1/schema/ (or the api container on :8000, to "
+        "leave nginx out). Run it from a different machine or container than the server when possible: "
+        "the clients share one Python process and can become the bottleneck themselves."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--duration", type=float, default=20.0, help="Seconds to measure for.")
+        parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of load before measuring.")
+        parser.add_argument("--header", action="append", default=[], help='Extra request header, "Name: value".')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise CommandError("url must be an absolute http(s) URL.")
+        headers = dict(header.split(":", 1) for header in options["header"])
+        headers = {name.strip(): value.strip() for name, value in headers.items()}
+        path = url.path or "/"
+        if url.query:
+            path = f"{path}?{url.query}"
+
+        start_at = time.perf_counter() + options["warmup"]
+        stop_at = start_at + options["duration"]
+        results: List[Dict] = [
+            {"latencies": [], "statuses": Counter(), "errors": 0} for _ in range(options["concurrency"])
+        ]
+        threads = [
+            threading.Thread(target=self.client, args=(url, path, headers, start_at, stop_at, result))
+            for result in results
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        latencies = sorted(ms for result in results for ms in result["latencies"])
+        statuses = sum((result["statuses"] for result in results), Counter())
+        errors = sum(result["errors"] for result in results)
+        if not latencies:
+            raise CommandError(f"No request completed ({errors} connection errors).")
+
+        def percentile(q: float) -> float:
+            return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+        self.stdout.write(
+            f"{len(latencies):,} requests in {options['duration']:.0f}s with {options['concurrency']} clients: "
+            f"{len(latencies) / options['duration']:,.1f} requests/s\n"
+            f"latency ms: mean {statistics.mean(latencies):.1f}, p50 {percentile(0.50):.1f}, "
+            f"p95 {percentile(0.95):.1f}, p99 {percentile(0.99):.1f}, max {latencies[-1]:.1f}\n"
+            f"status codes: {dict(sorted(statuses.items()))}, connection errors: {errors}"
+        )
+
+    def client(self, url, path: str, headers: Dict[str, str], start_at: float, stop_at: float, result: Dict) -> None:
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        connection = None
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                break
+            try:
+                if connection is None:
+                    connection = connection_class(url.hostname, url.port, timeout=30)
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                if started >= start_at:
+                    result["errors"] += 1
+                if connection is not None:
+                    connection.close()
+                connection = None
+                time.sleep(0.01)
+                continue
+            if started >= start_at:
+                result["latencies"].append((time.perf_counter() - started) * 1000)
+                result["statuses"][response.status] += 1
+            if response.will_close:
+                connection.close()
+                connection = None
+        if connection is not None:
+            connection.close()
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core_apps.common.search import search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SearchToken rows used by InvertedIndexSearchBackend for every admin-searched model."
+
+    def handle(self, *args, **options):
+        for model in search_index.fields:
+            rows = search_index.rebuild(model)
+            self.stdout.write(f"{model._meta.label}: {rows:,} rows indexed")
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core_apps.common import perf
+
+
+def _ms(summary, key):
+    value = summary.get(key) if summary else None
+    return "-" if value is None else f"{value:g}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Per-endpoint wall, database and JWT auth time percentiles (bucket upper bounds, ms) of the "
+        "requests sampled by ServerTimingMiddleware, slowest p95 first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=50)
+
+    def handle(self, *args, **options):
+        rows = perf.endpoint_summary()[: options["limit"]]
+        if not rows:
+            self.stdout.write("No sampled requests yet (PERF_SAMPLE_RATE, METRICS_FLUSH_INTERVAL).")
+            return
+        for row in rows:
+            wall, db, auth = row["wall"], row["db"], row["auth"]
+            queries = row["db_queries_per_request"]
+            self.stdout.write(
+                f"{row['endpoint']}\n"
+                f"    requests={row['requests']} queries/request={queries or 0:.1f} "
+                f"cache hits={row['cache_hits']} misses={row['cache_misses']}\n"
+                f"    wall p50<={_ms(wall, 'p50')} p95<={_ms(wall, 'p95')} p99<={_ms(wall, 'p99')}  "
+                f"db p50<={_ms(db, 'p50')} p95<={_ms(db, 'p95')} p99<={_ms(db, 'p99')}  "
+                f"auth p50<={_ms(auth, 'p50')} p95<={_ms(auth, 'p95')} p99<={_ms(auth, 'p99')}"
+            )
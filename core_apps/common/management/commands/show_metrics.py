@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core_apps.common import metrics
+
+
+class Command(BaseCommand):
+    help = "Print the shared counters, gauges and latency histograms collected by core_apps.common.metrics."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="", help="Only show metrics whose name starts with this.")
+        parser.add_argument(
+            "--gauge",
+            action="append",
+            default=[],
+            help="Gauge to print (repeatable), e.g. --gauge email.queue_depth",
+        )
+
+    def handle(self, *args, **options):
+        shared = metrics.read_shared(options["prefix"])
+
+        for name in options["gauge"]:
+            self.stdout.write(f"gauge     {name}: {metrics.read_gauge(name)}")
+
+        for name, value in sorted(shared["counters"].items()):
+            self.stdout.write(f"counter   {name}: {value}")
+
+        for name, summary in sorted(shared["histograms"].items()):
+            self.stdout.write(
+                f"histogram {name}: count={summary['count']} "
+                f"p50<={summary['p50']}ms p95<={summary['p95']}ms p99<={summary['p99']}ms"
+            )
@@ -0,0 +1,202 @@
+import math
+import threading
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .background import PeriodicFlusher
+from .cache import shared_redis
+
+# Upper bounds (milliseconds) of the histogram buckets. Fixed buckets let histograms from
+# different processes be merged by simply adding counts, which is how the shared view
+# in the cache is built.
+BUCKETS_MS = (
+    1, 2, 5, 10, 25, 50, 100, 250, 500,
+    1_000, 2_500, 5_000, 10_000, 30_000, 60_000, math.inf,
+)
+
+# Every name ever flushed, as "counter:<name>" / "hist:<name>". A Redis set when the
+# cache is django-redis, a list under a plain cache key otherwise.
+INDEX_KEY = "metrics:names"
+
+
+def _alias() -> str:
+    return getattr(settings, "METRICS_CACHE_ALIAS", "default")
+
+
+def _cache():
+    return caches[_alias()]
+
+
+def _flush_interval() -> float:
+    return getattr(settings, "METRICS_FLUSH_INTERVAL", 10)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self, counts: Optional[List[int]] = None, total: float = 0.0) -> None:
+        self.counts = list(counts) if counts else [0] * len(BUCKETS_MS)
+        self.count = sum(self.counts)
+        self.total = total
+
+    def observe(self, value_ms: float) -> None:
+        for index, bound in enumerate(BUCKETS_MS):
+            if value_ms <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total += value_ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * q)
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                bound = BUCKETS_MS[index]
+                return BUCKETS_MS[index - 1] if math.isinf(bound) else bound
+        return None
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+## In-process counters and latency histograms. A background thread adds the deltas to the shared cache every METRICS_FLUSH_INTERVAL
+# seconds (one pipelined round trip on django-redis), so read_shared() sees the totals of every web and Celery process
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._flusher = PeriodicFlusher(self.flush, _flush_interval, name="metrics-flush")
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        self._flusher.start()
+
+    def observe(self, name: str, value_ms: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(value_ms)
+        self._flusher.start()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "histograms": {
+                    name: histogram.summary()
+                    for name, histogram in self._histograms.items()
+                },
+            }
+
+    def flush(self) -> None:
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+
+        if not counters and not histograms:
+            return
+
+        deltas: Dict[str, int] = {}
+        names = set()
+        for name, value in counters.items():
+            deltas[f"metrics:counter:{name}"] = value
+            names.add(f"counter:{name}")
+        for name, histogram in histograms.items():
+            for index, bucket_count in enumerate(histogram.counts):
+                if bucket_count:
+                    deltas[f"metrics:hist:{name}:{index}"] = bucket_count
+            deltas[f"metrics:hist:{name}:total_us"] = int(histogram.total * 1000)
+            names.add(f"hist:{name}")
+
+        cache = _cache()
+        redis = shared_redis(_alias())
+        if redis is not None:
+            with redis.pipeline(transaction=False) as pipe:
+                for key, delta in deltas.items():
+                    pipe.incrby(cache.make_key(key), delta)
+                pipe.sadd(cache.make_key(INDEX_KEY), *sorted(names))
+                pipe.execute()
+            return
+
+        with self._flush_lock:
+            for key, delta in deltas.items():
+                _incr(cache, key, delta)
+            index = set(cache.get(INDEX_KEY) or ())
+            if not names <= index:
+                cache.set(INDEX_KEY, sorted(index | names), timeout=None)
+
+
+def _index(cache) -> List[str]:
+    redis = shared_redis(_alias())
+    if redis is not None:
+        return sorted(member.decode() for member in redis.smembers(cache.make_key(INDEX_KEY)))
+    return list(cache.get(INDEX_KEY) or ())
+
+
+def _incr(cache, key: str, delta: int) -> int:
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout=None):
+            return delta
+        return cache.incr(key, delta)
+
+
+registry = MetricsRegistry()
+
+
+def increment(name: str, value: int = 1) -> None:
+    registry.increment(name, value)
+
+
+def observe(name: str, value_ms: float) -> None:
+    registry.observe(name, value_ms)
+
+
+## moves a shared gauge (e.g. a queue depth) at once, without waiting for a flush
+def adjust_gauge(name: str, delta: int) -> int:
+    return _incr(_cache(), f"metrics:gauge:{name}", delta)
+
+
+def read_gauge(name: str) -> int:
+    return _cache().get(f"metrics:gauge:{name}", 0)
+
+
+## totals flushed by every process, optionally only the names starting with prefix
+def read_shared(prefix: str = "") -> Dict[str, Dict]:
+    cache = _cache()
+    counters: Dict[str, int] = {}
+    histograms: Dict[str, Dict] = {}
+
+    for entry in _index(cache):
+        kind, name = entry.split(":", 1)
+        if not name.startswith(prefix):
+            continue
+        if kind == "counter":
+            counters[name] = cache.get(f"metrics:counter:{name}", 0)
+        elif kind == "hist":
+            keys = [f"metrics:hist:{name}:{index}" for index in range(len(BUCKETS_MS))]
+            values = cache.get_many(keys + [f"metrics:hist:{name}:total_us"])
+            histogram = Histogram(
+                [values.get(key, 0) for key in keys],
+                values.get(f"metrics:hist:{name}:total_us", 0) / 1000,
+            )
+            histograms[name] = histogram.summary()
+
+    return {"counters": counters, "histograms": histograms}
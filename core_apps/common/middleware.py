@@ -0,0 +1,67 @@
+import random
+from contextlib import ExitStack
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from loguru import logger
+
+from . import perf
+from .log_context import REQUEST_ID_HEADER, current_context, new_request_id, request_context
+
+
+## the user DRF authentication set, or AuthenticationMiddleware's session user; None when neither ran
+def request_user(request: HttpRequest) -> Optional[Any]:
+    return getattr(request, "user", None)
+
+
+## Gives each request an id (nginx's X-Request-ID when sent) and a query count for every log record it makes (log_context.py).
+# The id goes back in X-Request-ID and on to any Celery task it publishes; the per-request summary line is DEBUG
+class RequestContextMiddleware:
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+        with request_context(request_id, route=request.path) as context:
+            request.request_id = request_id
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(context.count_query))
+                response = self.get_response(request)
+
+            user = request_user(request)
+            if user is not None and user.is_authenticated:
+                context.user_id = user.pk
+            response[REQUEST_ID_HEADER] = request_id
+            logger.debug(f"{request.method} {request.path} {response.status_code}")
+        return response
+
+    def process_view(self, request: HttpRequest, view_func, view_args, view_kwargs) -> None:
+        context = current_context()
+        match = request.resolver_match
+        if context is not None and match is not None:
+            context.route = match.route or match.view_name or context.route
+        return None
+
+
+## Adds a PERF_SAMPLE_RATE sample of requests to the per-endpoint histograms in perf.py, and with PERF_SERVER_TIMING sends the
+# numbers back in a Server-Timing header. Must come after RequestContextMiddleware
+class ServerTimingMiddleware:
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        response = self.get_response(request)
+        context = current_context()
+        rate = settings.PERF_SAMPLE_RATE
+        if context is None or not rate or (rate < 1 and random.random() >= rate):
+            return response
+
+        wall_ms = context.duration_ms
+        match = request.resolver_match
+        perf.record(perf.endpoint_name(request.method, match.route if match else ""), context, wall_ms)
+        if settings.PERF_SERVER_TIMING:
+            response["Server-Timing"] = perf.server_timing(context, wall_ms)
+        return response
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:32
+
+import core_apps.common.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="contentview",
+            name="id",
+            field=models.UUIDField(
+                default=core_apps.common.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
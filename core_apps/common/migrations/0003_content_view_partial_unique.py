@@ -0,0 +1,64 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Collapse rows the new partial unique constraints would reject (NULLs let unique_together accept several
+# anonymous rows for the same view), keeping the most recently viewed row of each group.
+def merge_duplicate_views(apps, schema_editor):
+    ContentView = apps.get_model("common", "ContentView")
+    views = ContentView.objects.using(schema_editor.connection.alias)
+
+    for user_isnull, key in (
+        (True, ["content_type", "object_id", "viewer_ip"]),
+        (False, ["content_type", "object_id", "user", "viewer_ip"]),
+    ):
+        groups = (
+            views.filter(user__isnull=user_isnull)
+            .values(*key)
+            .annotate(rows=Count("id"))
+            .filter(rows__gt=1)
+        )
+        for group in groups.iterator():
+            group.pop("rows")
+            ids = list(
+                views.filter(user__isnull=user_isnull, **group)
+                .order_by("-last_viewed")
+                .values_list("id", flat=True)
+            )
+            views.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0002_uuid7_primary_keys"),
+        ("contenttypes", "0002_remove_content_type_name"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="contentview",
+            unique_together=set(),
+        ),
+        migrations.RunPython(merge_duplicate_views, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="contentview",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("user__isnull", False)),
+                fields=("content_type", "object_id", "user", "viewer_ip"),
+                name="unique_authenticated_content_view",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="contentview",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("user__isnull", True)),
+                fields=("content_type", "object_id", "viewer_ip"),
+                name="unique_anonymous_content_view",
+            ),
+        ),
+    ]
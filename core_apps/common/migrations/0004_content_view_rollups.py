@@ -0,0 +1,121 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0003_content_view_partial_unique"),
+        ("contenttypes", "0002_remove_content_type_name"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentViewArchive",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                ("month", models.DateField(verbose_name="Month")),
+                ("object_id", models.UUIDField(verbose_name="Object ID")),
+                (
+                    "viewer_ip",
+                    models.GenericIPAddressField(
+                        blank=True, null=True, verbose_name="Viewer IP Address"
+                    ),
+                ),
+                ("last_viewed", models.DateTimeField()),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Archived Content View",
+                "verbose_name_plural": "Archived Content Views",
+            },
+        ),
+        migrations.CreateModel(
+            name="ContentViewDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="Day")),
+                ("object_id", models.UUIDField(verbose_name="Object ID")),
+                (
+                    "views",
+                    models.PositiveBigIntegerField(default=0, verbose_name="Views"),
+                ),
+                (
+                    "unique_viewers",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Unique Viewers"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Daily Content Views",
+                "verbose_name_plural": "Daily Content Views",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="contentview",
+            index=models.Index(fields=["last_viewed"], name="content_view_last_viewed"),
+        ),
+        migrations.AddField(
+            model_name="contentviewarchive",
+            name="content_type",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to="contenttypes.contenttype",
+                verbose_name="Content Type",
+            ),
+        ),
+        migrations.AddField(
+            model_name="contentviewarchive",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="User",
+            ),
+        ),
+        migrations.AddField(
+            model_name="contentviewdaily",
+            name="content_type",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to="contenttypes.contenttype",
+                verbose_name="Content Type",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contentviewarchive",
+            index=models.Index(fields=["month"], name="content_view_archive_month"),
+        ),
+        migrations.AddIndex(
+            model_name="contentviewdaily",
+            index=models.Index(fields=["day"], name="content_view_daily_day"),
+        ),
+        migrations.AddConstraint(
+            model_name="contentviewdaily",
+            constraint=models.UniqueConstraint(
+                fields=("content_type", "object_id", "day"),
+                name="unique_content_view_daily",
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.14 on 2026-10-17 01:49
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Collapse rows without a viewer IP that the new constraints would reject (the recorder used to match them
+# with a SELECT, so two processes could both insert one), keeping the most recently viewed row of each group.
+def merge_duplicate_views_without_ip(apps, schema_editor):
+    ContentView = apps.get_model("common", "ContentView")
+    views = ContentView.objects.using(schema_editor.connection.alias).filter(viewer_ip__isnull=True)
+
+    for user_isnull, key in (
+        (True, ["content_type", "object_id"]),
+        (False, ["content_type", "object_id", "user"]),
+    ):
+        groups = (
+            views.filter(user__isnull=user_isnull)
+            .values(*key)
+            .annotate(rows=Count("id"))
+            .filter(rows__gt=1)
+        )
+        for group in groups.iterator():
+            group.pop("rows")
+            ids = list(
+                views.filter(user__isnull=user_isnull, **group)
+                .order_by("-last_viewed")
+                .values_list("id", flat=True)
+            )
+            views.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0005_search_token"),
+        ("contenttypes", "0002_remove_content_type_name"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_views_without_ip, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="contentview",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("user__isnull", False), ("viewer_ip__isnull", True)
+                ),
+                fields=("content_type", "object_id", "user"),
+                name="unique_authenticated_content_view_no_ip",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="contentview",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("user__isnull", True), ("viewer_ip__isnull", True)),
+                fields=("content_type", "object_id"),
+                name="unique_anonymous_content_view_no_ip",
+            ),
+        ),
+    ]
@@ -1,19 +1,21 @@
-import uuid
-from typing import Any, Optional
-from django.contrib.auth import get_user_model
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import IntegrityError, models
-from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Sum
 from django.utils.translation import gettext_lazy as _
 
-
-
-User = get_user_model()
+from .ids import uuid7
+from .view_recorder import content_type_id_for, view_recorder
 
 
 class TimeStampedModel(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -21,6 +23,98 @@ class TimeStampedModel(models.Model):
         abstract = True
 
 
+## Remembers the values an instance was loaded with (get_dirty_fields(), is_dirty()), and save() on a loaded instance writes only
+# the changed columns plus auto_now ones, or nothing at all. New instances, force_insert and explicit update_fields save as asked
+class DirtyFieldsMixin(models.Model):
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_dirty_fields(self) -> List[str]:
+        loaded = getattr(self, "_loaded_values", None)
+        dirty = []
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if (
+                loaded is None
+                or field.attname not in loaded
+                or loaded[field.attname] != self.__dict__[field.attname]
+            ):
+                dirty.append(field.name)
+        return dirty
+
+    def is_dirty(self) -> bool:
+        return bool(self.get_dirty_fields())
+
+    ## full_clean() for saves, cut down to the dirty fields' validators and clean(); uniqueness and constraints are left to the database
+    def clean_changed_fields(self) -> None:
+        dirty = set(self.get_dirty_fields())
+        errors: Dict[str, Any] = {}
+        try:
+            self.clean_fields(
+                exclude=[field.name for field in self._meta.fields if field.name not in dirty]
+            )
+        except ValidationError as error:
+            errors = error.update_error_dict(errors)
+        try:
+            self.clean()
+        except ValidationError as error:
+            errors = error.update_error_dict(errors)
+        if errors:
+            raise ValidationError(errors)
+
+    ## treat the current values (default: all loaded fields) as stored, e.g. after a QuerySet.update()
+    def mark_clean(self, *field_names: str) -> None:
+        fields = (
+            [self._meta.get_field(name) for name in field_names]
+            if field_names
+            else self._meta.concrete_fields
+        )
+        loaded = getattr(self, "_loaded_values", None) or {}
+        loaded.update(
+            (field.attname, self.__dict__[field.attname])
+            for field in fields
+            if field.attname in self.__dict__
+        )
+        self._loaded_values = loaded
+
+    def _auto_now_fields(self) -> List[str]:
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if getattr(field, "auto_now", False)
+        ]
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            if update_fields:
+                kwargs["update_fields"] = set(update_fields) | set(self._auto_now_fields())
+        elif (
+            not args
+            and not kwargs.get("force_insert")
+            and not self._state.adding
+            and getattr(self, "_loaded_values", None) is not None
+        ):
+            dirty = self.get_dirty_fields()
+            if not dirty:
+                return
+            kwargs["update_fields"] = set(dirty) | set(self._auto_now_fields())
+
+        super().save(*args, **kwargs)
+        self.mark_clean(*(kwargs.get("update_fields") or ()))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs: Any) -> None:
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self.mark_clean(*(fields or ()))
+
+
 class ContentView(TimeStampedModel):
     content_type = models.ForeignKey(
         ContentType, on_delete=models.CASCADE, verbose_name=_("Content Type")
@@ -28,7 +122,7 @@ class ContentView(TimeStampedModel):
     object_id = models.UUIDField(verbose_name=_("Object ID"))
     content_object = GenericForeignKey("content_type", "object_id")
     user = models.ForeignKey(
-        User,
+        settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
@@ -45,7 +139,32 @@ class ContentView(TimeStampedModel):
     class Meta:
         verbose_name = _("Content View")
         verbose_name_plural = _("Content Views")
-        unique_together = ["content_type", "object_id", "user", "viewer_ip"]
+        # NULLs never compare equal in a unique index, so a single constraint over a
+        # nullable user and IP can't stop duplicate rows. Each kind of view gets its
+        # own partial index instead, in the column order the recorder looks them up.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "object_id", "user", "viewer_ip"],
+                condition=models.Q(user__isnull=False),
+                name="unique_authenticated_content_view",
+            ),
+            models.UniqueConstraint(
+                fields=["content_type", "object_id", "viewer_ip"],
+                condition=models.Q(user__isnull=True),
+                name="unique_anonymous_content_view",
+            ),
+            models.UniqueConstraint(
+                fields=["content_type", "object_id", "user"],
+                condition=models.Q(user__isnull=False, viewer_ip__isnull=True),
+                name="unique_authenticated_content_view_no_ip",
+            ),
+            models.UniqueConstraint(
+                fields=["content_type", "object_id"],
+                condition=models.Q(user__isnull=True, viewer_ip__isnull=True),
+                name="unique_anonymous_content_view_no_ip",
+            ),
+        ]
+        indexes = [models.Index(fields=["last_viewed"], name="content_view_last_viewed")]
 
     def __str__(self) -> str:
         return (
@@ -53,23 +172,105 @@ class ContentView(TimeStampedModel):
             f"{self.user.get_full_name if self.user else 'Anonymous'} from IP {self.viewer_ip}"
         )
 
+    ## queues the view for the shared recorder (view_recorder.py); it is written by the next bulk flush, not in this request
     @classmethod
     def record_view(
-        cls, content_object: Any, user: Optional[User], viewer_ip: Optional["str"]
+        cls, content_object: Any, user: Optional[AbstractBaseUser], viewer_ip: Optional["str"]
     ) -> None:
-        content_type = ContentType.objects.get_for_model(content_object)
-        try:
-            view, created = cls.objects.get_or_create(
-                content_type=content_type,
-                object_id=content_object.id,
-                user=user,
-                viewer_ip=viewer_ip,
-                defaults={
-                    "last_viewed": timezone.now(),
-                },
+        view_recorder.record(
+            content_type_id_for(content_object),
+            content_object.id,
+            user.pk if user is not None else None,
+            viewer_ip,
+        )
+
+
+## Per-day view totals of one object, so the admin and stats code don't scan ContentView. views grows with every recorder flush,
+# unique_viewers is refreshed by the rollup_content_views beat task
+class ContentViewDaily(models.Model):
+    day = models.DateField(verbose_name=_("Day"))
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, verbose_name=_("Content Type")
+    )
+    object_id = models.UUIDField(verbose_name=_("Object ID"))
+    content_object = GenericForeignKey("content_type", "object_id")
+    views = models.PositiveBigIntegerField(default=0, verbose_name=_("Views"))
+    unique_viewers = models.PositiveIntegerField(default=0, verbose_name=_("Unique Viewers"))
+
+    class Meta:
+        verbose_name = _("Daily Content Views")
+        verbose_name_plural = _("Daily Content Views")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "object_id", "day"],
+                name="unique_content_view_daily",
             )
-            if not created:
-                view.last_viewed = timezone.now()
-                view.save()
-        except IntegrityError:
-            pass
+        ]
+        indexes = [models.Index(fields=["day"], name="content_view_daily_day")]
+
+    def __str__(self) -> str:
+        return f"{self.content_type} {self.object_id} on {self.day}: {self.views} views"
+
+    ## views and summed daily unique viewers of one object between two days, inclusive
+    @classmethod
+    def totals_for(
+        cls, content_object: Any, start: Optional[date] = None, end: Optional[date] = None
+    ) -> Dict[str, int]:
+        rows = cls.objects.filter(
+            content_type_id=content_type_id_for(content_object),
+            object_id=content_object.id,
+        )
+        if start is not None:
+            rows = rows.filter(day__gte=start)
+        if end is not None:
+            rows = rows.filter(day__lte=end)
+        totals = rows.aggregate(views=Sum("views"), unique_viewers=Sum("unique_viewers"))
+        return {name: value or 0 for name, value in totals.items()}
+
+
+## ContentView rows older than CONTENT_VIEW_RETENTION_DAYS, moved here by the archive_content_views beat task. Rows keep their id
+# and are stamped with their month, so a month can be exported or dropped with one indexed delete
+class ContentViewArchive(models.Model):
+    id = models.UUIDField(primary_key=True, editable=False)
+    month = models.DateField(verbose_name=_("Month"))
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, verbose_name=_("Content Type")
+    )
+    object_id = models.UUIDField(verbose_name=_("Object ID"))
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        db_constraint=False,
+        verbose_name=_("User"),
+    )
+    viewer_ip = models.GenericIPAddressField(
+        verbose_name=_("Viewer IP Address"), null=True, blank=True
+    )
+    last_viewed = models.DateTimeField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = _("Archived Content View")
+        verbose_name_plural = _("Archived Content Views")
+        indexes = [models.Index(fields=["month"], name="content_view_archive_month")]
+
+
+## One lower-cased word of a searchable column, for InvertedIndexSearchBackend (search.py) on databases without trigram indexes
+class SearchToken(models.Model):
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.UUIDField()
+    field = models.CharField(max_length=64)
+    token = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["content_type", "field", "token"], name="search_token_lookup"),
+            models.Index(fields=["content_type", "object_id"], name="search_token_object"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.content_type} {self.object_id} {self.field}: {self.token}"
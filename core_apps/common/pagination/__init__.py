@@ -0,0 +1,4 @@
+from .counts import estimated_count
+from .paginators import EstimatedCountPaginator
+
+__all__ = ["EstimatedCountPaginator", "estimated_count"]
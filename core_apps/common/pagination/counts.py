@@ -0,0 +1,53 @@
+import json
+from typing import Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import QuerySet
+
+
+def exact_count_threshold() -> int:
+    return getattr(settings, "PAGINATION_EXACT_COUNT_THRESHOLD", 10_000)
+
+
+## row count of the whole table from pg_class.reltuples (kept up to date by autovacuum/ANALYZE)
+def table_estimate(queryset: QuerySet) -> Optional[int]:
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # -1 (PostgreSQL 14+) or 0 means the table was never analyzed.
+    return row[0] if row and row[0] > 0 else None
+
+
+## the planner's row estimate for queryset; EXPLAIN only, nothing is executed
+def planner_estimate(queryset: QuerySet) -> Optional[int]:
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+## queryset.count() without a full scan of a big PostgreSQL table: table statistics when unfiltered, else the planner's estimate.
+# Exact below PAGINATION_EXACT_COUNT_THRESHOLD rows, on other databases, or when there's no estimate
+def estimated_count(queryset: QuerySet) -> int:
+    if connections[queryset.db].vendor != "postgresql":
+        return queryset.count()
+
+    query = queryset.query
+    try:
+        if not query.where and not query.distinct and query.group_by is None and not query.combinator:
+            estimate = table_estimate(queryset)
+        else:
+            estimate = planner_estimate(queryset)
+    except DatabaseError:
+        estimate = None
+
+    if estimate is None or estimate < exact_count_threshold():
+        return queryset.count()
+    return estimate
@@ -0,0 +1,9 @@
+from rest_framework.pagination import PageNumberPagination
+
+from .paginators import EstimatedCountPaginator
+
+
+## PageNumberPagination counted with estimated_count()
+class EstimatedCountPageNumberPagination(PageNumberPagination):
+    django_paginator_class = EstimatedCountPaginator
+
@@ -0,0 +1,45 @@
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+from .counts import estimated_count
+
+
+## Paginator counted with estimated_count(). Each page fetches one row more than it shows, so a page that finds it raises
+# count to cover the next page and a short page sets the real total; only a page with no rows is EmptyPage
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self) -> int:
+        if isinstance(self.object_list, QuerySet):
+            return estimated_count(self.object_list)
+        return super().count
+
+    @property
+    def _probes(self) -> bool:
+        return isinstance(self.object_list, QuerySet) and not self.orphans
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            number = int(number)  # already checked to be a whole number
+            if not self._probes or number < 1:
+                raise
+            return number
+
+    def page(self, number):
+        if not self._probes:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages["no_results"])
+        if len(rows) > self.per_page:
+            self.count = max(self.count, bottom + self.per_page + 1)
+            rows = rows[: self.per_page]
+        else:
+            self.count = bottom + len(rows)
+        self.__dict__.pop("num_pages", None)
+        return self._get_page(rows, number, self)
+
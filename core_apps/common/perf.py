@@ -0,0 +1,67 @@
+from collections import defaultdict
+from typing import Dict, List
+
+from . import metrics
+from .log_context import RequestContext
+
+PREFIX = "perf."
+HISTOGRAMS = ("wall", "db", "auth")
+COUNTERS = ("requests", "db_queries", "cache_hits", "cache_misses")
+
+
+def endpoint_name(method: str, route: str) -> str:
+    return f"{method}:{route or 'unmatched'}"
+
+
+## adds one sampled request to the shared per-endpoint metrics
+def record(endpoint: str, context: RequestContext, wall_ms: float) -> None:
+    name = f"{PREFIX}{endpoint}"
+    metrics.observe(f"{name}.wall", wall_ms)
+    metrics.observe(f"{name}.db", context.db_time * 1000)
+    metrics.observe(f"{name}.auth", context.auth_time * 1000)
+    metrics.increment(f"{name}.requests")
+    if context.db_queries:
+        metrics.increment(f"{name}.db_queries", context.db_queries)
+    if context.cache_hits:
+        metrics.increment(f"{name}.cache_hits", context.cache_hits)
+    if context.cache_misses:
+        metrics.increment(f"{name}.cache_misses", context.cache_misses)
+
+
+def server_timing(context: RequestContext, wall_ms: float) -> str:
+    return ", ".join(
+        (
+            f"total;dur={wall_ms:.1f}",
+            f'db;dur={context.db_time * 1000:.1f};desc="{context.db_queries} queries"',
+            f"auth;dur={context.auth_time * 1000:.1f}",
+            f'cache;desc="{context.cache_hits} hits, {context.cache_misses} misses"',
+        )
+    )
+
+
+## one row per endpoint from every process's metrics, slowest p95 first; counts are of sampled requests only
+def endpoint_summary() -> List[Dict]:
+    shared = metrics.read_shared(PREFIX)
+    rows: Dict[str, Dict] = defaultdict(dict)
+    for name, summary in shared["histograms"].items():
+        endpoint, kind = name[len(PREFIX):].rsplit(".", 1)
+        rows[endpoint][kind] = summary
+    for name, value in shared["counters"].items():
+        endpoint, kind = name[len(PREFIX):].rsplit(".", 1)
+        rows[endpoint][kind] = value
+
+    result = []
+    for endpoint, row in rows.items():
+        requests = row.get("requests", 0)
+        result.append(
+            {
+                "endpoint": endpoint,
+                "requests": requests,
+                **{kind: row.get(kind) for kind in HISTOGRAMS},
+                "db_queries_per_request": row.get("db_queries", 0) / requests if requests else None,
+                "cache_hits": row.get("cache_hits", 0),
+                "cache_misses": row.get("cache_misses", 0),
+            }
+        )
+    result.sort(key=lambda row: (row["wall"] or {}).get("p95") or 0, reverse=True)
+    return result
@@ -0,0 +1,96 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import ContentView, ContentViewArchive, ContentViewDaily
+from .view_recorder import UPSERT_BATCH_SIZE, upsert
+
+
+def day_bounds(day: date):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+## Refreshes ContentViewDaily.unique_viewers for one day. A ContentView row only keeps a viewer's latest view, so the count is only
+# ever raised (GREATEST/MAX on conflict): run it through the day and once just after midnight. Returns the objects rolled up
+def rollup_day(day: date) -> int:
+    using = router.db_for_write(ContentViewDaily)
+    keep_max = "GREATEST" if connections[using].vendor == "postgresql" else "MAX"
+    start, end = day_bounds(day)
+
+    per_object = (
+        ContentView.objects.using(using)
+        .filter(last_viewed__gte=start, last_viewed__lt=end)
+        .values_list("content_type_id", "object_id")
+        .annotate(viewers=Count("id"))
+        .order_by()
+    )
+
+    objects = 0
+    batch: List[ContentViewDaily] = []
+    for content_type_id, object_id, viewers in per_object.iterator(chunk_size=UPSERT_BATCH_SIZE):
+        batch.append(
+            ContentViewDaily(
+                day=day,
+                content_type_id=content_type_id,
+                object_id=object_id,
+                unique_viewers=viewers,
+            )
+        )
+        if len(batch) == UPSERT_BATCH_SIZE:
+            objects += _write_rollups(using, batch, keep_max)
+            batch = []
+    objects += _write_rollups(using, batch, keep_max)
+    return objects
+
+
+def _write_rollups(using: str, batch: List[ContentViewDaily], keep_max: str) -> int:
+    upsert(
+        using,
+        batch,
+        ["content_type", "object_id", "day"],
+        {"unique_viewers": keep_max + "({table}.{column}, excluded.{column})"},
+    )
+    return len(batch)
+
+
+def rollup_days(days: Iterable[date]) -> int:
+    return sum(rollup_day(day) for day in days)
+
+
+## Moves ContentView rows last viewed before older_than (default CONTENT_VIEW_RETENTION_DAYS ago) into ContentViewArchive, oldest
+# first, one transaction per batch so the hot table is never locked for long. Returns the rows moved
+def archive_views(older_than: Optional[datetime] = None, batch_size: Optional[int] = None) -> int:
+    if older_than is None:
+        older_than = timezone.now() - timedelta(days=getattr(settings, "CONTENT_VIEW_RETENTION_DAYS", 90))
+    batch_size = batch_size or getattr(settings, "CONTENT_VIEW_ARCHIVE_BATCH_SIZE", 5000)
+    using = router.db_for_write(ContentView)
+
+    moved = 0
+    while True:
+        with transaction.atomic(using=using):
+            rows = list(
+                ContentView.objects.using(using)
+                .filter(last_viewed__lt=older_than)
+                .order_by("last_viewed")
+                .values(
+                    "id", "content_type_id", "object_id", "user_id", "viewer_ip",
+                    "last_viewed", "created_at", "updated_at",
+                )[:batch_size]
+            )
+            if not rows:
+                return moved
+
+            ContentViewArchive.objects.using(using).bulk_create(
+                [
+                    ContentViewArchive(month=timezone.localdate(row["last_viewed"]).replace(day=1), **row)
+                    for row in rows
+                ],
+                ignore_conflicts=True,
+            )
+            ContentView.objects.using(using).filter(id__in=[row["id"] for row in rows]).delete()
+        moved += len(rows)
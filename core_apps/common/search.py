@@ -0,0 +1,178 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Type
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, router, transaction
+from django.db.models import Model, Q, QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.utils.module_loading import import_string
+
+from .models import SearchToken
+
+MAX_TOKEN_LENGTH = 100
+INDEX_BATCH_SIZE = 1000
+WORD_RE = re.compile(r"\w+")
+
+
+## strips Django's ^/=/@ search prefix: "^email" -> ("^", "email")
+def split_lookup(lookup: str) -> Tuple[str, str]:
+    if lookup[:1] in ("^", "=", "@"):
+        return lookup[0], lookup[1:]
+    return "", lookup
+
+
+## "profile__user__email" on NextOfKin -> ("profile__user", User, "email"): the relation path, the model owning the column, its name
+def resolve_lookup(model: Type[Model], path: str) -> Tuple[str, Type[Model], str]:
+    *relations, field_name = path.split("__")
+    for name in relations:
+        model = model._meta.get_field(name).related_model
+    return "__".join(relations), model, field_name
+
+
+## the whole value and each word in it, lower-cased; what a search word is prefix-matched against
+def tokenize(value) -> Set[str]:
+    text = str(value).strip().lower() if value is not None else ""
+    if not text:
+        return set()
+    return {token[:MAX_TOKEN_LENGTH] for token in {text, *WORD_RE.findall(text)}}
+
+
+## Django's own icontains search, served on PostgreSQL by the GIN trigram indexes on UPPER(column) from the migrations
+class DatabaseSearchBackend:
+    maintains_index = False
+
+    def condition(self, model: Type[Model], lookup: str, word: str) -> Q:
+        prefix, path = split_lookup(lookup)
+        operator = {"^": "istartswith", "=": "iexact"}.get(prefix, "icontains")
+        return Q(**{f"{path}__{operator}": word})
+
+
+## For databases without trigram indexes (SQLite): the words of searched columns are kept in SearchToken and a search word
+# matches the start of a word ("john" finds "John Smith", "ohn" doesn't). Run rebuild_search_index after switching to it
+class InvertedIndexSearchBackend(DatabaseSearchBackend):
+    maintains_index = True
+
+    def condition(self, model: Type[Model], lookup: str, word: str) -> Q:
+        prefix, path = split_lookup(lookup)
+        relation, target, field_name = resolve_lookup(model, path)
+        word = word.lower()[:MAX_TOKEN_LENGTH]
+        tokens = SearchToken.objects.filter(
+            content_type=ContentType.objects.get_for_model(target),
+            field=field_name,
+        )
+        tokens = tokens.filter(token=word) if prefix == "=" else tokens.filter(token__startswith=word)
+        return Q(**{f"{relation}__pk__in" if relation else "pk__in": tokens.values("object_id")})
+
+
+@lru_cache(maxsize=None)
+def load_search_backend(path: str) -> DatabaseSearchBackend:
+    return import_string(path)()
+
+
+def get_search_backend() -> DatabaseSearchBackend:
+    return load_search_backend(
+        getattr(settings, "ADMIN_SEARCH_BACKEND", "core_apps.common.search.DatabaseSearchBackend")
+    )
+
+
+## The (model, column) pairs reachable from registered search fields; while the backend keeps an index, saving or deleting one
+# of those models rewrites its SearchToken rows (skipped when update_fields touch no indexed column)
+class SearchIndex:
+    def __init__(self) -> None:
+        self.fields: Dict[Type[Model], Set[str]] = {}
+
+    def register(self, model: Type[Model], lookups: Iterable[str]) -> None:
+        for lookup in lookups:
+            _, target, field_name = resolve_lookup(model, split_lookup(lookup)[1])
+            if target not in self.fields:
+                if not isinstance(target._meta.pk, models.UUIDField):
+                    raise ImproperlyConfigured(
+                        f"{target._meta.label} needs a UUID primary key to be search indexed."
+                    )
+                self.fields[target] = set()
+                uid = f"search_index_{target._meta.label_lower}"
+                post_save.connect(self.on_save, sender=target, dispatch_uid=uid)
+                post_delete.connect(self.on_delete, sender=target, dispatch_uid=uid)
+            self.fields[target].add(field_name)
+
+    def on_save(self, sender: Type[Model], instance: Model, **kwargs) -> None:
+        if kwargs.get("raw") or not get_search_backend().maintains_index:
+            return
+        fields = self.fields[sender]
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            fields = fields & set(update_fields)
+        if fields:
+            self.index(instance, fields)
+
+    def on_delete(self, sender: Type[Model], instance: Model, **kwargs) -> None:
+        if get_search_backend().maintains_index:
+            SearchToken.objects.filter(
+                content_type=ContentType.objects.get_for_model(sender), object_id=instance.pk
+            ).delete()
+
+    def tokens_for(self, instance: Model, fields: Iterable[str]) -> List[SearchToken]:
+        content_type = ContentType.objects.get_for_model(type(instance))
+        return [
+            SearchToken(content_type=content_type, object_id=instance.pk, field=name, token=token)
+            for name in fields
+            for token in tokenize(getattr(instance, name))
+        ]
+
+    def index(self, instance: Model, fields: Iterable[str]) -> None:
+        fields = list(fields)
+        using = router.db_for_write(SearchToken)
+        with transaction.atomic(using=using):
+            SearchToken.objects.using(using).filter(
+                content_type=ContentType.objects.get_for_model(type(instance)),
+                object_id=instance.pk,
+                field__in=fields,
+            ).delete()
+            SearchToken.objects.using(using).bulk_create(self.tokens_for(instance, fields))
+
+    ## tokens for rows added with bulk_create, which sends no post_save
+    def index_created(self, model: Type[Model], instances: Sequence[Model], using: Optional[str] = None) -> None:
+        if model not in self.fields or not instances or not get_search_backend().maintains_index:
+            return
+        fields = sorted(self.fields[model])
+        SearchToken.objects.using(using or router.db_for_write(SearchToken)).bulk_create(
+            [token for instance in instances for token in self.tokens_for(instance, fields)],
+            batch_size=INDEX_BATCH_SIZE,
+        )
+
+    ## re-creates every token of model; returns the number of rows indexed
+    def rebuild(self, model: Type[Model]) -> int:
+        fields = sorted(self.fields[model])
+        using = router.db_for_write(SearchToken)
+        rows = 0
+        with transaction.atomic(using=using):
+            SearchToken.objects.using(using).filter(
+                content_type=ContentType.objects.get_for_model(model)
+            ).delete()
+            batch: List[SearchToken] = []
+            for instance in model._default_manager.only(*fields).iterator(chunk_size=INDEX_BATCH_SIZE):
+                batch.extend(self.tokens_for(instance, fields))
+                rows += 1
+                if len(batch) >= INDEX_BATCH_SIZE:
+                    SearchToken.objects.using(using).bulk_create(batch)
+                    batch = []
+            SearchToken.objects.using(using).bulk_create(batch)
+        return rows
+
+
+search_index = SearchIndex()
+
+
+## every word of term must match one of lookups, like the admin's search box
+def search(queryset: QuerySet, lookups: Iterable[str], term: str) -> QuerySet:
+    backend = get_search_backend()
+    lookups = list(lookups)
+    for word in term.split():
+        condition = Q()
+        for lookup in lookups:
+            condition |= backend.condition(queryset.model, lookup, word)
+        queryset = queryset.filter(condition)
+    return queryset
@@ -0,0 +1,73 @@
+from contextvars import Token
+from typing import Any, Dict, Tuple, Type
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.db import connections
+from django.db.models import Exists, Model, OuterRef
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import log_context
+from .models import ContentView
+from .user_cache import user_cache
+from .view_recorder import reset_content_type_ids
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender: Type[Model], instance: Model, **kwargs: Any) -> None:
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def drop_views_shadowed_by_anonymous(sender: Type[Model], instance: Model, **kwargs: Any) -> None:
+    # Deleting a user sets their views' user to NULL. Where an anonymous view of the
+    # same object from the same IP already exists, that would break
+    # unique_anonymous_content_view, so those rows go away first.
+    anonymous_twin = ContentView.objects.filter(
+        user__isnull=True,
+        content_type=OuterRef("content_type"),
+        object_id=OuterRef("object_id"),
+        viewer_ip=OuterRef("viewer_ip"),
+    )
+    ContentView.objects.filter(Exists(anonymous_twin), user=instance).delete()
+
+
+post_migrate.connect(reset_content_type_ids)
+
+
+@before_task_publish.connect
+def add_request_id_header(headers: Dict[str, Any], **kwargs: Any) -> None:
+    # Tasks published while handling a request carry its id; the worker's
+    # log records then share it (see start_task_context below).
+    context = log_context.current_context()
+    if context is not None and headers is not None:
+        headers.setdefault("request_id", context.request_id)
+
+
+_task_contexts: Dict[str, Tuple[Token, log_context.RequestContext]] = {}
+
+
+@task_prerun.connect
+def start_task_context(task_id: str, task: Any, **kwargs: Any) -> None:
+    if log_context.current_context() is not None:  # an eager task inside a request keeps its context
+        return
+    request_id = getattr(task.request, "request_id", None) or task_id
+    context = log_context.RequestContext(request_id, route=task.name)
+    token = log_context.activate(context)
+    for alias in connections:
+        connections[alias].execute_wrappers.append(context.count_query)
+    _task_contexts[task_id] = (token, context)
+
+
+@task_postrun.connect
+def end_task_context(task_id: str, **kwargs: Any) -> None:
+    token, context = _task_contexts.pop(task_id, (None, None))
+    if token is None:
+        return
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if context.count_query in wrappers:
+            wrappers.remove(context.count_query)
+    log_context.deactivate(token)
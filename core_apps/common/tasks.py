@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.utils import timezone
+from loguru import logger
+
+from .rollups import archive_views, rollup_days
+
+
+## beat task: refresh today's and yesterday's ContentViewDaily rows
+@shared_task
+def rollup_content_views() -> int:
+    today = timezone.localdate()
+    objects = rollup_days([today - timedelta(days=1), today])
+    logger.info(f"Rolled up content views for {objects} objects")
+    return objects
+
+
+## beat task: move ContentView rows past CONTENT_VIEW_RETENTION_DAYS to the archive
+@shared_task
+def archive_content_views() -> int:
+    moved = archive_views()
+    logger.info(f"Archived {moved} content views")
+    return moved
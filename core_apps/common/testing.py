@@ -0,0 +1,48 @@
+## Fixtures shared by the apps' test modules
+
+from datetime import date
+
+from core_apps.user_auth.models import User
+from core_apps.user_profile.models import NextOfKin
+
+TEST_SETTINGS = dict(
+    PASSWORD_HASH_WORKERS=0,
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    OTP_BACKEND="core_apps.user_auth.otp.CacheOTPBackend",
+    CELERY_TASK_ALWAYS_EAGER=True,
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+)
+
+
+def make_user(**extra) -> User:
+    fields = {
+        "email": "query.count@example.com",
+        "password": "query-count-password",
+        "first_name": "Query",
+        "last_name": "Count",
+        "id_no": 123456789,
+        "security_question": User.SecurityQuestions.MAIDEN_NAME,
+        "security_answer": "count",
+    }
+    fields.update(extra)
+    return User.objects.create_user(**fields)
+
+
+def next_of_kin_fields(profile, **extra) -> dict:
+    fields = {
+        "profile": profile,
+        "title": NextOfKin.Salutation.MRS,
+        "first_name": "Next",
+        "last_name": "Kin",
+        "date_of_birth": date(1970, 1, 1),
+        "gender": NextOfKin.Gender.FEMALE,
+        "relationship": "Mother",
+        "email_address": "kin@example.com",
+        "phone_number": "+14155552671",
+        "address": "1 Main Street",
+        "city": "Srinagar",
+        "country": "IN",
+        "is_primary": True,
+    }
+    fields.update(extra)
+    return fields
@@ -1,3 +1,518 @@
-from django.test import TestCase
+import inspect
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Callable
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.contrib import admin
+from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import EmptyPage
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from loguru import logger
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core_apps.common import metrics
+from core_apps.common.admin import content_object_prefetch
+from core_apps.common.cookie_auth import CookieAuthentication, rejected_tokens, validated_tokens
+from core_apps.common.ids import uuid7, uuid7_timestamp
+from core_apps.common.log_context import json_log_format, request_context
+from core_apps.common.models import ContentView, ContentViewArchive, ContentViewDaily, SearchToken
+from core_apps.common.pagination import EstimatedCountPaginator
+from core_apps.common.rollups import archive_views, rollup_day
+from core_apps.common.search import search_index
+from core_apps.common.signals import add_request_id_header
+from core_apps.common.testing import TEST_SETTINGS, make_user, next_of_kin_fields
+from core_apps.common.user_cache import CachedUserResolver, user_cache
+from core_apps.common.view_recorder import ViewRecorder, content_type_id_for
+from core_apps.user_auth.models import User
+from core_apps.user_profile.models import NextOfKin, Profile
+
+
+class UUID7Tests(SimpleTestCase):
+    def test_version_variant_and_timestamp(self) -> None:
+        before = time.time()
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        self.assertAlmostEqual(uuid7_timestamp(value), before, delta=1)
+
+    def test_sorted_and_unique_within_one_millisecond(self) -> None:
+        with mock.patch.multiple("core_apps.common.ids", _last_ms=0, _counter=0), mock.patch(
+            "core_apps.common.ids.time.time_ns", return_value=1_700_000_000_000 * 1_000_000
+        ):
+            values = [uuid7() for _ in range(5000)]  # more than the 12-bit counter holds
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(len(set(values)), len(values))
+        self.assertEqual(uuid7_timestamp(values[0]), 1_700_000_000)
+        self.assertEqual({value.version for value in values}, {7})
+
+    def test_clock_going_backwards_keeps_order(self) -> None:
+        first = uuid7()
+        with mock.patch("core_apps.common.ids.time.time_ns", return_value=0):
+            second = uuid7()
+        self.assertLess(first, second)
+
+
+@override_settings(**TEST_SETTINGS)
+class ChangelistQueryCountTests(TestCase):
+    """A changelist page must cost the same number of queries for 2 rows as for 20."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            password="admin-password",
+            first_name="Admin",
+            last_name="User",
+            id_no=100000000,
+            security_question=User.SecurityQuestions.MAIDEN_NAME,
+            security_answer="admin",
+        )
+        self.client.force_login(self.admin)
+        self.customers = 0
+
+    def add_customers(self, count: int) -> None:
+        for _ in range(count):
+            self.customers += 1
+            user = make_user(
+                email=f"customer{self.customers}@example.com", id_no=200000000 + self.customers
+            )
+            NextOfKin(**next_of_kin_fields(user.profile)).save()
+            ContentView.objects.create(
+                content_type=ContentType.objects.get_for_model(Profile),
+                object_id=user.profile.pk,
+                user=user,
+                viewer_ip="10.0.0.1",
+                last_viewed=timezone.now(),
+            )
+            ContentViewDaily.objects.create(
+                day=date.today(),
+                content_type=ContentType.objects.get_for_model(Profile),
+                object_id=user.profile.pk,
+                views=1,
+            )
+
+    def changelist_queries(self, url: str) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantChangelistQueries(self, url: str, add_rows: Callable[[int], None]) -> None:
+        add_rows(2)
+        self.changelist_queries(url)  # warm per-process caches (ContentType lookups)
+        small = self.changelist_queries(url)
+        add_rows(18)
+        self.assertEqual(self.changelist_queries(url), small)
+
+    def test_changelists(self) -> None:
+        for model in (User, Profile, NextOfKin, ContentView, ContentViewDaily):
+            opts = model._meta
+            with self.subTest(model=opts.label):
+                self.assertConstantChangelistQueries(
+                    reverse(f"admin:{opts.app_label}_{opts.model_name}_changelist"),
+                    self.add_customers,
+                )
+
+    def test_content_object_prefetch_covers_only_the_page(self) -> None:
+        self.add_customers(1)
+        prefetch = content_object_prefetch(list(ContentView.objects.all()))
+        self.assertEqual([queryset.model for queryset in prefetch.querysets], [Profile])
+        self.assertEqual(content_object_prefetch([]).querysets, [])
+
+
+@override_settings(**TEST_SETTINGS)
+class AdminSearchTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.alice = make_user(email="alice.rahman@example.com", first_name="Alice", id_no=111111111)
+        self.bob = make_user(email="bob.khan@example.com", first_name="Bob", id_no=222222222)
+
+    def search(self, model, term: str) -> list:
+        queryset, _ = admin.site._registry[model].get_search_results(None, model.objects.all(), term)
+        return list(queryset)
+
+    def test_exact_fast_paths(self) -> None:
+        with self.assertNumQueries(1):
+            self.assertEqual(self.search(User, "Alice.Rahman@example.com"), [self.alice])
+        self.assertEqual(self.search(User, "222222222"), [self.bob])
+        self.assertEqual(self.search(Profile, "111111111"), [self.alice.profile])
+
+    def test_falls_back_when_nothing_matches_exactly(self) -> None:
+        with self.assertNumQueries(1):
+            self.assertEqual(self.search(User, "rahman@example"), [self.alice])
+
+    def test_database_backend(self) -> None:
+        self.assertEqual(self.search(User, "ahma"), [self.alice])
+        self.assertEqual(self.search(Profile, "khan"), [self.bob.profile])
+
+    @override_settings(ADMIN_SEARCH_BACKEND="core_apps.common.search.InvertedIndexSearchBackend")
+    def test_inverted_index_backend(self) -> None:
+        for model in list(search_index.fields):
+            search_index.rebuild(model)
+        self.assertEqual(self.search(User, "rahm"), [self.alice])
+        self.assertEqual(self.search(User, "ahma"), [])
+        self.assertEqual(self.search(Profile, "bob khan"), [self.bob.profile])
+
+        self.bob.last_name = "Mir"
+        self.bob.save()
+        self.assertEqual(self.search(User, "mir"), [self.bob])
+
+        self.bob.delete()
+        self.assertFalse(SearchToken.objects.filter(object_id=self.bob.pk).exists())
+
+
+@override_settings(**TEST_SETTINGS)
+class PaginationTests(TestCase):
+    def setUp(self) -> None:
+        self.users = [
+            make_user(email=f"page{n}@example.com", id_no=300000000 + n) for n in range(7)
+        ]
+
+    def test_estimated_count_is_exact_for_small_tables(self) -> None:
+        paginator = EstimatedCountPaginator(User.objects.order_by("email"), 3)
+        self.assertEqual(paginator.count, 7)
+        self.assertEqual(paginator.num_pages, 3)
+
+    def test_pages_past_an_estimate_stay_reachable(self) -> None:
+        queryset = User.objects.filter(email__startswith="page").order_by("email")
+        for estimate in (4, 20):
+            with self.subTest(estimate=estimate), mock.patch(
+                "core_apps.common.pagination.paginators.estimated_count", return_value=estimate
+            ):
+                paginator = EstimatedCountPaginator(queryset, 3)
+                self.assertTrue(paginator.page(2).has_next())
+                last = paginator.page(3)
+                self.assertEqual(len(last), 1)
+                self.assertFalse(last.has_next())
+                self.assertEqual((paginator.count, paginator.num_pages), (7, 3))
+                with self.assertRaises(EmptyPage):
+                    paginator.page(4)
+
+
+@override_settings(**TEST_SETTINGS)
+class RequestContextLoggingTests(TestCase):
+    def setUp(self) -> None:
+        self.lines = []
+        sink = logger.add(self.lines.append, level="DEBUG", format=json_log_format)
+        self.addCleanup(logger.remove, sink)
+
+    def test_records_carry_request_context(self) -> None:
+        response = self.client.get(reverse("admin:login"), HTTP_X_REQUEST_ID="nginx-request-1")
+        self.assertEqual(response["X-Request-ID"], "nginx-request-1")
+
+        records = [json.loads(line) for line in self.lines]
+        completed = [r for r in records if r.get("request_id") == "nginx-request-1"]
+        self.assertTrue(completed)
+        self.assertEqual(completed[-1]["route"], reverse("admin:login").lstrip("/"))
+        self.assertIsInstance(completed[-1]["db_queries"], int)
+        self.assertIn("duration_ms", completed[-1])
+
+        response = self.client.get(reverse("admin:login"), HTTP_X_REQUEST_ID="not a valid id")
+        self.assertRegex(response["X-Request-ID"], r"^[0-9a-f]{32}$")
+
+    def test_request_id_published_with_tasks(self) -> None:
+        headers = {}
+        add_request_id_header(headers=headers)
+        self.assertEqual(headers, {})
+        with request_context("request-2"):
+            add_request_id_header(headers=headers)
+        self.assertEqual(headers, {"request_id": "request-2"})
+
+
+class InterceptHandlerTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.records = []
+        sink = logger.add(lambda message: self.records.append(message.record), level="DEBUG", format="{message}")
+        self.addCleanup(logger.remove, sink)
+
+    def test_stdlib_records_keep_their_caller(self) -> None:
+        def log_from_thread() -> None:
+            logging.getLogger("core_apps.intercept.thread").warning("from a thread")
+
+        line = inspect.currentframe().f_lineno + 1
+        logging.getLogger("core_apps.intercept").debug("from stdlib %s", 1)
+        thread = threading.Thread(target=log_from_thread)
+        thread.start()
+        thread.join()
+        logger.info("straight to loguru")
+
+        mine = ("from stdlib 1", "from a thread", "straight to loguru")
+        debug, warning, direct = [record for record in self.records if record["message"] in mine]
+        self.assertEqual(
+            (debug["level"].name, debug["message"], debug["name"], debug["function"], debug["line"]),
+            ("DEBUG", "from stdlib 1", "core_apps.intercept", "test_stdlib_records_keep_their_caller", line),
+        )
+        self.assertEqual((warning["name"], warning["function"]), ("core_apps.intercept.thread", "log_from_thread"))
+        self.assertEqual((direct["name"], direct["function"]), (__name__, "test_stdlib_records_keep_their_caller"))
+
+
+@override_settings(**TEST_SETTINGS, PERF_SAMPLE_RATE=1.0, PERF_SERVER_TIMING=True)
+class ServerTimingTests(TestCase):
+    def setUp(self) -> None:
+        metrics.registry.flush()  # push what earlier tests recorded, then drop it
+        cache.clear()
+
+    def test_sampled_request_timed_and_aggregated(self) -> None:
+        response = self.client.get(reverse("admin:login"))
+        self.assertRegex(response["Server-Timing"], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", auth;')
+
+        metrics.registry.flush()
+        self.client.force_login(make_user(is_staff=True, is_superuser=True))
+        rows = self.client.get(reverse("perf-endpoints")).json()["endpoints"]
+        login = next(row for row in rows if row["endpoint"] == "GET:" + reverse("admin:login").lstrip("/"))
+        self.assertEqual(login["requests"], 1)
+        self.assertEqual(login["wall"]["count"], 1)
+
+    def test_unsampled_and_non_superuser(self) -> None:
+        with override_settings(PERF_SAMPLE_RATE=0):
+            self.assertNotIn("Server-Timing", self.client.get(reverse("admin:login")))
+        self.client.force_login(make_user(is_staff=True))
+        self.assertEqual(self.client.get(reverse("perf-endpoints")).status_code, 302)
+
+
+@override_settings(**TEST_SETTINGS, METRICS_FLUSH_INTERVAL=0.05)
+class MetricsFlushTests(TestCase):
+    def test_background_thread_flushes_to_shared_cache(self) -> None:
+        cache.clear()
+        registry = metrics.MetricsRegistry()
+        registry.increment("test.flushed", 3)
+        registry.observe("test.flushed_ms", 12)
+
+        deadline = time.monotonic() + 5
+        while "test.flushed" not in metrics.read_shared("test.")["counters"] and time.monotonic() < deadline:
+            time.sleep(0.02)
+        time.sleep(0.1)  # let a flush that is still running finish
+
+        shared = metrics.read_shared("test.")
+        self.assertEqual(shared["counters"], {"test.flushed": 3})
+        self.assertEqual(shared["histograms"]["test.flushed_ms"]["count"], 1)
+        self.assertEqual(registry.snapshot(), {"counters": {}, "histograms": {}})
+
+
+@override_settings(
+    **TEST_SETTINGS,
+    CONTENT_VIEW_BUFFERING=True,
+    CONTENT_VIEW_FLUSH_INTERVAL=3600,
+    CONTENT_VIEW_BUFFER_SIZE=100,
+)
+class ViewRecorderTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.recorder = ViewRecorder()
+        self.viewer = make_user()
+        self.other = make_user(email="other.viewer@example.com", id_no=987654321)
+        self.profile = self.other.profile
+        self.content_type_id = content_type_id_for(self.profile)
+
+    def view(self, user=None, ip="10.0.0.1") -> None:
+        self.recorder.record(self.content_type_id, self.profile.pk, user.pk if user else None, ip)
+
+    def test_views_are_coalesced_until_flushed(self) -> None:
+        self.view(self.viewer)
+        self.view(self.viewer)
+        self.view()
+        self.assertEqual(self.recorder.pending(), 2)
+        self.assertFalse(ContentView.objects.exists())
+
+        self.assertEqual(self.recorder.flush(), 2)
+        self.assertEqual(ContentView.objects.count(), 2)
+        daily = ContentViewDaily.objects.get()
+        self.assertEqual(daily.views, 3)
+
+    def test_flush_upserts_existing_rows(self) -> None:
+        self.view(self.viewer)
+        self.recorder.flush()
+        first = ContentView.objects.get()
+
+        self.view(self.viewer)
+        self.view(ip=None)
+        self.view(self.viewer, ip=None)
+        self.recorder.flush()
+        self.view(ip=None)  # no IP: matched by the *_no_ip partial indexes
+        self.view(self.viewer, ip=None)
+        self.recorder.flush()
+        other_process = ViewRecorder()
+        other_process.record(self.content_type_id, self.profile.pk, None, None)
+        other_process.flush()
+
+        self.assertEqual(ContentView.objects.count(), 3)
+        again = ContentView.objects.get(user=self.viewer, viewer_ip__isnull=False)
+        self.assertEqual(again.pk, first.pk)
+        self.assertGreater(again.last_viewed, first.last_viewed)
+        self.assertEqual(ContentView.objects.filter(user__isnull=True, viewer_ip__isnull=True).count(), 1)
+        self.assertEqual(ContentViewDaily.objects.get().views, 7)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ContentView.objects.create(
+                content_type_id=self.content_type_id, object_id=self.profile.pk, last_viewed=timezone.now()
+            )
+
+    def test_failed_flush_is_retried(self) -> None:
+        self.view(self.viewer)
+        self.view()
+        with mock.patch.object(ViewRecorder, "_write", side_effect=DatabaseError("connection lost")):
+            self.assertEqual(self.recorder.flush(), 0)
+        self.assertEqual(self.recorder.pending(), 2)
+        self.view()
+
+        self.assertEqual(self.recorder.flush(), 2)
+        self.assertEqual(ContentView.objects.count(), 2)
+        self.assertEqual(ContentViewDaily.objects.get().views, 3)
+
+    def test_failed_flush_dropped_past_buffer_size(self) -> None:
+        with override_settings(CONTENT_VIEW_BUFFER_SIZE=2):
+            self.view(self.viewer)
+            with mock.patch.object(ViewRecorder, "_write", side_effect=DatabaseError("connection lost")):
+                self.view()  # fills the buffer: flushed, fails, requeued
+                self.assertEqual(self.recorder.pending(), 2)
+                self.view(ip="10.0.0.2")  # over the cap: this failure is dropped
+            self.assertEqual(self.recorder.pending(), 0)
+
+    def test_buffer_size_triggers_flush(self) -> None:
+        with override_settings(CONTENT_VIEW_BUFFER_SIZE=2):
+            self.view(self.viewer)
+            self.assertFalse(ContentView.objects.exists())
+            self.view()
+        self.assertEqual(self.recorder.pending(), 0)
+        self.assertEqual(ContentView.objects.count(), 2)
+
+    def test_rollup_and_archive(self) -> None:
+        self.view(self.viewer)
+        self.view()
+        self.recorder.flush()
+        today = timezone.localdate()
+        self.assertEqual(rollup_day(today), 1)
+        self.assertEqual(ContentViewDaily.objects.get(day=today).unique_viewers, 2)
+
+        # The stored count is only ever raised.
+        ContentView.objects.filter(user__isnull=True).delete()
+        rollup_day(today)
+        self.assertEqual(ContentViewDaily.objects.get(day=today).unique_viewers, 2)
+
+        old = timezone.now() - timedelta(days=100)
+        ContentView.objects.update(last_viewed=old)
+        self.assertEqual(archive_views(batch_size=1), 1)
+        self.assertFalse(ContentView.objects.exists())
+        archived = ContentViewArchive.objects.get()
+        self.assertEqual(archived.month, timezone.localdate(old).replace(day=1))
+
+
+@override_settings(**TEST_SETTINGS)
+class CachedUserResolverTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = make_user()
+        self.resolver = CachedUserResolver()
+
+    def test_cached_snapshot_served_until_invalidated(self) -> None:
+        self.resolver.store(User.objects.get(pk=self.user.pk), "jti", self.resolver.begin_load(self.user.pk))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolver.get(self.user.pk, "jti").email, self.user.email)
+
+        self.resolver.invalidate(self.user.pk)
+        self.assertIsNone(self.resolver.get(self.user.pk, "jti"))
+
+    def test_row_read_before_invalidate_is_not_cached(self) -> None:
+        ticket = self.resolver.begin_load(self.user.pk)
+        stale = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(account_status=User.AccountStatus.LOCKED)
+        self.resolver.invalidate(self.user.pk)
+        self.resolver.store(stale, "jti", ticket)
+
+        self.assertIsNone(self.resolver.get(self.user.pk, "jti"))
+        self.assertIsNone(CachedUserResolver().get(self.user.pk, "jti"))  # another process, shared cache only
+
+    def test_bulk_updates_invalidate(self) -> None:
+        other = make_user(email="other.customer@example.com", id_no=987654321)
+        for user in (self.user, other):
+            user_cache.store(User.objects.get(pk=user.pk), "jti", user_cache.begin_load(user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            User.objects.filter(pk=self.user.pk).update(otp="123456")  # not a cached column
+        self.assertEqual(callbacks, [])
+        self.assertIsNotNone(user_cache.get(self.user.pk, "jti"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(is_active=True).update(is_active=False)  # e.g. an admin bulk action
+        self.assertIsNone(user_cache.get(self.user.pk, "jti"))
+        self.assertIsNone(CachedUserResolver().get(other.pk, "jti"))
+
+        user_cache.store(User.objects.get(pk=other.pk), "jti", user_cache.begin_load(other.pk))
+        other.role = User.RoleChoices.TELLER
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.bulk_update([other], ["role"])
+        self.assertIsNone(user_cache.get(other.pk, "jti"))
+
+
+@override_settings(**TEST_SETTINGS, AUTH_TOKEN_CACHE_ENABLED=True, AUTH_TOKEN_NEGATIVE_TTL=5)
+class TokenCacheTests(TestCase):
+    def setUp(self) -> None:
+        validated_tokens.clear()
+        rejected_tokens.clear()
+        self.authentication = CookieAuthentication()
+        self.token = str(AccessToken.for_user(make_user()))
+
+    def decoded(self):
+        return mock.patch.object(
+            JWTAuthentication, "get_validated_token", autospec=True, side_effect=JWTAuthentication.get_validated_token
+        )
+
+    def test_valid_token_decoded_once(self) -> None:
+        with self.decoded() as decode:
+            first = self.authentication.get_validated_token(self.token)
+            second = self.authentication.get_validated_token(self.token)
+        self.assertEqual(decode.call_count, 1)
+        self.assertIs(first, second)
+        self.assertEqual((len(validated_tokens), len(rejected_tokens)), (1, 0))
+
+    def test_bad_token_cached_apart_and_briefly(self) -> None:
+        with self.decoded() as decode:
+            for _ in range(2):
+                with self.assertRaises(InvalidToken):
+                    self.authentication.get_validated_token(self.token[:-2])
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual((len(validated_tokens), len(rejected_tokens)), (0, 1))
+        self.assertLess(rejected_tokens.maxsize, validated_tokens.maxsize)
+
+        (_, expires_at), = rejected_tokens._data.values()
+        self.assertLessEqual(expires_at - time.monotonic(), 5)
+
+    def test_entry_does_not_outlive_the_token(self) -> None:
+        token = AccessToken()
+        token.set_exp(lifetime=timedelta(seconds=30))
+        validated = self.authentication.get_validated_token(str(token))
+
+        (_, expires_at), = validated_tokens._data.values()
+        self.assertLessEqual(expires_at - time.monotonic(), validated["exp"] - time.time() + 0.1)  # both clocks tick in between
+        with mock.patch("core_apps.common.cache.time.monotonic", return_value=expires_at):
+            with self.decoded() as decode:
+                self.authentication.get_validated_token(str(token))
+        self.assertEqual(decode.call_count, 1)
+
+
+@override_settings(**TEST_SETTINGS, CONTENT_VIEW_BUFFERING=True, CONTENT_VIEW_FLUSH_INTERVAL=0.2)
+class ViewRecorderTimerTests(TransactionTestCase):
+    def test_idle_buffer_flushed_by_background_thread(self) -> None:
+        recorder = ViewRecorder()
+        profile = make_user().profile
+        recorder.record(content_type_id_for(profile), profile.pk, None, "10.0.0.1")
+
+        views = ContentView.objects.filter(object_id=profile.pk)
+        deadline = time.monotonic() + 5
+        while not views.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self.assertEqual(views.count(), 1)
+        self.assertEqual(recorder.pending(), 0)
@@ -0,0 +1,131 @@
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router
+
+from .cache import TTLCache
+from .log_context import count_cache_lookup
+
+# The columns kept for an authenticated user. Anything else on the instance is a
+# deferred field and is loaded from the database on first access, so code that
+# needs e.g. ``user.profile`` or ``user.date_joined`` keeps working unchanged.
+SNAPSHOT_FIELDS = (
+    "id",
+    "email",
+    "username",
+    "first_name",
+    "last_name",
+    "role",
+    "account_status",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+)
+
+
+## taken before a user is read from the database, see CachedUserResolver.store
+class LoadTicket(NamedTuple):
+    generation: int
+    started: float
+
+
+## Resolves an access token's user without querying user_auth_user: a local LRU keyed by (user_id, jti), then a snapshot in the shared
+# cache, then the database. invalidate() (on every user write, see signals.py) bumps a per-user generation, so a load that started
+# before the write can't cache the old row afterwards; other processes drop their local copy within AUTH_USER_CACHE_LOCAL_TTL
+class CachedUserResolver:
+    key_prefix = "auth:user"
+
+    def __init__(self) -> None:
+        self.local = TTLCache(
+            maxsize=getattr(settings, "AUTH_USER_CACHE_MAX_SIZE", 10_000),
+            ttl=getattr(settings, "AUTH_USER_CACHE_LOCAL_TTL", 5),
+        )
+        self._invalidated_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, "AUTH_USER_CACHE_ALIAS", "default")]
+
+    def _shared_key(self, user_id: Any) -> str:
+        return f"{self.key_prefix}:{user_id}"
+
+    def _generation_key(self, user_id: Any) -> str:
+        return f"{self.key_prefix}:{user_id}:generation"
+
+    def get(self, user_id: Any, jti: Optional[str] = None):
+        user_id = str(user_id)
+        entry = self.local.get((user_id, jti))
+        if entry is not None:
+            cached_at, snapshot = entry
+            if cached_at > self._invalidated_at.get(user_id, 0.0):
+                return self._build(snapshot)
+
+        shared_key, generation_key = self._shared_key(user_id), self._generation_key(user_id)
+        found = self.shared.get_many([shared_key, generation_key])
+        entry = found.get(shared_key)
+        if entry is not None and entry[0] != found.get(generation_key, 0):
+            entry = None
+        count_cache_lookup(entry is not None)
+        if entry is None:
+            return None
+
+        snapshot = entry[1]
+
+        self.local.set((user_id, jti), (time.monotonic(), snapshot))
+        return self._build(snapshot)
+
+    ## call before reading the user from the database, and pass the ticket to store()
+    def begin_load(self, user_id: Any) -> LoadTicket:
+        return LoadTicket(self.shared.get(self._generation_key(str(user_id)), 0), time.monotonic())
+
+    ## an entry stored after an invalidate() that came in since the ticket was taken is written but never trusted
+    def store(self, user, jti: Optional[str], ticket: LoadTicket) -> None:
+        user_id = str(user.pk)
+        snapshot = tuple(getattr(user, field) for field in SNAPSHOT_FIELDS)
+        self.shared.set(
+            self._shared_key(user_id),
+            (ticket.generation, snapshot),
+            timeout=getattr(settings, "AUTH_USER_CACHE_TTL", 300),
+        )
+        self.local.set((user_id, jti), (ticket.started, snapshot))
+
+    def invalidate(self, user_id: Any) -> None:
+        user_id = str(user_id)
+        now = time.monotonic()
+        horizon = now - self.local.ttl
+        with self._lock:
+            # Marks older than the local TTL can't match a live entry any more.
+            self._invalidated_at = {
+                key: at for key, at in self._invalidated_at.items() if at > horizon
+            }
+            self._invalidated_at[user_id] = now
+        generation_key = self._generation_key(user_id)
+        try:
+            self.shared.incr(generation_key)
+        except ValueError:
+            if not self.shared.add(generation_key, 1, timeout=None):
+                self.shared.incr(generation_key)
+        self.shared.delete(self._shared_key(user_id))
+
+    def _build(self, snapshot):
+        User = get_user_model()
+        values = dict(zip(SNAPSHOT_FIELDS, snapshot))
+        # from_db() expects the loaded values in model field order.
+        field_names = [
+            field.attname
+            for field in User._meta.concrete_fields
+            if field.attname in values
+        ]
+        return User.from_db(
+            router.db_for_read(User),
+            field_names,
+            [values[name] for name in field_names],
+        )
+
+
+user_cache = CachedUserResolver()
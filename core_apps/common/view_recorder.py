@@ -0,0 +1,257 @@
+import atexit
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, close_old_connections, connections, router, transaction
+from django.utils import timezone
+from loguru import logger
+
+from . import metrics
+from .background import PeriodicFlusher
+
+# (content_type_id, object_id, user_id, viewer_ip) -- the ContentView unique key.
+ViewKey = Tuple[int, Any, Any, Optional[str]]
+# (day, content_type_id, object_id) -- the ContentViewDaily unique key.
+DailyKey = Tuple[date, int, Any]
+
+UPDATE_FIELDS = ["last_viewed", "updated_at"]
+
+UPSERT_BATCH_SIZE = 1000
+
+
+## Coalesces ContentView writes in memory, keyed by the ContentView unique key so repeat views collapse into one row, and flushes
+# them every CONTENT_VIEW_FLUSH_INTERVAL seconds (from a background thread), at CONTENT_VIEW_BUFFER_SIZE keys and at exit: one
+# upsert per kind of view plus the per-day counts in ContentViewDaily. A failed flush goes back in the buffer for the next one
+class ViewRecorder:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[ViewKey, datetime] = {}
+        self._daily: Dict[DailyKey, int] = {}
+        self._oldest: Optional[float] = None
+        self._flusher = PeriodicFlusher(
+            self.flush_if_due, lambda: min(1.0, self.flush_interval), name="content-view-flush"
+        )
+
+    @property
+    def flush_interval(self) -> float:
+        return getattr(settings, "CONTENT_VIEW_FLUSH_INTERVAL", 5.0)
+
+    @property
+    def max_buffer(self) -> int:
+        return getattr(settings, "CONTENT_VIEW_BUFFER_SIZE", 10_000)
+
+    def record(self, content_type_id: int, object_id: Any, user_id: Any, viewer_ip: Optional[str]) -> None:
+        # Normalise to what the database hands back, so pending keys match loaded rows.
+        key = (
+            content_type_id,
+            uuid.UUID(str(object_id)),
+            None if user_id is None else uuid.UUID(str(user_id)),
+            viewer_ip or None,
+        )
+        now = timezone.now()
+        daily_key = (timezone.localdate(now), key[0], key[1])
+
+        with self._lock:
+            self._pending[key] = now
+            self._daily[daily_key] = self._daily.get(daily_key, 0) + 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = (
+                len(self._pending) >= self.max_buffer
+                or time.monotonic() - self._oldest >= self.flush_interval
+            )
+
+        metrics.increment("content_views.recorded")
+        if due or not getattr(settings, "CONTENT_VIEW_BUFFERING", True):
+            self.flush()
+        else:
+            self._flusher.start()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    ## background thread: flush once the buffer is flush_interval old
+    def flush_if_due(self) -> int:
+        with self._lock:
+            due = self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval
+        if not due:
+            return 0
+        # No request_started/finished around this thread: retire its connection the same way.
+        close_old_connections()
+        try:
+            return self.flush()
+        finally:
+            close_old_connections()
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            daily, self._daily = self._daily, {}
+            oldest, self._oldest = self._oldest, None
+
+        if not pending:
+            return 0
+
+        # One flush at a time per process, so two flushes can't race on the same new row.
+        with self._flush_lock:
+            started = time.perf_counter()
+            try:
+                self._write(pending, daily)
+            except DatabaseError:
+                self._requeue(pending, daily, oldest)
+                return 0
+            metrics.observe("content_views.flush", (time.perf_counter() - started) * 1000)
+            metrics.increment("content_views.flushed", len(pending))
+        return len(pending)
+
+    def _requeue(self, pending: Dict[ViewKey, datetime], daily: Dict[DailyKey, int], oldest: Optional[float]) -> None:
+        # Put a failed flush back so the next tick retries it, unless that would grow
+        # the buffer past CONTENT_VIEW_BUFFER_SIZE while the database stays down.
+        with self._lock:
+            if len(self._pending.keys() | pending.keys()) > self.max_buffer:
+                requeued = False
+            else:
+                for key, viewed_at in pending.items():
+                    newer = self._pending.get(key)
+                    self._pending[key] = viewed_at if newer is None else max(newer, viewed_at)
+                for key, views in daily.items():
+                    self._daily[key] = self._daily.get(key, 0) + views
+                self._oldest = min(oldest or time.monotonic(), self._oldest or time.monotonic())
+                requeued = True
+
+        if requeued:
+            logger.exception(f"Writing {len(pending)} buffered content views failed, retrying on the next flush")
+            metrics.increment("content_views.requeued", len(pending))
+            self._flusher.start()
+        else:
+            logger.exception(f"Dropping {len(pending)} buffered content views")
+            metrics.increment("content_views.dropped", len(pending))
+
+    def _write(self, pending: Dict[ViewKey, datetime], daily: Dict[DailyKey, int]) -> None:
+        ContentView = apps.get_model("common", "ContentView")
+        ContentViewDaily = apps.get_model("common", "ContentViewDaily")
+        using = router.db_for_write(ContentView)
+
+        # One upsert per kind of view, each aimed at its partial unique index.
+        kinds: Dict[Tuple[bool, bool], List[Any]] = {}
+        for key, viewed_at in pending.items():
+            kinds.setdefault((key[2] is None, key[3] is None), []).append(self._build(ContentView, key, viewed_at))
+
+        conflict_targets = {
+            (False, False): (["content_type", "object_id", "user", "viewer_ip"], {"user": "IS NOT NULL"}),
+            (True, False): (["content_type", "object_id", "viewer_ip"], {"user": "IS NULL"}),
+            (False, True): (["content_type", "object_id", "user"], {"user": "IS NOT NULL", "viewer_ip": "IS NULL"}),
+            (True, True): (["content_type", "object_id"], {"user": "IS NULL", "viewer_ip": "IS NULL"}),
+        }
+        replace = {name: "excluded.{column}" for name in UPDATE_FIELDS}
+
+        with transaction.atomic(using=using):
+            for kind, views in kinds.items():
+                conflict_fields, where = conflict_targets[kind]
+                upsert(using, views, conflict_fields, replace, where=where)
+            upsert(
+                using,
+                [
+                    ContentViewDaily(day=day, content_type_id=content_type_id, object_id=object_id, views=views)
+                    for (day, content_type_id, object_id), views in daily.items()
+                ],
+                ["content_type", "object_id", "day"],
+                {"views": "{table}.{column} + excluded.{column}"},
+            )
+
+    @staticmethod
+    def _build(ContentView, key: ViewKey, viewed_at: datetime):
+        content_type_id, object_id, user_id, viewer_ip = key
+        return ContentView(
+            content_type_id=content_type_id,
+            object_id=object_id,
+            user_id=user_id,
+            viewer_ip=viewer_ip,
+            last_viewed=viewed_at,
+        )
+
+
+view_recorder = ViewRecorder()
+atexit.register(view_recorder.flush)
+
+
+## INSERT ... ON CONFLICT (conflict_fields) [WHERE where] DO UPDATE for instances of one model, which bulk_create can't do for a
+# partial unique index or an increment. updates maps a field to SQL with {table}/{column} filled in, e.g. "excluded.{column}"
+def upsert(
+    using: str,
+    objs: List[Any],
+    conflict_fields: List[str],
+    updates: Dict[str, str],
+    where: Optional[Dict[str, str]] = None,
+) -> None:
+    if not objs:
+        return
+
+    connection = connections[using]
+    opts = objs[0]._meta
+    qn = connection.ops.quote_name
+    table = qn(opts.db_table)
+    # Auto-increment keys are left to the database.
+    fields = [field for field in opts.concrete_fields if field is not opts.auto_field]
+
+    def column(name: str) -> str:
+        return qn(opts.get_field(name).column)
+
+    conflict = f" ON CONFLICT ({', '.join(column(name) for name in conflict_fields)})"
+    if where:
+        conflict += " WHERE " + " AND ".join(f"{column(name)} {predicate}" for name, predicate in where.items())
+    conflict += " DO UPDATE SET " + ", ".join(
+        f"{column(name)} = {expression.format(table=table, column=column(name))}"
+        for name, expression in updates.items()
+    )
+    insert = f"INSERT INTO {table} ({', '.join(qn(field.column) for field in fields)}) VALUES "
+    row = f"({', '.join(['%s'] * len(fields))})"
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), UPSERT_BATCH_SIZE):
+            batch = objs[start:start + UPSERT_BATCH_SIZE]
+            params = [
+                field.get_db_prep_save(field.pre_save(obj, True), connection)
+                for obj in batch
+                for field in fields
+            ]
+            cursor.execute(insert + ", ".join([row] * len(batch)) + conflict, params)
+
+
+_content_type_ids: Dict[str, int] = {}
+
+
+## ContentType id of an instance from a process-wide map, a dict lookup instead of get_for_model's cache walk
+def content_type_id_for(content_object: Any) -> int:
+    label = content_object._meta.concrete_model._meta.label_lower
+    try:
+        return _content_type_ids[label]
+    except KeyError:
+        pass
+
+    # Loaded here on first use rather than in CommonConfig.ready(): ready() also runs
+    # for migrate (django_content_type may not exist yet), for the test runner before
+    # the test database is created, and in every management command that never
+    # records a view, and Django warns against queries there. One query on the first
+    # recorded view per process costs the same; post_migrate clears the map so new
+    # content types are picked up.
+    if not _content_type_ids:
+        _content_type_ids.update(
+            (f"{app_label}.{model}", pk)
+            for pk, app_label, model in ContentType.objects.values_list("pk", "app_label", "model")
+        )
+    if label not in _content_type_ids:
+        _content_type_ids[label] = ContentType.objects.get_for_model(content_object).pk
+    return _content_type_ids[label]
+
+
+def reset_content_type_ids(**kwargs: Any) -> None:
+    _content_type_ids.clear()
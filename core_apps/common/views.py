@@ -1,3 +1,10 @@
-from django.shortcuts import render
+from django.contrib.auth.decorators import user_passes_test
+from django.http import HttpRequest, JsonResponse
 
-# Create your views here.
+from . import perf
+
+
+## per-endpoint latency percentiles collected by ServerTimingMiddleware, for superusers only
+@user_passes_test(lambda user: user.is_superuser, login_url="admin:login")
+def endpoint_timings(request: HttpRequest) -> JsonResponse:
+    return JsonResponse({"endpoints": perf.endpoint_summary()})
@@ -1,33 +1,30 @@
-import random
-import string
-from os import getenv
-from typing import Any, Optional
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
-from django.contrib.auth.hashers import make_password
-from django.contrib.auth.models import UserManager as DjangoUserManager 
+from django.apps import apps
+from django.contrib.auth.models import UserManager as DjangoUserManager
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
+from django.db import IntegrityError, connections, models, router, transaction
 from django.utils.translation import gettext_lazy
 
+from core_apps.common.search import search_index
+from core_apps.common.user_cache import SNAPSHOT_FIELDS, user_cache
+
+from .hashing import PasswordHashingService, password_hashing
+from .usernames import username_allocator
+
 ## The first thing we are going to do is to define a function that is going to help us to generate usernames automatically(this is to follow standardize username for banks. See banks usually have a unique(random) username for bank users so as to
 #  to distuingish uniquely and easily between customers.
-def generate_username():
-    
-    bank_name = getenv('BANK_NAME')
-    
-    words = bank_name.split()   ## Splits the name into a list first, so we can iterate
-    
-    prefix = "".join([word[0] for word in words]).upper()  ## we iterate here because we want the intitals of every part of name e.g Jammu Kashmir Bank would be JKB and in our case it woulb be NB for Nextgen Bank
-    
-    remaining_length = 12 - len(prefix) -1 # Username length should ideally be a fixed number (for example, 8 or 10 characters)
-    
-    random_chars = "".join(random.choices(string.ascii_uppercase + string.digits, k= remaining_length)) # Here we are using the random to generate a unique username for the bank user(by which he would be identified)
-                                                                                                        # and below we are attaching the prefix to this username. The prefix part specifies the Bank Name and the other
-                                                                                                        # part the unique username
-    
-    username = f"{prefix}--{random_chars}" ## appending the prefix and random username generated
-    
-    return username ## the username might look like NB--M1H8O9AEOP
+def generate_username(using=None):
+
+    ## The username still looks like <bank initials>--<9 chars>, e.g. NB--00000A3F7 for Nextgen Bank, but the characters are no longer random: they are the next number of a counter written in base 36,
+    # reserved in blocks so we only touch the database once per block. That makes every username unique by construction (no IntegrityError on the unique index, no retry loop) and the bank
+    # initials are worked out once per process instead of reading BANK_NAME on every call. See usernames.py for the details.
+
+    return username_allocator.allocate(using)
 
 
 ## Now we are going to create a custom function to validate email addresses using Django's validate email method
@@ -40,10 +37,93 @@ def validate_email_address(email):   ## This function validates whether the give
         
     except ValidationError:
         raise ValidationError (gettext_lazy("Enter a valid Email Address"))
-    
+
+
+## This is what register_failed_login (below, in UserManager) hands back. It is the state of the row right after the UPDATE ran, so the caller never has to re-read the user to know
+#  whether this particular bad password is the one that locked the account.
+class FailedLoginResult(NamedTuple):
+
+    attempts: int           ## failed_login_attempts as stored after this increment
+
+    account_status: str     ## account_status as stored after this increment
+
+    just_locked: bool       ## True only for the single attempt that moved the account from ACTIVE to LOCKED, so the lock email is sent exactly once even under concurrent bad logins
+
+
+## failed_login_attempts is a PositiveSmallIntegerField, so the counter stops here instead of overflowing while a locked account keeps getting hammered
+MAX_FAILED_LOGIN_ATTEMPTS = 32767
+
+
+CACHED_USER_FIELDS = frozenset(SNAPSHOT_FIELDS)   ## the User columns the authenticated-user cache keeps a copy of
+
+
+## What bulk_create_users (below, in UserManager) reports back once the whole input has been consumed
+class BulkCreateReport:
+
+    def __init__(self) -> None:
+
+        self.created = 0                                ## users (and their profiles) actually inserted
+
+        self.skipped: List[Tuple[int, str]] = []        ## (row number, reason) for every row that was not inserted, e.g. a duplicate email or a missing field
+
+        self.started = time.perf_counter()
+
+    @property
+    def rows_per_second(self) -> float:
+
+        elapsed = time.perf_counter() - self.started
+
+        return self.created / elapsed if elapsed else 0.0
+
+
+BULK_REQUIRED_FIELDS = ("email", "password", "first_name", "last_name", "id_no", "security_question", "security_answer")
+
+BULK_OPTIONAL_FIELDS = ("middle_name", "role")
+
+
+def _chunks(iterable: Iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _describe(error: ValidationError) -> str:   ## "security_answer: Ensure this value has at most 30 characters (it has 41).; role: Value 'boss' is not a valid choice." for the import report
+    return "; ".join(f"{field}: {' '.join(str(message) for message in messages)}" for field, messages in error.message_dict.items())
+
+
+## QuerySet.update() and bulk_update() don't send post_save, so the authenticated-user cache (core_apps/common/user_cache.py) would keep serving a user an admin bulk action just
+#  deactivated, locked or demoted until its TTL ran out. When such a write touches a column the cache keeps, the affected users are invalidated once it commits; writes to other columns
+#  (OTPs, last_failed_login) cost nothing extra.
+class UserQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        if not CACHED_USER_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            user_ids = list(self.values_list("pk", flat=True))   ## read first: the update may change what the filter matches
+            rows = super().update(**kwargs)
+        _invalidate_on_commit(user_ids, self.db)
+        return rows
+
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        if CACHED_USER_FIELDS.intersection(fields):
+            _invalidate_on_commit([obj.pk for obj in objs], self.db)
+        return rows
+
+    bulk_update.alters_data = True
+
+
+def _invalidate_on_commit(user_ids, using) -> None:   ## after the commit, so a request can't re-cache the old row in between
+    transaction.on_commit(lambda: [user_cache.invalidate(user_id) for user_id in user_ids], using=using)
+
 
 ## Now we will define our custom manager class which is going to extend django's built in user manager(UserManager)
-class UserManager(DjangoUserManager):  ## The code for is totally same the User manager in the Mosaic Blueprint
+class UserManager(DjangoUserManager.from_queryset(UserQuerySet)):  ## The code for is totally same the User manager in the Mosaic Blueprint
     
     def _create_user(self, email, password, **extra_fields):   ## This is our private helper method that is going to be used to handle the user creation(private because it has _create, i.e dash before create and we dont call these methods directly)
 
@@ -55,7 +135,7 @@ class UserManager(DjangoUserManager):  ## The code for is totally same the User
             
             raise ValueError(gettext_lazy("A Password must be provided"))
         
-        username = generate_username() 
+        username = generate_username(self._db)
         
         email = self.normalize_email(email)
         
@@ -68,7 +148,7 @@ class UserManager(DjangoUserManager):  ## The code for is totally same the User
             **extra_fields
         )
         
-        user.password = make_password(password)
+        user.set_password(password)   ## goes through the hashing pool (see hashing.py and User.set_password), so the PBKDF2 work doesn't run on the request worker
         user.save(using=self._db)
         
         return user
@@ -92,7 +172,203 @@ class UserManager(DjangoUserManager):  ## The code for is totally same the User
             raise ValueError(gettext_lazy('Superuser must have is_superuser=True.'))
 
         return self._create_user(email, password, **extra_fields)
-    
+
+
+    def bulk_create_users(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        batch_size: int = 1000,
+        hash_workers: Optional[int] = None,
+        progress: Optional[Callable[[BulkCreateReport], None]] = None,
+    ) -> BulkCreateReport:
+                                                    ## Bulk version of create_user for onboarding a whole branch of customers at once. Rows (any iterable of dicts, so a file can be streamed) go in batches of
+                                                    # batch_size: each row is validated with the model's validators and checked for emails / id_nos already taken, the surviving passwords are hashed in
+                                                    # parallel (hashing.py), and users, profiles and search tokens are bulk inserted in one transaction per batch, retried row by row on an IntegrityError.
+                                                    # Rows that fail are skipped and listed in the report with the reason; progress, if given, is called after every batch.
+
+        Profile = apps.get_model("user_profile", "Profile")
+        using = self._db or router.db_for_write(self.model)
+        report = BulkCreateReport()
+        row_number = 0
+
+        hasher = PasswordHashingService(max_workers=hash_workers) if hash_workers is not None else password_hashing
+
+        try:
+
+            for chunk in _chunks(rows, batch_size):
+
+                accepted: List[Dict[str, Any]] = []
+                accepted_rows: List[int] = []
+                seen_emails = set()
+                seen_id_nos = set()
+
+                for row in chunk:
+                    row_number += 1
+
+                    missing = [field for field in BULK_REQUIRED_FIELDS if row.get(field) in (None, "")]
+                    if missing:
+                        report.skipped.append((row_number, f"missing {', '.join(missing)}"))
+                        continue
+
+                    email = self.normalize_email(str(row["email"]).strip())
+                    try:
+                        validate_email_address(email)
+                        id_no = int(row["id_no"])
+                    except (ValidationError, ValueError):
+                        report.skipped.append((row_number, "invalid email or id_no"))
+                        continue
+
+                    if email.lower() in seen_emails or id_no in seen_id_nos:
+                        report.skipped.append((row_number, "duplicate email or id_no in input"))
+                        continue
+
+                    seen_emails.add(email.lower())
+                    seen_id_nos.add(id_no)
+
+                    fields = {field: row[field] for field in BULK_REQUIRED_FIELDS}
+                    fields.update({field: row[field] for field in BULK_OPTIONAL_FIELDS if row.get(field)})
+                    fields["email"] = email
+                    fields["id_no"] = id_no
+
+                    try:
+                        self.model(**fields).clean_fields(exclude=["username", "password"])   ## the username is allocated below and the raw password is never stored
+                    except ValidationError as error:
+                        report.skipped.append((row_number, _describe(error)))
+                        continue
+
+                    accepted.append(fields)
+                    accepted_rows.append(row_number)
+
+                existing_emails = {
+                    email.lower()
+                    for email in self.using(using).filter(email__in=[fields["email"] for fields in accepted]).values_list("email", flat=True)
+                }
+                existing_id_nos = set(
+                    self.using(using).filter(id_no__in=[fields["id_no"] for fields in accepted]).values_list("id_no", flat=True)
+                )
+
+                new_rows = []
+                new_row_numbers = []
+                for number, fields in zip(accepted_rows, accepted):
+                    if fields["email"].lower() in existing_emails or fields["id_no"] in existing_id_nos:
+                        report.skipped.append((number, "email or id_no already registered"))
+                        continue
+                    new_rows.append(fields)
+                    new_row_numbers.append(number)
+
+                if not new_rows:
+                    continue
+
+                usernames = username_allocator.allocate_many(len(new_rows), using)
+                hashed = hasher.map_make_password(fields.pop("password") for fields in new_rows)
+
+                users = [
+                    self.model(username=username, password=password, **fields)
+                    for username, password, fields in zip(usernames, hashed, new_rows)
+                ]
+
+                try:
+                    with transaction.atomic(using=using):
+                        self._insert_users(users, Profile, using, batch_size)
+                    report.created += len(users)
+                except IntegrityError:
+                    for number, user in zip(new_row_numbers, users):
+                        try:
+                            with transaction.atomic(using=using):
+                                self._insert_users([user], Profile, using, batch_size)
+                        except IntegrityError:
+                            report.skipped.append((number, "email or id_no already registered"))
+                        else:
+                            report.created += 1
+
+                if progress is not None:
+                    progress(report)
+
+        finally:
+            if hasher is not password_hashing:
+                hasher.close()
+
+        return report
+
+
+    def _insert_users(self, users: List[Any], Profile, using: str, batch_size: int) -> None:   ## the insert step of bulk_create_users (bulk_create sends no post_save, so profiles and search tokens are added here); the caller owns the transaction
+
+        self.using(using).bulk_create(users, batch_size=batch_size)
+        profiles = Profile._default_manager.using(using).bulk_create([Profile(user=user) for user in users], batch_size=batch_size)
+
+        search_index.index_created(self.model, users, using)
+        search_index.index_created(Profile, profiles, using)
+
+
+    def register_failed_login(self, user_id, max_attempts: int, failed_at: datetime) -> Optional[FailedLoginResult]:
+                                                    ## This is the counter behind User.handle_failed_login_attempts. Instead of loading the user, bumping the count in Python and calling save() (which rewrites every column and
+                                                    # lets two concurrent bad logins overwrite each other's increment), it runs ONE statement on Postgres:
+                                                    #     UPDATE user SET failed_login_attempts = failed_login_attempts + 1, last_failed_login = now,
+                                                    #                     account_status = CASE WHEN failed_login_attempts + 1 >= max THEN 'locked' ELSE account_status END
+                                                    #     FROM (SELECT id, account_status AS previous_status FROM user WHERE id = ... FOR UPDATE) previous
+                                                    #     WHERE user.id = previous.id RETURNING failed_login_attempts, account_status, previous.previous_status
+                                                    # The database does the increment under the row lock, so concurrent attempts are serialized and each one sees its own count. The lock decision is made in the
+                                                    # same round trip from the status change itself (read as not locked, left locked), not from the count, so an account an admin reactivated without resetting the
+                                                    # count still sends its lock email when it locks again. RETURNING only sees the new row, hence the locked subquery for the old status.
+                                                    # SQLite can't RETURN columns of the FROM subquery, so there the increment runs alone and, once the count reaches max_attempts, a second
+                                                    # UPDATE ... SET account_status = 'locked' WHERE id = ... AND account_status != 'locked' makes the change; the one attempt whose UPDATE matched a row locked it.
+                                                    # Returns None when no user has that id.
+
+        using = self._db or router.db_for_write(self.model)
+        connection = connections[using]
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        locked = self.model.AccountStatus.LOCKED
+
+        table = qn(opts.db_table)
+        pk_column = qn(opts.pk.column)
+        attempts_column = qn(opts.get_field("failed_login_attempts").column)
+        last_failed_column = qn(opts.get_field("last_failed_login").column)
+        status_column = qn(opts.get_field("account_status").column)
+        pk_value = opts.pk.get_db_prep_value(user_id, connection)
+
+        increment = (
+            f"UPDATE {table} SET "
+            f"{attempts_column} = CASE WHEN {table}.{attempts_column} < %s THEN {table}.{attempts_column} + 1 ELSE {table}.{attempts_column} END, "
+            f"{last_failed_column} = %s"
+        )
+        params = [
+            MAX_FAILED_LOGIN_ATTEMPTS,
+            opts.get_field("last_failed_login").get_db_prep_value(failed_at, connection),
+        ]
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    f"{increment}, {status_column} = CASE WHEN {table}.{attempts_column} + 1 >= %s THEN %s ELSE {table}.{status_column} END "
+                    f"FROM (SELECT {pk_column} AS previous_id, {status_column} AS previous_status FROM {table} WHERE {pk_column} = %s FOR UPDATE) previous "
+                    f"WHERE {table}.{pk_column} = previous.previous_id "
+                    f"RETURNING {table}.{attempts_column}, {table}.{status_column}, previous.previous_status",
+                    params + [max_attempts, locked, pk_value],
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                attempts, account_status, previous_status = row
+                just_locked = previous_status != locked and account_status == locked
+
+            else:
+                cursor.execute(f"{increment} WHERE {pk_column} = %s RETURNING {attempts_column}, {status_column}", params + [pk_value])
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                attempts, account_status = row
+                just_locked = False
+                if attempts >= max_attempts and account_status != locked:
+                    cursor.execute(
+                        f"UPDATE {table} SET {status_column} = %s WHERE {pk_column} = %s AND {status_column} <> %s",
+                        [locked, pk_value, locked],
+                    )
+                    just_locked = cursor.rowcount == 1
+                    account_status = locked
+
+        return FailedLoginResult(attempts=attempts, account_status=account_status, just_locked=just_locked)
+
 #### -- Explanation of above
 ## So basically with this we are creating a method that will help us to manage Users(their creation and saving to DB). We have two methods for this(provided by django itself) first is create_user method and second is create_superuser. 
 # Both are used for creation and saving of user to db, the diff as the name suggests is that the former is for creating a simple user and latter is for creating a super user. The extra fields are all the fields in your user model other
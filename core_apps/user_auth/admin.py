@@ -2,6 +2,8 @@ from django.contrib import admin
 
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
+
+from core_apps.common.admin import ChangeListQueryMixin, SearchMixin
 from .models import User
 from .forms import CustomUserChangeForm, CustomUserCreationForm
 
@@ -20,7 +22,7 @@ from .forms import CustomUserChangeForm, CustomUserCreationForm
 #                   extra built-in logic. 
 
 @admin.register(User)    ## This decorator tells Django: “I want to register the User model in the admin panel, and I want to control how it looks using the class written below.” 
-class CustomUserAdmin(UserAdmin):     ## Here we are creating a custom admin configuration for the User model. We inherit from UserAdmin (not ModelAdmin) because users are special in Django. UserAdmin already knows how to handle passwords, 
+class CustomUserAdmin(SearchMixin, ChangeListQueryMixin, UserAdmin):     ## Here we are creating a custom admin configuration for the User model. We inherit from UserAdmin (not ModelAdmin) because users are special in Django. UserAdmin already knows how to handle passwords, 
                                        # permissions, groups, superusers, and separate add/change forms. By inheriting it, we keep all that logic and just customize what we need.
                                        
                                        
@@ -61,6 +63,8 @@ class CustomUserAdmin(UserAdmin):     ## Here we are creating a custom admin con
         "is_active",
         "role",
     ]
+    list_only = list_display     ## The changelist only loads the columns it shows instead of whole rows with password hashes, OTPs and security answers.
+                                  # ChangeListQueryMixin (common/admin.py) applies it to the list page only; the change form still loads every field.
     list_filter = ["email", "is_staff", "is_active", "role"]        ## list_filter is used to add filter options in the right sidebar of the Django admin list page, so an admin can quickly narrow down records without writing queries.
                                                                      # In your example, list_filter = ["email", "is_staff", "is_active", "role"] means Django will generate clickable filters for these fields. For boolean fields like 
                                                                      # is_staff and is_active, Django shows simple Yes / No filters, making it very easy to see only active users or only staff users. For role (usually a choice or FK field),
@@ -133,5 +137,8 @@ class CustomUserAdmin(UserAdmin):     ## Here we are creating a custom admin con
     )
     
     search_fields = ["email", "username", "first_name", "last_name"]       ## This enables the search box in the admin panel. Admins can type a name or email and instantly find matching users. Without this, searching users would be painful.
+
+    search_email_fields = ["email"]      ## Tellers mostly paste a full email or type an ID number: those are tried as exact, indexed matches first (SearchMixin in common/admin.py), and only
+    search_number_fields = ["id_no"]     # when nothing matches does the search fall back to the trigram / inverted-index search over search_fields.
     
     ordering = ["email"]        ## This defines the default ordering of users in the admin list page. Users will be sorted by email automatically, which is often more meaningful than sorting by ID.
\ No newline at end of file
@@ -5,3 +5,8 @@ class UserAuthConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core_apps.user_auth"
     verbose_name = _("User Auth")
+
+    def ready(self) -> None:
+        from .usernames import bank_prefix
+
+        bank_prefix()   # read BANK_NAME once at startup rather than on the first registration
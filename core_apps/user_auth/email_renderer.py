@@ -0,0 +1,110 @@
+## Rendering layer for the templates in core_apps/templates/emails.
+#  Our emails only differ by one or two values per message (the OTP digits, the user's name), yet render_to_string + strip_tags re-walked the whole template (and base.html) and re-stripped
+#  the whole HTML every time. Here each template is rendered ONCE per process with unique placeholder markers in place of the per-message values. That output, and its strip_tags()
+#  plain-text version, are split on the markers and cached. Rendering a message is then just joining the cached pieces with the real values (HTML-escaped for the HTML part).
+#  Templates that are not listed in PER_MESSAGE_FIELDS, or whose markers do not come out of the render untouched (for example a value used inside {% if %} or passed through a filter),
+#  silently fall back to the plain render_to_string + strip_tags path, so output is always correct.
+#  The plain-text part is unescaped on both paths: strip_tags leaves the HTML entities of the render in place, so the old render_to_string + strip_tags text said "O&#x27;Brien" where a
+#  text/plain reader should see "O'Brien". Per-message values therefore go into the text part as they are, and the fixed text is html.unescape()d once when the template is compiled.
+
+import json
+import uuid
+from html import unescape
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from django.template.loader import get_template, render_to_string
+from django.utils.html import escape, strip_tags
+
+
+## template name -> the context values that change with every message (dotted names reach into nested dicts, e.g. user.full_name). Everything else in the context (site name, expiry
+#  minutes, lockout duration) is treated as fixed for the process and baked into the cached pieces.
+PER_MESSAGE_FIELDS = {
+    "emails/otp_email.html": ("otp",),
+    "emails/account_locked.html": ("user.full_name",),
+}
+
+
+def _lookup(context: Dict, dotted: str):
+    value = context
+    for part in dotted.split("."):
+        value = value[part]
+    return value
+
+
+def _assign(context: Dict, dotted: str, value) -> None:
+    *parents, leaf = dotted.split(".")
+    for part in parents:
+        context = context.setdefault(part, {})
+    context[leaf] = value
+
+
+class CompiledEmailTemplate:
+
+    def __init__(self, template_name: str, fields: Tuple[str, ...], fixed_context: Dict) -> None:
+        self.fields = fields
+        token = uuid.uuid4().hex
+        markers = {f"EMAILFIELD{index}X{token}": field for index, field in enumerate(fields)}   ## letters and digits only, so escaping and strip_tags leave them alone
+
+        context = json.loads(json.dumps(fixed_context))   ## deep copy, so the markers never leak into the caller's context
+        for marker, field in markers.items():
+            _assign(context, field, marker)
+
+        html = get_template(template_name).render(context)
+
+        self.html_parts = self._split(html, markers)
+        self.text_parts = self._split(unescape(strip_tags(html)), markers)
+
+    @staticmethod
+    def _split(rendered: str, markers: Dict[str, str]) -> Optional[List]:   ## -> [literal, field, literal, field, ..., literal], or None when a marker went missing
+        parts: List = [rendered]
+        for marker, field in markers.items():
+            if marker not in rendered:
+                return None
+            split_parts: List = []
+            for part in parts:
+                if isinstance(part, tuple):
+                    split_parts.append(part)
+                    continue
+                pieces = part.split(marker)
+                for index, piece in enumerate(pieces):
+                    if index:
+                        split_parts.append((field,))
+                    split_parts.append(piece)
+            parts = split_parts
+        return parts
+
+    @property
+    def usable(self) -> bool:
+        return self.html_parts is not None and self.text_parts is not None
+
+    def render(self, context: Dict) -> Tuple[str, str]:
+        values = {field: str(_lookup(context, field)) for field in self.fields}
+
+        html = "".join(escape(values[part[0]]) if isinstance(part, tuple) else part for part in self.html_parts)
+        text = "".join(values[part[0]] if isinstance(part, tuple) else part for part in self.text_parts)
+
+        return html, text
+
+
+@lru_cache(maxsize=128)
+def _compiled(template_name: str, fixed_context_json: str) -> CompiledEmailTemplate:
+    return CompiledEmailTemplate(template_name, PER_MESSAGE_FIELDS[template_name], json.loads(fixed_context_json))
+
+
+def render_email(template_name: str, context: Dict) -> Tuple[str, str]:   ## -> (html, plain text) for one message
+    fields = PER_MESSAGE_FIELDS.get(template_name)
+
+    if fields is not None:
+        per_message_keys = {field.split(".", 1)[0] for field in fields}
+        fixed_context = {key: value for key, value in context.items() if key not in per_message_keys}
+
+        try:
+            compiled = _compiled(template_name, json.dumps(fixed_context, sort_keys=True))
+            if compiled.usable:
+                return compiled.render(context)
+        except (TypeError, KeyError):   ## fixed context that isn't JSON-serializable, or a per-message value missing from this context
+            pass
+
+    html = render_to_string(template_name, context)
+    return html, unescape(strip_tags(html))
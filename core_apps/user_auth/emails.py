@@ -1,19 +1,41 @@
-## This file is going to hold the functions/methods that are going to be used to send our emails
+## This file is going to hold the functions/methods that are going to be used to send our emails. Sending is split in two halves:
+#   1. send_otp_email / send_account_locked_email run inside the request. They only collect the few values the email needs into a small JSON-safe "spec" dict and hand it to queue_emails.
+#      queue_emails pushes the specs onto a shared outbox (a Redis list) and the first email of every EMAIL_BATCH_WINDOW seconds schedules one drain_email_outbox task for the end of the
+#      window, so the emails of all requests in all web processes during that window end up in the same batch (a beat entry drains it every minute too, in case a drain got lost).
+#   2. The deliver_emails Celery task (tasks.py) turns specs into messages with build_email_message (template rendering + plain text) and sends a whole batch over one SMTP connection,
+#      retrying failed messages with backoff.
+#  Without Redis (no REDIS_URL, so every process has its own cache and a worker couldn't see the outbox) or with EMAIL_BATCH_WINDOW = 0, each queue_emails call becomes its own task as before.
+#  So neither template rendering nor the SMTP server is on the request path any more.
+
+import json
+import time
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.utils.translation import gettext_lazy 
 from loguru import logger
 
+from core_apps.common import metrics
+from core_apps.common.cache import shared_redis
+
+from .email_renderer import render_email
+
+
+EMAIL_QUEUE_DEPTH = "email.queue_depth"   ## shared gauge: emails handed to Celery that have not been delivered (or given up on) yet
+
+EMAIL_DELIVERY_LATENCY = "email.delivery_latency_ms"   ## histogram: time from queue_emails to the SMTP server accepting the message
+
+EMAIL_OUTBOX_KEY = "email:outbox"   ## Redis list of JSON specs waiting for the next drain
+
+EMAIL_DRAIN_SCHEDULED_KEY = "email:outbox:drain_scheduled"   ## set (with a TTL, in case the task is lost) while a drain_email_outbox task is pending
+
 
 ## The below functions is going to be a function to send an email with OTP
 def send_otp_email(email, otp):  ## This defines a function whose responsibility is to send an OTP email. It takes two inputs: the recipient’s email address and the OTP value that needs to be sent. Keeping this logic in one function
                                   # makes the authentication flow clean and reusable. For OTP generation, we have created a function called generate_otp in utils.py
     
     
-    subject = gettext_lazy('Your OTP code for Login')   ## This sets the subject line of the email. gettext_lazy is used so the subject can be translated later if the application supports multiple languages. The translation is evaluated
+    subject = str(gettext_lazy('Your OTP code for Login'))   ## This sets the subject line of the email. gettext_lazy is used so the subject can be translated later if the application supports multiple languages. The translation is evaluated
                                                          # only when needed, not immediately.
     
     from_email = settings.DEFAULT_FROM_EMAIL   ## This fetches the sender’s email address from Django settings. 
@@ -29,25 +51,134 @@ def send_otp_email(email, otp):  ## This defines a function whose responsibility
         
         "otp" : otp,
         
-        "expiry_time" : settings.OTP_EXPIRATION,
+        "expiry_time" : int(settings.OTP_EXPIRATION.total_seconds() // 60),   ## the template says "expires in X minutes", so we pass whole minutes (a timedelta would also not survive the trip to the worker as JSON)
         
         "site_name" : settings.SITE_NAME
     }
     
-    html_email = render_to_string("emails/otp_email.html", context)  ## This renders an HTML email template using the provided context. It converts the template into a complete HTML string with the OTP and other details filled in.
-                                                                      # render_to_string is useful when the HTML is needed for something other than a browser response, such as sending emails, generating PDFs, or storing HTML in the database.
-                                                                      # Remember the “string” formatting here is just the transport format; once the email reaches the user, their email app renders that string back into a visually rich HTML
-                                                                      # email, which improves user experience and reduces confusion. See we can say that render_to_string converts the HTML template into a string so it can be transported 
-                                                                      # (sent over email systems), and when it reaches the user, the email client renders that string back into HTML, so the user sees the formatted email as intended.
-                                                                      # __So here the html_email(variable) is a string basically which stores the otp_email(template) content as string__. When we use render_to_string, we provide the HTML
-                                                                      # template (email template) that we want to convert into a string, and we also pass the context data (dynamic values like OTP, expiry time, site name).
-    
-    
-    plain_email = strip_tags(html_email)  ## This creates a plain-text version of the email by removing all HTML tags. This ensures compatibility with email clients that do not support HTML. render_to_string() returns a string, and
-                                           # strip_tags() simply removes HTML tags from that string and returns another string. So both html_email and plain_email are strings; the only difference is that one contains HTML markup
-                                           # and the other is plain text.
+    queue_emails([
+        {
+            "template": "emails/otp_email.html",
+            "subject": subject,
+            "from_email": from_email,
+            "to": recipient_list,
+            "context": context,
+        }
+    ])
+
+
+## Another email sending function that is going to send an email to the user when their account has been locked due to too many failed login attempts 
+def send_account_locked_email(user):  ## Called from User.handle_failed_login_attempts with the user that just got locked (the model passes self), so this takes the user directly rather than a request
+
+    queue_emails([
+        {
+            "template": "emails/account_locked.html",
+            "subject": str(gettext_lazy('Your account has been locked')),
+            "from_email": settings.DEFAULT_FROM_EMAIL,
+            "to": [user.email],
+            "context": {
+                "user": {"full_name": user.full_name},   ## the template only uses user.full_name; a dict keeps the spec JSON-serializable for Celery
+                "lockout_duration": int(settings.LOCKOUT_DURATION.total_seconds() // 60),
+                "site_name": settings.SITE_NAME,
+            },
+        }
+    ])
+
+
+def queue_emails(specs):   ## Buffers email specs on the shared outbox, or, when there is none, hands them straight to deliver_emails (see dispatch_emails).
+
+    enqueued_at = time.time()
+
+    for spec in specs:
+        spec.setdefault("enqueued_at", enqueued_at)
+
+    metrics.adjust_gauge(EMAIL_QUEUE_DEPTH, len(specs))
+
+    if not buffer_emails(specs):
+        dispatch_emails(specs)
+
+
+def buffer_emails(specs):   ## Pushes the specs onto the outbox and makes sure a drain is scheduled. Returns False when there is no outbox (or Redis is down), so the caller sends them directly.
+
+    window = getattr(settings, "EMAIL_BATCH_WINDOW", 1.0)
+    outbox = shared_redis() if window > 0 else None
+
+    if outbox is None:
+        return False
+
+    from .tasks import drain_email_outbox   ## imported here because tasks.py imports this module
+
+    try:
+        outbox.rpush(EMAIL_OUTBOX_KEY, *[json.dumps(spec) for spec in specs])
+
+    except Exception as e:
+        logger.error(f"Could not buffer {len(specs)} email(s) on the outbox, queueing them directly. Error: {str(e)}")
+        return False
+
+    try:
+        if outbox.set(EMAIL_DRAIN_SCHEDULED_KEY, 1, nx=True, ex=int(window) + 60):
+            drain_email_outbox.apply_async(countdown=window)
+
+    except Exception as e:
+        logger.error(f"Could not schedule an outbox drain, draining inline. Error: {str(e)}")
+        drain_outbox()
+
+    return True
+
+
+def drain_outbox():   ## Takes everything buffered on the outbox, EMAIL_BATCH_SIZE specs at a time, and dispatches each batch. Returns the number of specs taken.
+
+    outbox = shared_redis()
+
+    if outbox is None:
+        return 0
+
+    outbox.delete(EMAIL_DRAIN_SCHEDULED_KEY)   ## first, so an email buffered from now on schedules the next drain instead of waiting for this one
+    batch_size = getattr(settings, "EMAIL_BATCH_SIZE", 50)
+    drained = 0
+
+    while True:
+
+        with outbox.pipeline() as pipe:   ## LRANGE + LTRIM in one MULTI/EXEC, so two drains running at once never take the same specs
+            pipe.lrange(EMAIL_OUTBOX_KEY, 0, batch_size - 1)
+            pipe.ltrim(EMAIL_OUTBOX_KEY, batch_size, -1)
+            raw, _ = pipe.execute()
+
+        if not raw:
+            return drained
+
+        dispatch_emails([json.loads(item) for item in raw])
+        drained += len(raw)
+
+
+def dispatch_emails(specs):   ## Hands specs to the deliver_emails task in batches of EMAIL_BATCH_SIZE, so a batch shares one SMTP connection in the worker. If the broker can't be reached we
+                               # deliver inline instead, so an OTP is slow rather than lost. The specs are already counted in EMAIL_QUEUE_DEPTH.
+
+    from .tasks import deliver_emails   ## imported here because tasks.py imports this module
+
+    batch_size = getattr(settings, "EMAIL_BATCH_SIZE", 50)
+
+    for start in range(0, len(specs), batch_size):
+        batch = specs[start:start + batch_size]
+
+        try:
+            deliver_emails.delay(batch)
+
+        except Exception as e:
+            metrics.adjust_gauge(EMAIL_QUEUE_DEPTH, -len(batch))
+            logger.error(f"Could not queue {len(batch)} email(s), delivering inline. Error: {str(e)}")
+            deliver_now(batch)
+
+
+def build_email_message(spec):   ## Builds one ready-to-send email from a spec. This runs in the Celery worker, not in the request.
+
+    html_email, plain_email = render_email(spec["template"], spec["context"])  ## This gives us the HTML version of the email (the template with the OTP and other details filled in) and a plain-text version of it (the same
+                                                                                # content with all HTML tags removed, for email clients that do not support HTML). Both are plain strings; the string is just the transport
+                                                                                # format, and the user's email client renders the HTML back into a formatted email. render_email (email_renderer.py) compiles each template
+                                                                                # once per process and caches both versions, so for every message it only fills in the values that change (like the OTP) instead of running
+                                                                                # render_to_string and strip_tags over the whole template again.
     
-    email = EmailMultiAlternatives(subject, plain_email, from_email, recipient_list)   ## this line creates an instance (an object) of an email, which represents one complete email message that is ready to be sent to the user. It
+    email = EmailMultiAlternatives(spec["subject"], plain_email, spec["from_email"], spec["to"])   ## this line creates an instance (an object) of an email, which represents one complete email message that is ready to be sent to the user. It
                                                                                         # holds all the details like subject, sender, receiver, plain text content, and later the HTML content. The email is not sent at this moment; 
                                                                                         # it is just prepared and stored in memory. When email.send() is called, this prepared email object is then actually delivered to the client/user.
                                                                                         # The plain text version is treated as the default and safest version, so even very old or restricted email clients can still show the message.
@@ -57,51 +188,37 @@ def send_otp_email(email, otp):  ## This defines a function whose responsibility
     
     email.attach_alternative(html_email, "text/html") ## This attaches the HTML version of the email so modern email clients can display a rich, formatted message while still keeping the plain text option.
     
-    try:
-        
-        email.send()  ## This sends the email using Django’s configured email backend. If the email is sent successfully, execution continues without error.
-        
-        logger.info(f"OTP email sent successfully to {email}")
-        
-    except Exception as e:
-            
-            logger.error(f"Failed to send OTP email to {email}:  Error: {str(e)}")
-            
-    
-## Another email sending function that is going to send an email to the user when their account has been locked due to too many failed login attempts 
-def send_account_locked_email(request):  ## instructor has use self instead of request and thus has done self.email, self.user but this is also correct
-    
-    current_user = request.user
-    
-    subject = gettext_lazy('Your account has been locked')
-    from_email = settings.DEFAULT_FROM_EMAIL
-    recipient_list = [current_user.email]
-
-    context = {
-        "user": current_user,
-        "lockout_duration": int(settings.LOCKOUT_DURATION.total_seconds() // 60),
-        "site_name": settings.SITE_NAME
-    }
+    return email
 
-    html_email = render_to_string("emails/account_locked.html", context)
-    plain_email = strip_tags(html_email)
 
-    email = EmailMultiAlternatives(subject, plain_email, from_email, recipient_list)
-    email.attach_alternative(html_email, "text/html")
+def get_delivery_connection():   ## The connection the worker sends through. When EMAIL_BACKEND is djcelery_email's CeleryEmailBackend, going through it again would only queue a second Celery task,
+                                  # so we use the transport it wraps (CELERY_EMAIL_BACKEND, SMTP by default). Any other EMAIL_BACKEND (locmem in tests, console, mailpit over SMTP) is used as is.
 
-    try:
-        email.send()
-        logger.info(f"Account Locked, Email sent to : {email}")
-    except Exception as e:
-        logger.error(f"Failed to send acccount locked email to {email}:  Error: {str(e)}")
-    
+    backend = settings.EMAIL_BACKEND
 
-            
-    
-    
-    
-    
-    
-    
-    
-    
+    if backend == "djcelery_email.backends.CeleryEmailBackend":
+        backend = getattr(settings, "CELERY_EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+
+    return get_connection(backend=backend)
+
+
+def deliver_now(specs):   ## Renders and sends a batch over a single connection. Returns the specs that failed so the caller (the Celery task) can retry just those.
+
+    failed = []
+
+    with get_delivery_connection() as connection:
+
+        for spec in specs:
+
+            try:
+                connection.send_messages([build_email_message(spec)])
+                metrics.observe(EMAIL_DELIVERY_LATENCY, (time.time() - spec.get("enqueued_at", time.time())) * 1000)
+                metrics.increment("email.sent")
+                logger.info(f"Email '{spec['subject']}' sent successfully to {spec['to']}")
+
+            except Exception as e:
+                metrics.increment("email.failed")
+                logger.error(f"Failed to send email '{spec['subject']}' to {spec['to']}:  Error: {str(e)}")
+                failed.append(spec)
+
+    return failed
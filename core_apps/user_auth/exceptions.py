@@ -0,0 +1,28 @@
+## DRF exception handler (REST_FRAMEWORK["EXCEPTION_HANDLER"] in config/settings/base.py). Plain exceptions raised by model code that the API should answer with something better than a 500
+#  are mapped to an APIException here, then DRF's own handler builds the response.
+
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from .hashing import HashingPoolSaturated
+
+
+class PasswordHashingUnavailable(APIException):   ## DRF adds a Retry-After header from `wait`
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    default_detail = gettext_lazy("The service is busy, please try again in a moment.")
+
+    default_code = "password_hashing_saturated"
+
+    def __init__(self, detail=None, code=None, wait=None) -> None:
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+def exception_handler(exc, context):
+    if isinstance(exc, HashingPoolSaturated):
+        exc = PasswordHashingUnavailable(wait=exc.wait)
+    return drf_exception_handler(exc, context)
@@ -0,0 +1,230 @@
+## This file moves password hashing off the request worker. With PBKDF2 first in PASSWORD_HASHERS, one make_password or check_password takes hundreds of milliseconds of pure CPU, and in a
+#  registration or password-reset burst those calls hold a web worker's CPU so every other endpoint on that worker queues behind them. Here the hashing runs in a small, bounded process pool
+#  (separate processes, so the GIL of the web worker stays free) and the request thread just waits for the result:
+#      make_password(raw)            / amake_password(raw)            -> encoded hash
+#      check_password(raw, encoded)  / acheck_password(raw, encoded)  -> (matches, must_update)
+#      map_make_password(raws)                                        -> encoded hashes, for bulk jobs (no admission control)
+#  Admission control: at most PASSWORD_HASH_MAX_PENDING hashes may be queued or running at once per process. A request that can't get a slot within PASSWORD_HASH_ADMISSION_TIMEOUT seconds
+#  gets HashingPoolSaturated (a 503 from the API) straight away instead of piling up behind the pool. Queue wait (submitted -> a pool process picked it up) and the hash time itself are recorded as
+#  histograms in core_apps/common/metrics.py (auth.password_hash.queue_wait / auth.password_hash.duration; see `manage.py show_metrics --prefix auth.password_hash`).
+#  PASSWORD_HASH_WORKERS = 0 hashes inline in the calling thread, which is what you want in tests. Daemonic processes (Celery's prefork pool children) can't start processes of their own, so
+#  they always hash inline whatever the setting says. If a pool process dies (OOM killer, segfault) the pool is broken for good: it is thrown away, a fresh one is built and the hash is retried once.
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, List, Optional, Tuple
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from loguru import logger
+
+from core_apps.common import metrics
+
+QUEUE_WAIT_METRIC = "auth.password_hash.queue_wait"
+DURATION_METRIC = "auth.password_hash.duration"
+REJECTED_METRIC = "auth.password_hash.rejected"
+
+
+class HashingPoolSaturated(Exception):   ## Raised when admission control turns a hash away. A plain exception, since set_password is also called by the admin, createsuperuser and management
+                                         # commands; only the DRF views answer it with a 503 and a Retry-After header (see core_apps/user_auth/exceptions.py).
+
+    def __init__(self, wait: Optional[int] = 1) -> None:
+        super().__init__("The password hashing pool is saturated")
+        self.wait = wait
+
+
+def _init_hashing_process() -> None:   ## Runs once in every pool process. With the "fork" start method the process already has Django set up; with "spawn" (macOS, Windows) it starts from scratch,
+                                        # so we set Django up again (DJANGO_SETTINGS_MODULE is inherited from the parent's environment).
+    django.setup()
+
+
+def _timed_make_password(password: str) -> Tuple[str, float, float]:   ## What actually runs in the pool. Returns the hash plus the wall-clock start and the hash duration so the parent can
+                                                                         # split "waited in the queue" from "was hashing". time.time() because monotonic clocks aren't comparable across processes everywhere.
+    started = time.time()
+    encoded = hashers.make_password(password)
+    return encoded, started, time.time() - started
+
+
+def _timed_check_password(password: str, encoded: str) -> Tuple[Tuple[bool, bool], float, float]:
+    started = time.time()
+    matches = hashers.check_password(password, encoded)
+    must_update = matches and hashers.identify_hasher(encoded).must_update(encoded)   ## the setter callback of hashers.check_password can't cross a process boundary, so the caller gets the flag instead
+    return (matches, must_update), started, time.time() - started
+
+
+class PasswordHashingService:
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None) -> None:
+
+        self._max_workers = max_workers         ## None -> settings.PASSWORD_HASH_WORKERS, read when the pool is first needed
+
+        self._max_pending = max_pending         ## None -> settings.PASSWORD_HASH_MAX_PENDING
+
+        self._lock = threading.Lock()
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        self._pool_pid: Optional[int] = None    ## the pool belongs to the process that created it; after a fork (gunicorn --preload) the child builds its own
+
+        self._slots: Optional[threading.BoundedSemaphore] = None
+
+    @property
+    def max_workers(self) -> int:
+        if multiprocessing.current_process().daemon:   ## e.g. a Celery prefork child: starting the pool would fail with "daemonic processes are not allowed to have children"
+            return 0
+        if self._max_workers is not None:
+            return self._max_workers
+        return getattr(settings, "PASSWORD_HASH_WORKERS", os.cpu_count() or 1)
+
+    @property
+    def admission_timeout(self) -> float:
+        return getattr(settings, "PASSWORD_HASH_ADMISSION_TIMEOUT", 2.0)
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        pid = os.getpid()
+        if self._pool is not None and self._pool_pid == pid:
+            return self._pool
+
+        with self._lock:
+            if self._pool is None or self._pool_pid != pid:
+                if self._slots is None or self._pool_pid != pid:   ## a rebuilt pool keeps its slots: hashes that were queued on the broken one still hand theirs back
+                    max_pending = self._max_pending or getattr(settings, "PASSWORD_HASH_MAX_PENDING", 4 * self.max_workers)
+                    self._slots = threading.BoundedSemaphore(max_pending)
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_hashing_process)
+                self._pool_pid = pid
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:   ## Called when `pool` raised BrokenProcessPool; only the thread that sees it first replaces it, the next _ensure_pool builds a new one
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        logger.warning("A password hashing process died; rebuilding the hashing pool")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _record(self, submitted: float, started: float, duration: float) -> None:
+        metrics.observe(QUEUE_WAIT_METRIC, max(0.0, started - submitted) * 1000)
+        metrics.observe(DURATION_METRIC, duration * 1000)
+
+    def _reject(self):
+        metrics.increment(REJECTED_METRIC)
+        return HashingPoolSaturated()
+
+    def _submit(self, pool: ProcessPoolExecutor, fn, *args) -> Future:   ## Caller must already hold a slot; the slot is handed back when the future finishes, whoever is (or isn't) still waiting for it.
+        submitted = time.time()
+        slots = self._slots
+        try:
+            future = pool.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+
+        def release(done: Future) -> None:
+            slots.release()
+            if not done.cancelled() and done.exception() is None:
+                _, started, duration = done.result()
+                self._record(submitted, started, duration)
+
+        future.add_done_callback(release)
+        return future
+
+    def _run(self, fn, *args):
+        if self.max_workers <= 0:
+            result, _, duration = fn(*args)
+            metrics.observe(DURATION_METRIC, duration * 1000)
+            return result
+
+        try:
+            return self._run_in_pool(fn, *args)
+        except BrokenProcessPool:
+            return self._run_in_pool(fn, *args)   ## once, on the rebuilt pool; a second BrokenProcessPool goes to the caller
+
+    def _run_in_pool(self, fn, *args):
+        pool = self._ensure_pool()
+        if not self._slots.acquire(timeout=self.admission_timeout):
+            raise self._reject()
+
+        try:
+            return self._submit(pool, fn, *args).result()[0]
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise
+
+    async def _arun(self, fn, *args):
+        if self.max_workers <= 0:
+            return await asyncio.to_thread(self._run, fn, *args)
+
+        try:
+            return await self._arun_in_pool(fn, *args)
+        except BrokenProcessPool:
+            return await self._arun_in_pool(fn, *args)
+
+    async def _arun_in_pool(self, fn, *args):
+        pool = self._ensure_pool()
+        if not self._slots.acquire(blocking=False):
+            ## Waiting for a slot must not block the event loop, so the (bounded) wait happens in a thread
+            acquired = await asyncio.to_thread(self._slots.acquire, True, self.admission_timeout)
+            if not acquired:
+                raise self._reject()
+
+        try:
+            result = await asyncio.wrap_future(self._submit(pool, fn, *args))
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise
+        return result[0]
+
+    def make_password(self, password: str) -> str:
+        return self._run(_timed_make_password, password)
+
+    def check_password(self, password: str, encoded: str) -> Tuple[bool, bool]:
+        if password is None or not hashers.is_password_usable(encoded):
+            return False, False
+        return self._run(_timed_check_password, password, encoded)
+
+    async def amake_password(self, password: str) -> str:
+        return await self._arun(_timed_make_password, password)
+
+    async def acheck_password(self, password: str, encoded: str) -> Tuple[bool, bool]:
+        if password is None or not hashers.is_password_usable(encoded):
+            return False, False
+        return await self._arun(_timed_check_password, password, encoded)
+
+    def map_make_password(self, passwords: Iterable[str]) -> List[str]:   ## For bulk jobs (UserManager.bulk_create_users): the whole batch is spread over the pool at once and no slot is taken,
+                                                                           # since a batch job should wait for the pool rather than be turned away.
+        passwords = list(passwords)
+        if self.max_workers <= 0:
+            return [hashers.make_password(password) for password in passwords]
+
+        chunksize = max(1, len(passwords) // (self.max_workers * 4))
+        for attempt in range(2):
+            pool = self._ensure_pool()
+            try:
+                return [encoded for encoded, _, _ in pool.map(_timed_make_password, passwords, chunksize=chunksize)]
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                if attempt:
+                    raise
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=True)
+            self._pool = None
+            self._pool_pid = None
+            self._slots = None
+
+    def __enter__(self) -> "PasswordHashingService":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+password_hashing = PasswordHashingService()   ## The one shared service per process; request code should use this rather than building its own pool
@@ -0,0 +1,50 @@
+## Micro-benchmark for email rendering. It compares messages per second of the old render_to_string + strip_tags path with the cached renderer in email_renderer.py, for both templates.
+#      python manage.py bench_email_render --messages 20000
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+
+from core_apps.user_auth.email_renderer import render_email
+
+
+def legacy_render(template_name, context):
+    html = render_to_string(template_name, context)
+    return html, strip_tags(html)
+
+
+class Command(BaseCommand):
+    help = "Compare messages/s of render_to_string + strip_tags against the cached email renderer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        messages = options["messages"]
+        cases = {
+            "emails/otp_email.html": lambda i: {
+                "otp": f"{i % 1000000:06d}",
+                "expiry_time": int(settings.OTP_EXPIRATION.total_seconds() // 60),
+                "site_name": settings.SITE_NAME,
+            },
+            "emails/account_locked.html": lambda i: {
+                "user": {"full_name": f"Customer {i}"},
+                "lockout_duration": int(settings.LOCKOUT_DURATION.total_seconds() // 60),
+                "site_name": settings.SITE_NAME,
+            },
+        }
+
+        for template_name, make_context in cases.items():
+            expected = legacy_render(template_name, make_context(7))
+            if render_email(template_name, make_context(7)) != expected:
+                self.stderr.write(f"{template_name}: cached output differs from render_to_string")
+
+            for label, render in (("render_to_string", legacy_render), ("cached", render_email)):
+                started = time.perf_counter()
+                for i in range(messages):
+                    render(template_name, make_context(i))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{template_name:<28} {label:>16}: {messages / elapsed:>10,.0f} messages/s")
@@ -0,0 +1,85 @@
+## Benchmark for the failed-login counter. It compares the old handle_failed_login_attempts body (increment in Python + full save(), twice on the lock path) with the current one
+#  (a single UPDATE ... RETURNING through UserManager.register_failed_login) and reports SQL writes per failed login and attempts per second.
+#  Everything runs inside a transaction that is rolled back, so it is safe to run against a local database:
+#      python manage.py bench_failed_logins --attempts 2000
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from core_apps.user_auth.models import User
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+
+def legacy_failed_login(user: User) -> None:   ## The pre-change implementation, kept here only so the numbers can be compared side by side
+
+    user.failed_login_attempts += 1
+
+    user.last_failed_login = timezone.now()
+
+    if user.failed_login_attempts >= settings.LOGIN_ATTEMPTS:
+
+        user.account_status = User.AccountStatus.LOCKED
+
+        user.save()
+
+    user.save()
+
+
+def current_failed_login(user: User) -> None:
+
+    user.handle_failed_login_attempts()
+
+
+class Command(BaseCommand):
+    help = "Compare DB writes and throughput of the legacy and atomic failed-login counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attempts", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        attempts = options["attempts"]
+
+        with override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+            for label, fail in (("legacy", legacy_failed_login), ("atomic", current_failed_login)):
+                writes, elapsed = self.run(fail, attempts)
+                self.stdout.write(
+                    f"{label:>7}: {writes / attempts:.2f} writes/failed login, "
+                    f"{attempts / elapsed:,.0f} failed logins/s"
+                )
+
+    def run(self, fail, attempts):
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email="bench.failed.login@example.com",
+                password="bench-password",
+                first_name="Bench",
+                last_name="User",
+                id_no=999999999,
+                security_question=User.SecurityQuestions.MAIDEN_NAME,
+                security_answer="bench",
+            )
+
+            writes = 0
+            elapsed = 0.0
+            for _ in range(attempts):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    fail(user)
+                    elapsed += time.perf_counter() - started
+                writes += sum(1 for q in queries.captured_queries if q["sql"].lstrip().upper().startswith(WRITE_STATEMENTS))
+
+                if user.account_status == User.AccountStatus.LOCKED:
+                    User.objects.filter(pk=user.pk).update(
+                        failed_login_attempts=0, account_status=User.AccountStatus.ACTIVE
+                    )
+                    user.refresh_from_db()
+
+            transaction.set_rollback(True)
+
+        return writes, elapsed
@@ -0,0 +1,55 @@
+## Collision and throughput check for the username allocator (usernames.py).
+#  1. encodes --users consecutive numbers and checks every username sorts strictly after the previous one, which proves there are no collisions without keeping millions of strings in memory
+#  2. allocates --users usernames through UsernameAllocator.allocate_many in --batch-size batches (the bulk import path) and --single usernames one at a time (the registration path), against the
+#     real counter, with the same strictly-increasing check. The counter updates are rolled back afterwards (on PostgreSQL the sequence itself never rolls back, which only leaves a gap).
+#      python manage.py bench_usernames --users 10000000
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core_apps.user_auth.usernames import UsernameAllocator, bank_prefix, encode
+
+
+class Command(BaseCommand):
+    help = "Collision and throughput check for the sequence-backed username allocator."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000_000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--single", type=int, default=100_000)
+
+    def check_increasing(self, usernames, previous=""):
+        for username in usernames:
+            if username <= previous:
+                raise CommandError(f"collision or ordering error: {username} after {previous}")
+            previous = username
+        return previous
+
+    def handle(self, *args, **options):
+        users = options["users"]
+        batch_size = options["batch_size"]
+        self.stdout.write(f"prefix {bank_prefix()!r}, e.g. {encode(0)} .. {encode(users - 1)}")
+
+        started = time.perf_counter()
+        self.check_increasing(encode(value) for value in range(users))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{'encode':>14}: {users:,} unique usernames, {users / elapsed:,.0f}/s")
+
+        with transaction.atomic():
+            allocator = UsernameAllocator()
+            started = time.perf_counter()
+            previous = ""
+            for start in range(0, users, batch_size):
+                previous = self.check_increasing(allocator.allocate_many(min(batch_size, users - start)), previous)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{'allocate_many':>14}: {users:,} unique usernames, {users / elapsed:,.0f}/s")
+
+            allocator = UsernameAllocator()
+            started = time.perf_counter()
+            self.check_increasing(allocator.allocate() for _ in range(options["single"]))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{'allocate':>14}: {options['single']:,} unique usernames, {options['single'] / elapsed:,.0f}/s")
+
+            transaction.set_rollback(True)
@@ -0,0 +1,71 @@
+## Streams customers from a CSV or JSON Lines file into User + Profile rows through UserManager.bulk_create_users.
+#  Every row needs email, password, first_name, last_name, id_no, security_question and security_answer (middle_name and role are optional). The file is read lazily, so its size
+#  doesn't matter, and progress is printed after every batch as rows per second.
+#  Rows that fail validation or clash with an existing user are skipped and listed on stderr with the reason. SearchToken rows for the admin search are written along with the users.
+#      python manage.py import_users customers.csv --batch-size 2000 --workers 8
+
+import csv
+import json
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core_apps.user_auth.models import User
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as handle:
+        yield from csv.DictReader(handle)
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
+READERS = {".csv": read_csv, ".jsonl": read_jsonl, ".ndjson": read_jsonl}
+
+
+class Command(BaseCommand):
+    help = "Bulk import users (and their profiles) from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path)
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Password hashing processes for this import (default: one per CPU; 0 hashes inline).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist")
+
+        reader = READERS.get(f".{options['format']}" if options["format"] else path.suffix.lower())
+        if reader is None:
+            raise CommandError("Can't tell the file format, pass --format csv or --format jsonl")
+
+        report = User.objects.bulk_create_users(
+            reader(path),
+            batch_size=options["batch_size"],
+            hash_workers=options["workers"],
+            progress=lambda report: self.stdout.write(
+                f"{report.created} users created, {len(report.skipped)} skipped ({report.rows_per_second:,.0f} rows/s)"
+            ),
+        )
+
+        for row_number, reason in report.skipped:
+            self.stderr.write(f"row {row_number}: {reason}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report.created} users, skipped {len(report.skipped)} ({report.rows_per_second:,.0f} rows/s)"
+            )
+        )
@@ -91,6 +91,9 @@ class MyCLMiddleware:  ## This line defines a custom middleware class. The name
 
 
 
+from core_apps.common.middleware import request_user
+
+
 class CustomHeaderMiddleware:
     def __init__(self, get_response):
         
@@ -100,10 +103,14 @@ class CustomHeaderMiddleware:
         
         response = self.get_response(request)
         
-        if request.user.is_authenticated:
+        user = request_user(request)   ## The user CookieAuthentication built from the token's user_id claim (out of the cached snapshot, see core_apps/common/user_cache.py), or
+                                        # AuthenticationMiddleware's session user. Only the admin logs in with a session, so a session and user query here is paid by admin pages (which
+                                        # have loaded request.user already) and by stray requests from an admin's browser; requests without a session cookie cost no query at all
+
+        if user is not None and user.is_authenticated:
             
-            response["X-Django-User"] = request.user.email   ## Here we add the field "X-Django-User : user@email.com" to the response object that is being returned to the user/client. And we know from above explanation of custom middleware
-                                                              # that anything after this line i.e. response = self.get_response(request) is after the request has been executed and response has been generated. So we know after this line
-                                                              # response = self.get_response(request), we will always have a response object(in dict form obviously)
+            response["X-Django-User"] = user.email   ## Here we add the field "X-Django-User : user@email.com" to the response object that is being returned to the user/client. And we know from above explanation of custom middleware
+                                                      # that anything after this line i.e. response = self.get_response(request) is after the request has been executed and response has been generated. So we know after this line
+                                                      # response = self.get_response(request), we will always have a response object(in dict form obviously)
             
-        return response
\ No newline at end of file
+        return response
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:26
+
+from django.db import migrations, models
+
+SEQUENCE_NAME = "user_auth_username_block_seq"
+
+
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE_NAME} START WITH 1")
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_auth", "0002_alter_user_username"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UsernameSequence",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=63,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Name",
+                    ),
+                ),
+                (
+                    "next_value",
+                    models.BigIntegerField(default=0, verbose_name="Next value"),
+                ),
+            ],
+            options={
+                "verbose_name": "Username Sequence",
+                "verbose_name_plural": "Username Sequences",
+            },
+        ),
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
@@ -0,0 +1,20 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# pg_trgm for the trigram indexes in 0006 and in user_profile 0004, installed in
+# its own transactional migration ahead of those non-atomic CONCURRENTLY ones.
+# CREATE EXTENSION needs CREATE privilege on the database (PostgreSQL 13+, where
+# pg_trgm is a trusted extension) or a superuser; where the migration role has
+# neither, have a superuser run "CREATE EXTENSION pg_trgm" first and this is a
+# no-op. Other databases are left alone.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_auth", "0004_uuid7_primary_keys"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ]
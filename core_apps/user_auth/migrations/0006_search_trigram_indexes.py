@@ -0,0 +1,42 @@
+from django.db import migrations
+
+# Admin search runs icontains/istartswith, which PostgreSQL compiles to
+# UPPER("column"::text) LIKE UPPER(...); these GIN trigram indexes are built on that
+# same expression so the search uses them. pg_trgm comes from 0005. Other
+# databases are left alone.
+INDEXES = {
+    "user_auth_user_email_trgm": "email",
+    "user_auth_user_username_trgm": "username",
+    "user_auth_user_first_name_trgm": "first_name",
+    "user_auth_user_last_name_trgm": "last_name",
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, column in INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON user_auth_user "
+            f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in INDEXES:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("user_auth", "0005_trigram_extension"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -1,18 +1,23 @@
 from django.db import models
 
 ## Now as we have created the User model manager, we can now define the Custom User Model
-import uuid
 from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.utils.translation import gettext_lazy
 
+from core_apps.common.ids import uuid7
+from core_apps.common.models import DirtyFieldsMixin
+from core_apps.common.user_cache import user_cache
+
 from .emails import send_account_locked_email
+from .hashing import password_hashing
 from .Managers import UserManager
+from .otp import get_otp_backend
 
 
-class User(AbstractUser):
+class User(DirtyFieldsMixin, AbstractUser):
     
     USERNAME_FIELD = "email"  ## This tells Django that email is the main identifier for login, instead of the default username. So whenever authentication happens (login, password reset, etc.), Django will treat the email
                                # field as the unique login field.
@@ -76,8 +81,10 @@ class User(AbstractUser):
         BRANCH_MANAGER = "branch_manager", gettext_lazy("Branch Manager") ## The first value i.e. "branch_manager" gets actually stored in DB and "Branch Manager" is what will appear to the User/Client
         
         
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False) ## This creates a UUID-based primary key instead of an auto-incrementing integer. UUIDs are hard to guess, globally unique,
-                                                                                 # and more secure, especially useful in APIs and distributed systems.
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False) ## This creates a UUID-based primary key instead of an auto-incrementing integer. UUIDs are hard to guess, globally unique,
+                                                                           # and more secure, especially useful in APIs and distributed systems.
+                                                                           # uuid7 (core_apps/common/ids.py) starts with a millisecond timestamp, so new users' ids sort after older ones and each INSERT appends to the right
+                                                                           # edge of the primary-key index instead of splitting a random page like uuid4 did. Rows created before keep their uuid4 ids; both live in the same column.
                                                                                  
     username = models.CharField(gettext_lazy("Username"), max_length=50, unique=True) ## This stores a system-generated username that uniquely identifies the user internally. Even though login uses email,
                                                                                        # usernames are still useful for internal references and display.
@@ -135,6 +142,8 @@ class User(AbstractUser):
                                                                                                      # when the user is created, no OTP exists, so there is no expiry time to store. When an OTP is generated, the backend sets this
                                                                                                      # field to a future time (for example, current time + 1 minute). During verification, the system checks this value to ensure the
                                                                                                      # OTP has not expired. This prevents old or reused OTPs from being accepted and is a crucial part of secure OTP-based authentication.
+                                                                                                     # NOTE: otp and otp_expiry_time are only used when settings.OTP_BACKEND is DatabaseOTPBackend. With the default cache backend the
+                                                                                                     # OTP never touches this table (see otp.py).
 
     objects = UserManager()     ## This connects your custom UserManager to the model. All user creation and database saving logic will go through this manager, which is required because you are using a custom user model.
     
@@ -145,38 +154,52 @@ class User(AbstractUser):
     ## Now Below are some methods that we define within this User model. See these methods are invoked by the user instance/object that you have created and saved to DB. So we can initiate them user.set_otp(). 
     #  Just remember these methods can be accessed by user instance/object
     
-    def set_otp(self, otp: str) -> None:      ## Now the above method is basically saving the OTP data for the OTP field. If you remember we had generate_OTP method in utils.py and by that we could generate OTP and share in
-                                               # this method as parameter. The self.OTP is basically user.OTP i.e. the OTP field of current DB user. Here we are setting the user OTP field to generated OTP and also now setting 
-                                               # up an expiry time. See this method would be most likely called when a user wants to login by OTP or wants to reset password. At that time he can use this set_otp() method
-                                               # Here self refers to the current instance/object of the model
-        
-        self.otp = otp
-        
-        self.otp_expiry_time = timezone.now() + settings.OTP_EXPIRATION
-        
-        self.save()
-        
+    def set_otp(self, otp: str) -> None:      ## Now the above method is basically saving the OTP that we generated with generate_otp (utils.py) along with an expiry time, so it can be checked later by verify_otp. This
+                                               # method would be most likely called when a user wants to login by OTP or wants to reset password. The OTP is not written to this user's row any more: it is handed to
+                                               # the configured OTP store (settings.OTP_BACKEND, see otp.py), which by default keeps it in the cache with OTP_EXPIRATION as its TTL. That way issuing an OTP does not
+                                               # rewrite the whole user row on our most contended table. Here self refers to the current instance/object of the model
 
+        get_otp_backend().issue(self, otp, settings.OTP_EXPIRATION)
 
-    def verify_otp(self, otp: str) -> bool:     ## In this method we are going to check if the provided OTP is valid and within allowed time frame. In simple words, this method checks whether the OTP entered by the user matches
-                                                 # the OTP stored in the database and whether it is still valid (not expired). Here, self.otp is the OTP saved in the user’s database record, and the otp parameter is the OTP that
-                                                 # the user typed in (usually from the email they received). The OTP argument in parameter is not the one that is generated from generate_otp method. It is different from what we 
-                                                 # did above method. In short, the otp parameter here is the OTP entered by the user, not the one generated by generate_otp. If both the OTP values match and the current time is 
-                                                 # still before the expiry time, the OTP is considered valid. When the OTP is valid, the method clears the OTP and expiry time from the database and saves the user, so the same
-                                                 # OTP cannot be reused again. Clearing out and resetting the OTP is needed, first to prevent reuse and also for further OTP verifications.
-                                                 # The OTP is reset only when verification succeeds, not when it fails. If verification fails, the OTP remains unchanged so the user can try again (until it expires).
-        
-        if self.otp == otp and self.otp_expiry_time > timezone.now():     
-            
-            self.otp = ""
-            
-            self.otp_expiry_time = None
-            
-            self.save()
-            
-            return True
-        
-        return False
+
+
+    def verify_otp(self, otp: str) -> bool:     ## In this method we are going to check if the provided OTP is valid and within allowed time frame. The otp parameter is the OTP the user typed in (usually from the email they
+                                                 # received), not the one generated by generate_otp. The OTP store compares it with the code issued by set_otp. If they match and the code has not expired, the
+                                                 # code is removed from the store in the same step and True is returned, so the same OTP cannot be reused (even by two requests racing each other).
+                                                 # If verification fails the code stays valid so the user can try again, until it expires or OTP_MAX_ATTEMPTS wrong codes have been entered.
+
+        return get_otp_backend().verify(self, otp)
+
+
+    def set_password(self, raw_password) -> None:   ## Same as AbstractBaseUser.set_password, but the PBKDF2 hash runs in the hashing pool (hashing.py) so a registration or password reset doesn't burn this
+                                                     # worker's CPU. When the pool is saturated this raises HashingPoolSaturated, which the API answers with a 503 (exceptions.py).
+        self.password = password_hashing.make_password(raw_password)
+
+        self._password = raw_password
+
+
+    def check_password(self, raw_password) -> bool:   ## Used by Django's ModelBackend on every login. The check runs in the hashing pool; if it matches and the stored hash uses outdated parameters
+                                                       # (e.g. fewer PBKDF2 iterations after a Django upgrade) the password is re-hashed and only the password column is saved, like Django's own setter does.
+        matches, must_update = password_hashing.check_password(raw_password, self.password)
+
+        if must_update:
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return matches
+
+
+    async def acheck_password(self, raw_password) -> bool:   ## The async twin for ASGI views: the event loop is never blocked, neither by the hash nor by waiting for a pool slot
+
+        matches, must_update = await password_hashing.acheck_password(raw_password, self.password)
+
+        if must_update:
+            self.password = await password_hashing.amake_password(raw_password)
+            self._password = None
+            await self.asave(update_fields=["password"])
+
+        return matches
 
     def handle_failed_login_attempts(self) -> None:      ## This method is a model instance method, so it is always called on a specific user object (for example, user.handle_failed_login_attempts()). Django does not call it 
                                                           # automatically — it is usually called from your login or authentication logic when a login attempt fails (for example, when password verification fails or when verify_otp()
@@ -184,19 +207,31 @@ class User(AbstractUser):
                                                           # reaches or exceeds settings.LOGIN_ATTEMPTS, the user’s account status is changed to LOCKED, the user record is saved, and an account-locked email is sent. If the limit has 
                                                           # not yet been reached, the method simply updates and saves the failed attempts count. This is exactly how account lockout logic is typically implemented.
         
-        self.failed_login_attempts += 1
-        
-        self.last_failed_login = timezone.now()
-        
-        if self.failed_login_attempts >= settings.LOGIN_ATTEMPTS:
-            
-            self.account_status = self.AccountStatus.LOCKED
-            
-            self.save()
-            
+                                                          # The increment and the lock decision happen in the database in one UPDATE ... RETURNING (see UserManager.register_failed_login), so this is a
+                                                          # single write per bad password, concurrent bad logins can't lose increments, and only the attempt that actually locked the account sends the email.
+                                                          # The returned values are copied back onto this instance so the caller sees the same state that is now stored.
+
+        failed_at = timezone.now()
+
+        result = User.objects.register_failed_login(self.pk, settings.LOGIN_ATTEMPTS, failed_at)
+
+        if result is None:
+
+            return
+
+        self.failed_login_attempts = result.attempts
+
+        self.last_failed_login = failed_at
+
+        self.account_status = result.account_status
+
+        self.mark_clean("failed_login_attempts", "last_failed_login", "account_status")   ## already stored by the UPDATE above, so a later save() doesn't write them again
+
+        if result.just_locked:
+
+            user_cache.invalidate(self.pk)   ## the UPDATE above bypasses post_save, so tell the authenticated-user cache ourselves that this account is now locked
+
             send_account_locked_email(self)
-            
-        self.save()
 
 
     
@@ -211,7 +246,7 @@ class User(AbstractUser):
         
         self.account_status = self.AccountStatus.ACTIVE
         
-        self.save()
+        self.save()     ## DirtyFieldsMixin turns this into an UPDATE of just the columns that actually changed above, and skips the write entirely when the account was already clean
         
         
     def unlock_account(self) -> None:                         ## These two pieces of code work together to control when a locked user can try to log in again. The unlock_account() method is a helper that simply resets everything related to 
@@ -289,7 +324,25 @@ class User(AbstractUser):
     def __str__(self) -> str:                                     ## This method defines how the user object is represented as a string, especially in places like the Django admin, logs, or the Django shell. Instead of showing something unhelpful
                                                                    # like User object (3), it returns a readable string containing the user’s full name and their role in a human-friendly format. get_role_display() is used to show the readable
                                                                    # label of the role (not the stored value), making the output clearer and more meaningful.
-        return f"{self.full_name} - {self.get_role_display()}"    
+        return f"{self.full_name} - {self.get_role_display()}"
+
+
+## Counter behind the username allocator (usernames.py) on databases without native sequences (SQLite in development). It counts blocks of usernames, not users: a process reserves a block with a
+#  single UPDATE next_value = next_value + 1 and hands the block out from memory. On PostgreSQL a real SEQUENCE is used instead (see migration 0003) and this table stays empty.
+class UsernameSequence(models.Model):
+
+    name = models.CharField(gettext_lazy("Name"), max_length=63, primary_key=True)
+
+    next_value = models.BigIntegerField(gettext_lazy("Next value"), default=0)
+
+    class Meta:
+
+        verbose_name = gettext_lazy("Username Sequence")
+
+        verbose_name_plural = gettext_lazy("Username Sequences")
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.next_value}"
     
     
     
@@ -0,0 +1,190 @@
+## This file holds the OTP stores that User.set_otp and User.verify_otp delegate to. Previously the OTP was written to the user row with a full save() on both issue and verify, which meant two
+#  full-row UPDATEs of user_auth_user for every login. Every backend below exposes the same three methods:
+#      issue(user, otp, ttl)  -> store the code so it expires by itself after ttl
+#      verify(user, otp)      -> True exactly once for the right code, then the code is gone (single use)
+#      discard(user)          -> throw away any pending code
+#  The backend in use is picked with settings.OTP_BACKEND (a dotted path) and wrong guesses are capped by settings.OTP_MAX_ATTEMPTS.
+
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from functools import lru_cache
+from typing import Dict, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+
+
+class BaseOTPBackend(ABC):
+
+    @abstractmethod
+    def issue(self, user, otp: str, ttl: timedelta) -> None:
+        ...
+
+    @abstractmethod
+    def verify(self, user, otp: str) -> bool:
+        ...
+
+    @abstractmethod
+    def discard(self, user) -> None:
+        ...
+
+    @property
+    def max_attempts(self) -> int:
+        return getattr(settings, "OTP_MAX_ATTEMPTS", 5)
+
+
+class InMemoryOTPBackend(BaseOTPBackend):   ## Keeps codes in a dict inside the current process. Only correct when there is a single process (tests, a one-worker dev server); with several workers a code
+                                             # issued by one worker is invisible to the others.
+
+    sweep_interval = 60.0   ## seconds between sweeps of expired codes
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._codes: Dict[str, Tuple[str, float, int]] = {}   ## user pk -> (otp, monotonic expiry, wrong attempts so far)
+        self._next_sweep = time.monotonic() + self.sweep_interval
+
+    def issue(self, user, otp: str, ttl: timedelta) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:   ## codes that are never verified would otherwise stay forever; one pass per sweep_interval keeps issue() O(1) on average
+                self._codes = {key: entry for key, entry in self._codes.items() if entry[1] > now}
+                self._next_sweep = now + self.sweep_interval
+            self._codes[str(user.pk)] = (otp, now + ttl.total_seconds(), 0)
+
+    def verify(self, user, otp: str) -> bool:
+        key = str(user.pk)
+
+        with self._lock:
+            entry = self._codes.get(key)
+
+            if entry is None:
+                return False
+
+            stored, expires_at, attempts = entry
+
+            if time.monotonic() >= expires_at:
+                del self._codes[key]
+                return False
+
+            if constant_time_compare(stored, otp):
+                del self._codes[key]
+                return True
+
+            attempts += 1
+
+            if attempts >= self.max_attempts:
+                del self._codes[key]
+            else:
+                self._codes[key] = (stored, expires_at, attempts)
+
+            return False
+
+    def discard(self, user) -> None:
+        with self._lock:
+            self._codes.pop(str(user.pk), None)
+
+
+class CacheOTPBackend(BaseOTPBackend):   ## Stores codes in the Django cache (Redis through django-redis when REDIS_URL is set), so nothing is written to the user table. Expiry is the cache's own TTL,
+                                          # wrong attempts are a separate counter key with the same TTL that is bumped with cache.incr (atomic in Redis), and single use comes from cache.add on a
+                                          # "used" marker for that issued code: add only writes a key that doesn't exist yet (SET NX in Redis), so when two requests verify the same code at the same
+                                          # time only one of them gets True, whatever the backend's delete() reports.
+
+    key_prefix = "otp"
+
+    def __init__(self) -> None:
+        self.cache = caches[getattr(settings, "OTP_CACHE_ALIAS", "default")]
+
+    def _code_key(self, user) -> str:
+        return f"{self.key_prefix}:{user.pk}"
+
+    def _attempts_key(self, user) -> str:
+        return f"{self.key_prefix}:{user.pk}:attempts"
+
+    def _used_key(self, user, issue_id: str) -> str:
+        return f"{self.key_prefix}:{user.pk}:used:{issue_id}"
+
+    def issue(self, user, otp: str, ttl: timedelta) -> None:
+        timeout = ttl.total_seconds()
+        self.cache.set_many(
+            {self._code_key(user): (otp, uuid.uuid4().hex, timeout), self._attempts_key(user): 0},   ## the random id gives each issued code its own "used" marker
+            timeout=timeout,
+        )
+
+    def verify(self, user, otp: str) -> bool:
+        code_key = self._code_key(user)
+        stored = self.cache.get(code_key)
+
+        if stored is None:
+            return False
+
+        code, issue_id, timeout = stored
+
+        if constant_time_compare(code, otp):
+            if not self.cache.add(self._used_key(user, issue_id), True, timeout=timeout):   ## another request already used this code; the marker outlives the code it guards
+                return False
+            self.cache.delete(code_key)
+            return True
+
+        try:
+            attempts = self.cache.incr(self._attempts_key(user))
+        except ValueError:   ## the counter expired or was evicted on its own; treat the code as used up rather than granting unlimited guesses
+            attempts = self.max_attempts
+
+        if attempts >= self.max_attempts:
+            self.discard(user)
+
+        return False
+
+    def discard(self, user) -> None:
+        self.cache.delete_many([self._code_key(user), self._attempts_key(user)])
+
+
+class DatabaseOTPBackend(BaseOTPBackend):   ## Uses the User.otp / otp_expiry_time columns, for deployments without a shared cache. Issue and verify are each one targeted UPDATE of those two columns
+                                             # (not a full save()), and verify only clears the code if it still matches and has not expired, so the UPDATE's row count is the single-use check.
+                                             # There is no per-code attempt counter here; wrong codes are limited by the account lockout (failed_login_attempts) instead.
+
+    def issue(self, user, otp: str, ttl: timedelta) -> None:
+        expiry = timezone.now() + ttl
+
+        type(user)._default_manager.filter(pk=user.pk).update(otp=otp, otp_expiry_time=expiry)
+
+        user.otp = otp
+        user.otp_expiry_time = expiry
+        user.mark_clean("otp", "otp_expiry_time")
+
+    def verify(self, user, otp: str) -> bool:
+        if not otp:
+            return False
+
+        matched = type(user)._default_manager.filter(
+            pk=user.pk, otp=otp, otp_expiry_time__gt=timezone.now()
+        ).update(otp="", otp_expiry_time=None)
+
+        if matched:
+            user.otp = ""
+            user.otp_expiry_time = None
+            user.mark_clean("otp", "otp_expiry_time")
+
+        return bool(matched)
+
+    def discard(self, user) -> None:
+        type(user)._default_manager.filter(pk=user.pk).update(otp="", otp_expiry_time=None)
+
+        user.otp = ""
+        user.otp_expiry_time = None
+        user.mark_clean("otp", "otp_expiry_time")
+
+
+@lru_cache(maxsize=None)
+def load_otp_backend(path: str) -> BaseOTPBackend:
+    return import_string(path)()
+
+
+def get_otp_backend() -> BaseOTPBackend:
+    return load_otp_backend(getattr(settings, "OTP_BACKEND", "core_apps.user_auth.otp.CacheOTPBackend"))
@@ -0,0 +1,42 @@
+## Celery tasks for the user_auth app. celery_app.py autodiscovers this module for every installed app.
+
+from celery import shared_task
+from django.conf import settings
+from loguru import logger
+
+from core_apps.common import metrics
+
+from .emails import EMAIL_QUEUE_DEPTH, deliver_now, drain_outbox
+
+
+@shared_task
+def drain_email_outbox():   ## Scheduled by emails.buffer_emails at the end of each EMAIL_BATCH_WINDOW, and every minute by beat as a safety net. Turns whatever the web processes buffered meanwhile into
+                             # deliver_emails batches.
+
+    return drain_outbox()
+
+
+@shared_task(bind=True, acks_late=True, max_retries=5)
+def deliver_emails(self, specs):   ## Renders and sends a batch of email specs (see emails.queue_emails) over one SMTP connection. Only the messages that failed are retried, with exponential
+                                    # backoff (EMAIL_RETRY_BACKOFF, EMAIL_RETRY_BACKOFF_MAX), so a flaky SMTP server never makes us send the same OTP twice.
+
+    failed = deliver_now(specs)
+    delivered = len(specs) - len(failed)
+
+    if failed and self.request.retries < self.max_retries:
+        metrics.adjust_gauge(EMAIL_QUEUE_DEPTH, -delivered)
+        metrics.increment("email.retried", len(failed))
+
+        countdown = min(
+            getattr(settings, "EMAIL_RETRY_BACKOFF", 5) * (2 ** self.request.retries),
+            getattr(settings, "EMAIL_RETRY_BACKOFF_MAX", 600),
+        )
+        raise self.retry(args=[failed], countdown=countdown)
+
+    metrics.adjust_gauge(EMAIL_QUEUE_DEPTH, -len(specs))
+
+    if failed:
+        metrics.increment("email.dropped", len(failed))
+        logger.error(f"Giving up on {len(failed)} email(s) after {self.request.retries} retries")
+
+    return delivered
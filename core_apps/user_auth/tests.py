@@ -0,0 +1,492 @@
+import threading
+import uuid
+from datetime import timedelta
+from html import unescape
+from unittest import mock
+
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import strip_tags
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core_apps.common.models import SearchToken
+from core_apps.common.search import search_index
+from core_apps.common.testing import TEST_SETTINGS, make_user
+from core_apps.user_auth.email_renderer import render_email
+from core_apps.user_auth.emails import EMAIL_OUTBOX_KEY, drain_outbox, send_account_locked_email, send_otp_email
+from core_apps.user_auth.hashing import HashingPoolSaturated, PasswordHashingService, password_hashing
+from core_apps.user_auth.middleware import CustomHeaderMiddleware
+from core_apps.user_auth.models import User, UsernameSequence
+from core_apps.user_auth.otp import BaseOTPBackend, CacheOTPBackend, DatabaseOTPBackend, InMemoryOTPBackend
+from core_apps.user_auth.usernames import BLOCK_SIZE, SEQUENCE_NAME, UsernameAllocator, encode, reserve_blocks
+
+
+@override_settings(**TEST_SETTINGS)
+class UserSaveTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.get(pk=make_user().pk)
+
+    def test_user_save_does_not_touch_profile(self) -> None:
+        with self.assertNumQueries(0):
+            self.user.reset_failed_login_attempts()
+
+        self.user.handle_failed_login_attempts()
+        with self.assertNumQueries(1):
+            self.user.reset_failed_login_attempts()
+
+    def test_save_writes_only_changed_columns(self) -> None:
+        self.user.first_name = "Changed"
+        with CaptureQueriesContext(connection) as queries:
+            self.user.save()
+        self.assertEqual(len(queries), 1)
+        update = queries[0]["sql"]
+        self.assertIn('"first_name"', update)
+        self.assertNotIn('"email"', update.split("WHERE")[0])
+        self.assertFalse(self.user.is_dirty())
+
+    def test_login_flow_statement_count(self) -> None:
+        # Password check, a wrong OTP bump, OTP issue/verify and the reset after a
+        # successful login: two UPDATEs, no profile queries.
+        with self.assertNumQueries(2):
+            self.assertTrue(self.user.check_password("query-count-password"))
+            self.user.handle_failed_login_attempts()
+            self.user.set_otp("123456")
+            self.assertTrue(self.user.verify_otp("123456"))
+            self.user.reset_failed_login_attempts()
+
+
+@override_settings(**TEST_SETTINGS, LOGIN_ATTEMPTS=3)
+class FailedLoginCounterTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = make_user()
+
+    def test_increments_from_stale_instances_are_not_lost(self) -> None:
+        first = User.objects.get(pk=self.user.pk)
+        second = User.objects.get(pk=self.user.pk)
+        first.handle_failed_login_attempts()
+        second.handle_failed_login_attempts()  # still believes the count is 0
+        self.assertEqual(second.failed_login_attempts, 2)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.failed_login_attempts, 2)
+        self.assertEqual(self.user.account_status, User.AccountStatus.ACTIVE)
+
+    def test_exactly_one_attempt_locks_the_account(self) -> None:
+        results = [
+            User.objects.register_failed_login(self.user.pk, settings.LOGIN_ATTEMPTS, timezone.now())
+            for _ in range(5)
+        ]
+        self.assertEqual([result.attempts for result in results], [1, 2, 3, 4, 5])
+        self.assertEqual([result.just_locked for result in results], [False, False, True, False, False])
+        self.assertTrue(all(r.account_status == User.AccountStatus.LOCKED for r in results[2:]))
+
+    def test_relock_after_manual_reactivation_notifies(self) -> None:
+        for _ in range(settings.LOGIN_ATTEMPTS):
+            self.user.handle_failed_login_attempts()
+        # An admin reactivates the account but leaves the count alone.
+        User.objects.filter(pk=self.user.pk).update(account_status=User.AccountStatus.ACTIVE)
+        self.user.refresh_from_db()
+
+        with mock.patch("core_apps.user_auth.models.send_account_locked_email") as send, mock.patch(
+            "core_apps.user_auth.models.user_cache.invalidate"
+        ) as invalidate:
+            self.user.handle_failed_login_attempts()
+            self.user.handle_failed_login_attempts()
+
+        self.assertEqual(self.user.account_status, User.AccountStatus.LOCKED)
+        send.assert_called_once_with(self.user)
+        invalidate.assert_called_once_with(self.user.pk)
+
+    def test_lockout_expires(self) -> None:
+        for _ in range(settings.LOGIN_ATTEMPTS):
+            self.user.handle_failed_login_attempts()
+        self.assertTrue(self.user.is_locked_out)
+
+        User.objects.filter(pk=self.user.pk).update(
+            last_failed_login=timezone.now() - settings.LOCKOUT_DURATION - timedelta(seconds=1)
+        )
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_locked_out)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.account_status, self.user.failed_login_attempts), (User.AccountStatus.ACTIVE, 0))
+
+    def test_unknown_user(self) -> None:
+        self.assertIsNone(User.objects.register_failed_login(uuid.UUID(int=0), 3, timezone.now()))
+
+
+@override_settings(**TEST_SETTINGS, OTP_MAX_ATTEMPTS=3)
+class OTPBackendTests(TestCase):
+    backends = (InMemoryOTPBackend, CacheOTPBackend, DatabaseOTPBackend)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = make_user()
+
+    def test_code_is_single_use(self) -> None:
+        for backend_class in self.backends:
+            with self.subTest(backend=backend_class.__name__):
+                backend = backend_class()
+                backend.issue(self.user, "123456", timedelta(minutes=1))
+                self.assertFalse(backend.verify(self.user, "654321"))
+                self.assertTrue(backend.verify(self.user, "123456"))
+                self.assertFalse(backend.verify(self.user, "123456"))
+
+    def test_expired_and_discarded_codes_rejected(self) -> None:
+        for backend_class in self.backends:
+            with self.subTest(backend=backend_class.__name__):
+                backend = backend_class()
+                backend.issue(self.user, "123456", timedelta(seconds=-1))
+                self.assertFalse(backend.verify(self.user, "123456"))
+
+                backend.issue(self.user, "123456", timedelta(minutes=1))
+                backend.discard(self.user)
+                self.assertFalse(backend.verify(self.user, "123456"))
+
+    def test_wrong_guesses_use_up_the_code(self) -> None:
+        # DatabaseOTPBackend leaves wrong guesses to the account lockout instead.
+        for backend_class in (InMemoryOTPBackend, CacheOTPBackend):
+            with self.subTest(backend=backend_class.__name__):
+                backend = backend_class()
+                backend.issue(self.user, "123456", timedelta(minutes=1))
+                for _ in range(3):
+                    self.assertFalse(backend.verify(self.user, "000000"))
+                self.assertFalse(backend.verify(self.user, "123456"))
+
+    def test_base_backend_is_abstract(self) -> None:
+        with self.assertRaises(TypeError):
+            BaseOTPBackend()
+
+    def test_cache_backend_code_used_once_by_concurrent_verifies(self) -> None:
+        backend = CacheOTPBackend()
+        backend.issue(self.user, "123456", timedelta(minutes=1))
+        stored = cache.get(backend._code_key(self.user))
+
+        self.assertTrue(backend.verify(self.user, "123456"))
+        # A second request that read the code before the first one deleted it.
+        cache.set(backend._code_key(self.user), stored)
+        self.assertFalse(backend.verify(self.user, "123456"))
+
+        backend.issue(self.user, "123456", timedelta(minutes=1))
+        self.assertTrue(backend.verify(self.user, "123456"))
+
+    def test_in_memory_backend_sweeps_expired_codes(self) -> None:
+        other = make_user(email="other.customer@example.com", id_no=987654321)
+        with mock.patch.object(InMemoryOTPBackend, "sweep_interval", 0):
+            backend = InMemoryOTPBackend()
+            backend.issue(self.user, "123456", timedelta(seconds=-1))
+            backend.issue(other, "654321", timedelta(minutes=1))
+        self.assertEqual(list(backend._codes), [str(other.pk)])
+
+    def test_database_backend_writes_only_the_otp_columns(self) -> None:
+        backend = DatabaseOTPBackend()
+        with CaptureQueriesContext(connection) as queries:
+            backend.issue(self.user, "123456", timedelta(minutes=1))
+            backend.verify(self.user, "123456")
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertNotIn('"email"', query["sql"])
+        self.assertFalse(self.user.is_dirty())
+
+
+@override_settings(**TEST_SETTINGS)
+class BulkCreateUsersTests(TestCase):
+    def row(self, number: int, **extra) -> dict:
+        fields = {
+            "email": f"customer{number}@example.com",
+            "password": "bulk-password",
+            "first_name": "Bulk",
+            "last_name": f"Customer{number}",
+            "id_no": 1000 + number,
+            "security_question": User.SecurityQuestions.MAIDEN_NAME,
+            "security_answer": "answer",
+        }
+        fields.update(extra)
+        return fields
+
+    def test_invalid_rows_are_reported_not_fatal(self) -> None:
+        rows = [
+            self.row(1),
+            self.row(2, role="boss"),
+            self.row(3, security_question="pet"),
+            self.row(4, security_answer="x" * 31),
+            self.row(5, id_no=-5),
+            self.row(6),
+        ]
+        report = User.objects.bulk_create_users(rows, batch_size=3)
+
+        self.assertEqual(report.created, 2)
+        self.assertEqual([number for number, _ in report.skipped], [2, 3, 4, 5])
+        self.assertIn("role", report.skipped[0][1])
+        self.assertIn("security_answer", report.skipped[2][1])
+        self.assertTrue(User.objects.get(email="customer6@example.com").profile)
+
+    def test_row_taken_concurrently_is_skipped_alone(self) -> None:
+        hash_batch = password_hashing.map_make_password
+
+        def signup_during_hashing(passwords):
+            make_user(email="customer2@example.com", id_no=999)
+            return hash_batch(passwords)
+
+        with mock.patch.object(password_hashing, "map_make_password", signup_during_hashing):
+            report = User.objects.bulk_create_users([self.row(1), self.row(2), self.row(3)])
+
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.skipped, [(2, "email or id_no already registered")])
+        self.assertEqual(User.objects.filter(last_name__startswith="Customer").count(), 2)
+
+    @override_settings(ADMIN_SEARCH_BACKEND="core_apps.common.search.InvertedIndexSearchBackend")
+    def test_imported_users_are_search_indexed(self) -> None:
+        User.objects.bulk_create_users([self.row(1)])
+        user = User.objects.get(email="customer1@example.com")
+        self.assertTrue(SearchToken.objects.filter(object_id=user.pk, token="customer1").exists())
+        self.assertIn(User, search_index.fields)
+
+
+class ListOnlyRedis:
+    """The few Redis commands the email outbox uses, kept in a dict."""
+
+    def __init__(self) -> None:
+        self.data = {}
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def pipeline(self):
+        redis, commands = self, []
+
+        class Pipeline:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return False
+
+            def lrange(self, key, start, end):
+                commands.append(lambda: redis.data.get(key, [])[start:end + 1])
+
+            def ltrim(self, key, start, end):
+                commands.append(lambda: redis.data.__setitem__(key, redis.data.get(key, [])[start:]))
+
+            def execute(self):
+                return [command() for command in commands]
+
+        return Pipeline()
+
+
+@override_settings(**TEST_SETTINGS, EMAIL_BATCH_WINDOW=1.0, EMAIL_BATCH_SIZE=2)
+class EmailOutboxTests(TestCase):
+    def setUp(self) -> None:
+        self.user = make_user()
+
+    def test_emails_of_separate_calls_share_a_drain(self) -> None:
+        redis = ListOnlyRedis()
+        with mock.patch("core_apps.user_auth.emails.shared_redis", return_value=redis), mock.patch(
+            "core_apps.user_auth.tasks.drain_email_outbox.apply_async"
+        ) as schedule_drain, mock.patch("core_apps.user_auth.tasks.deliver_emails.delay") as deliver:
+            send_otp_email(self.user.email, "123456")
+            send_account_locked_email(self.user)
+            send_otp_email("other@example.com", "654321")
+
+            self.assertEqual(schedule_drain.call_count, 1)
+            self.assertEqual(len(redis.data[EMAIL_OUTBOX_KEY]), 3)
+            self.assertEqual(drain_outbox(), 3)
+
+        self.assertEqual([len(call.args[0]) for call in deliver.call_args_list], [2, 1])
+        self.assertEqual(redis.data[EMAIL_OUTBOX_KEY], [])
+
+    def test_without_shared_cache_emails_are_sent_directly(self) -> None:
+        send_otp_email(self.user.email, "123456")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("123456", mail.outbox[0].body)
+
+
+class EmailRendererTests(TestCase):
+    contexts = {
+        "emails/otp_email.html": [
+            {"otp": "123456", "expiry_time": 1, "site_name": "Nextgen Bank"},
+            {"otp": "<b>&'\"", "expiry_time": 5, "site_name": "Tom & Jerry's <Bank>"},
+        ],
+        "emails/account_locked.html": [
+            {"user": {"full_name": "Jane Doe"}, "lockout_duration": 1, "site_name": "Nextgen Bank"},
+            {"user": {"full_name": "Zoë O'Brien <Jr> & Co"}, "lockout_duration": 15, "site_name": "Tom & Jerry's"},
+        ],
+    }
+
+    def test_fast_path_matches_render_to_string(self) -> None:
+        for template_name, contexts in self.contexts.items():
+            for context in contexts:
+                with self.subTest(template=template_name, context=context):
+                    expected_html = render_to_string(template_name, context)
+                    with mock.patch("core_apps.user_auth.email_renderer.render_to_string", side_effect=AssertionError):
+                        html, text = render_email(template_name, context)
+                    self.assertEqual(html, expected_html)
+                    self.assertEqual(text, unescape(strip_tags(expected_html)))
+
+    def test_plain_text_has_no_entities(self) -> None:
+        context = self.contexts["emails/account_locked.html"][1]
+        _, text = render_email("emails/account_locked.html", context)
+        self.assertIn("Dear Zoë O'Brien <Jr> & Co,", text)
+        self.assertNotIn("&#x27;", text)
+        with mock.patch.dict("core_apps.user_auth.email_renderer.PER_MESSAGE_FIELDS", clear=True):
+            self.assertEqual(render_email("emails/account_locked.html", context)[1], text)  # the fallback path agrees
+
+
+@override_settings(**TEST_SETTINGS)
+class UsernameAllocatorTests(TransactionTestCase):
+    def test_interleaved_allocators_never_collide(self) -> None:
+        first, second = UsernameAllocator(), UsernameAllocator()  # two processes sharing the counter
+        usernames = [first.allocate()]
+        usernames += first.allocate_many(BLOCK_SIZE + 5)  # leaves 95 in first._available
+        usernames += second.allocate_many(3)
+        usernames += [first.allocate() for _ in range(96)]  # the leftovers, then a fresh block
+        usernames += [second.allocate() for _ in range(BLOCK_SIZE)]
+        self.assertEqual(len(usernames), len(set(usernames)))
+
+    def test_threads_share_one_allocator(self) -> None:
+        allocator = UsernameAllocator()
+        allocator.allocate()  # create the counter row up front
+        usernames, errors = [], []
+
+        def allocate() -> None:
+            try:
+                for _ in range(60):
+                    usernames.append(allocator.allocate())
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=allocate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(usernames)), 240)
+
+    def test_counter_row_fallback(self) -> None:
+        self.assertFalse(UsernameSequence.objects.exists())
+        self.assertEqual(reserve_blocks(2, "default"), [1, 2])  # get_or_create makes the row
+        self.assertEqual(reserve_blocks(3, "default"), [3, 4, 5])  # then F() increments it
+        self.assertEqual(UsernameSequence.objects.get(name=SEQUENCE_NAME).next_value, 6)
+
+    def test_usernames_already_taken_are_skipped(self) -> None:
+        user = make_user()
+        taken = encode((reserve_blocks(1, "default")[0] + 1) * BLOCK_SIZE)  # first username of the next block
+        User.objects.filter(pk=user.pk).update(username=taken)
+        allocator = UsernameAllocator()
+        allocated = [allocator.allocate() for _ in range(BLOCK_SIZE)]
+        self.assertNotIn(taken, allocated)
+        self.assertEqual(len(set(allocated)), BLOCK_SIZE)
+
+
+@override_settings(**TEST_SETTINGS)
+class PasswordHashingServiceTests(TestCase):
+    def test_dead_pool_process_is_replaced_and_hash_retried(self) -> None:
+        with PasswordHashingService(max_workers=1, max_pending=2) as service:
+            self.assertTrue(service.check_password("secret", service.make_password("secret"))[0])
+            pool = service._pool
+            for process in list(pool._processes.values()):
+                process.kill()
+                process.join()
+
+            self.assertTrue(service.check_password("secret", service.make_password("secret"))[0])
+            self.assertIsNot(service._pool, pool)
+            self.assertEqual(len(service.map_make_password(["a", "b", "c"])), 3)
+            for _ in range(2):  # both slots were handed back
+                self.assertTrue(service._slots.acquire(blocking=False))
+
+    def test_daemonic_process_hashes_inline(self) -> None:
+        service = PasswordHashingService(max_workers=2)
+        with mock.patch("multiprocessing.current_process") as current_process:
+            current_process.return_value.daemon = True
+            self.assertEqual(service.max_workers, 0)
+            self.assertTrue(service.make_password("secret").startswith("md5$"))
+        self.assertIsNone(service._pool)
+
+    def test_saturated_pool_is_a_503_only_in_the_api(self) -> None:
+        user = make_user()
+        with PasswordHashingService(max_workers=1, max_pending=1) as service, mock.patch(
+            "core_apps.user_auth.models.password_hashing", service
+        ):
+            service._ensure_pool()
+            self.assertTrue(service._slots.acquire(blocking=False))
+            with self.settings(PASSWORD_HASH_ADMISSION_TIMEOUT=0.01):
+                with self.assertRaises(HashingPoolSaturated) as raised:
+                    user.set_password("new-password")
+                self.assertNotIsInstance(raised.exception, APIException)
+
+                class ChangePasswordView(APIView):
+                    permission_classes = []
+
+                    def post(self, request):
+                        user.set_password("new-password")
+                        return Response()
+
+                response = ChangePasswordView.as_view()(RequestFactory().post("/"))
+            service._slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+class WhoAmIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"id": str(request.user.pk)})
+
+
+@override_settings(**TEST_SETTINGS)
+class CustomHeaderMiddlewareTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = make_user()
+
+    def test_anonymous_request_costs_no_auth_queries(self) -> None:
+        with self.assertNumQueries(0):
+            response = self.client.get("/no-such-page/")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("X-Django-User", response)
+
+    def test_session_user_tagged(self) -> None:
+        self.client.force_login(self.user)
+        response = self.client.get("/no-such-page/")
+        self.assertEqual(response["X-Django-User"], self.user.email)
+
+    def test_token_authenticated_request_tagged_from_cached_user(self) -> None:
+        middleware = CustomHeaderMiddleware(WhoAmIView.as_view())
+        token = str(AccessToken.for_user(self.user))
+        middleware(RequestFactory().get("/", HTTP_COOKIE=f"access={token}"))  # fills the user cache
+
+        with self.assertNumQueries(0):
+            response = middleware(RequestFactory().get("/", HTTP_COOKIE=f"access={token}"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Django-User"], self.user.email)
+
+    def test_session_user_tagged_once_resolved(self) -> None:
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("admin:index"))  # the admin reads request.user
+        self.assertEqual(response["X-Django-User"], self.user.email)
@@ -0,0 +1,126 @@
+## This file hands out the system usernames (e.g. NB--00000A3F7) that UserManager stores in User.username. They used to be random characters with no uniqueness check, so the more users we had the
+#  likelier an IntegrityError on the unique index became, and each random value landed at a random spot in that index. Usernames are now numbers from a counter, written in base 36:
+#    - unique by construction: every number is handed out once, so there is no "generate, check, retry" loop
+#    - index friendly: digits sort before letters in ALPHABET and the suffix is zero padded, so new usernames sort after all previous ones and inserts append to the right edge of the index
+#    - cheap: the counter counts blocks of BLOCK_SIZE usernames. A process reserves a block with one nextval() (PostgreSQL sequence, see migration 0003) or one UPDATE of UsernameSequence
+#      (other databases) and then hands the block out from memory. Bulk imports reserve all the blocks they need in one query (allocate_many)
+#  The bank prefix is computed once per process from BANK_NAME. Usernames generated randomly before this existed can still sit in the same space, so each freshly reserved block is checked
+#  against the table with one IN query and any value already taken is dropped from the block.
+
+import os
+import string
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Deque, List, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+
+ALPHABET = string.digits + string.ascii_uppercase
+
+USERNAME_LENGTH = 12      ## prefix + one char of the "--" separator + suffix, same budget generate_username always used
+
+BLOCK_SIZE = 100          ## usernames per counter step. Part of the numbering scheme: changing it on a live database would make new blocks overlap old ones
+
+SEQUENCE_NAME = "user_auth_username_block_seq"
+
+
+@lru_cache(maxsize=None)
+def bank_prefix() -> str:   ## Initials of BANK_NAME, e.g. "Nextgen Bank" -> "NB"
+    words = (os.getenv("BANK_NAME") or "").split()
+    return "".join(word[0] for word in words).upper()
+
+
+def suffix_width(prefix: str) -> int:
+    return USERNAME_LENGTH - len(prefix) - 1
+
+
+def encode(value: int, prefix: Optional[str] = None) -> str:
+    prefix = bank_prefix() if prefix is None else prefix
+    width = suffix_width(prefix)
+
+    if not 0 <= value < len(ALPHABET) ** width:
+        raise OverflowError(f"username number {value} does not fit in {width} characters")
+
+    chars = ["0"] * width
+    for position in range(width - 1, -1, -1):
+        value, digit = divmod(value, len(ALPHABET))
+        chars[position] = ALPHABET[digit]
+
+    return f"{prefix}--{''.join(chars)}"
+
+
+def decode(username: str) -> int:
+    return int(username.rsplit("--", 1)[1], len(ALPHABET))
+
+
+def reserve_blocks(count: int, using: str) -> List[int]:   ## Block numbers, each standing for BLOCK_SIZE usernames. nextval() is not transactional, so a block is never handed out twice even when
+                                                            # the transaction that asked for it rolls back (the block is simply skipped).
+    connection = connections[using]
+
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [SEQUENCE_NAME, count])
+            return [row[0] for row in cursor.fetchall()]
+
+    UsernameSequence = apps.get_model("user_auth", "UsernameSequence")
+    counter = UsernameSequence._default_manager.using(using)
+
+    with transaction.atomic(using=using):
+        counter.get_or_create(name=SEQUENCE_NAME, defaults={"next_value": 1})
+        counter.filter(name=SEQUENCE_NAME).update(next_value=F("next_value") + count)
+        end = counter.filter(name=SEQUENCE_NAME).values_list("next_value", flat=True).get()
+
+    return list(range(end - count, end))
+
+
+class UsernameAllocator:
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._available: Deque[str] = deque()
+        self._pid = os.getpid()    ## a forked child (gunicorn --preload, celery prefork) must not reuse the block its parent was handing out
+
+    def _expand(self, blocks: List[int], using: str) -> List[str]:
+        candidates = [encode(block * BLOCK_SIZE + offset) for block in blocks for offset in range(BLOCK_SIZE)]
+
+        User = apps.get_model(settings.AUTH_USER_MODEL)
+        taken = set(
+            User._default_manager.using(using).filter(username__in=candidates).values_list("username", flat=True)
+        )
+
+        return [username for username in candidates if username not in taken]
+
+    def allocate(self, using: Optional[str] = None) -> str:
+        using = using or router.db_for_write(apps.get_model(settings.AUTH_USER_MODEL))
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._available.clear()
+                self._pid = os.getpid()
+
+            while not self._available:
+                self._available.extend(self._expand(reserve_blocks(1, using), using))
+
+            return self._available.popleft()
+
+    def allocate_many(self, count: int, using: Optional[str] = None) -> List[str]:   ## For bulk imports: reserves every block the batch needs in one query. Whatever is left of the last block is kept
+                                                                                      # for the next single allocate() of this process.
+        using = using or router.db_for_write(apps.get_model(settings.AUTH_USER_MODEL))
+        usernames: List[str] = []
+
+        while len(usernames) < count:
+            missing = count - len(usernames)
+            usernames.extend(self._expand(reserve_blocks(-(-missing // BLOCK_SIZE), using), using))
+
+        with self._lock:
+            if self._pid == os.getpid():
+                self._available.extend(usernames[count:])
+
+        return usernames[:count]
+
+
+username_allocator = UsernameAllocator()
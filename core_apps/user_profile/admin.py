@@ -5,6 +5,8 @@ from django import forms
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+from core_apps.common.admin import ChangeListQueryMixin, SearchMixin
+
 from .models import NextOfKin, Profile
 
 
@@ -26,7 +28,7 @@ class NextOfKinInline(admin.TabularInline):
 
 
 @admin.register(Profile)
-class ProfileAdmin(admin.ModelAdmin):
+class ProfileAdmin(SearchMixin, ChangeListQueryMixin, admin.ModelAdmin):
     form = ProfileAdminForm
     list_display = [
         "user",
@@ -36,14 +38,27 @@ class ProfileAdmin(admin.ModelAdmin):
         "employment_status",
         "photo_preview",
     ]
+    list_select_related = ["user"]
+    list_only = [
+        "title",
+        "phone_number",
+        "employment_status",
+        "photo",
+        "user__email",
+        "user__first_name",
+        "user__last_name",
+        "user__role",
+    ]
     list_display_links = ["user"]
-    list_filter = ["gender", "marital_status", "employment_status", "country"]
+    list_filter = ["kyc_complete", "gender", "marital_status", "employment_status", "country"]
     search_fields = [
         "user__email",
         "user__first_name",
         "user__last_name",
         "phone_number",
     ]
+    search_email_fields = ["user__email"]
+    search_number_fields = ["user__id_no"]
     readonly_fields = ["user"]
     fieldsets = (
         (
@@ -97,11 +112,13 @@ class ProfileAdmin(admin.ModelAdmin):
         return obj.user.full_name
 
     full_name.short_description = _("Full name")
+    full_name.admin_order_field = "user__first_name"
 
     def email(self, obj) -> str:
         return obj.user.email
 
     email.short_description = _("Email")
+    email.admin_order_field = "user__email"
 
     def photo_preview(self, obj) -> str:
         if obj.photo:
@@ -115,12 +132,24 @@ class ProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(NextOfKin)
-class NextOfKinAdmin(admin.ModelAdmin):
+class NextOfKinAdmin(SearchMixin, ChangeListQueryMixin, admin.ModelAdmin):
     list_display = ["full_name", "relationship", "profile", "is_primary"]
+    list_select_related = ["profile__user"]
+    list_only = [
+        "first_name",
+        "last_name",
+        "relationship",
+        "is_primary",
+        "profile__title",
+        "profile__user__first_name",
+        "profile__user__last_name",
+    ]
     list_filter = ["is_primary", "relationship"]
     search_fields = ["first_name", "last_name", "profile__user__email"]
+    search_email_fields = ["email_address", "profile__user__email"]
 
     def full_name(self, obj) -> str:
         return f"{obj.first_name} {obj.last_name}"
 
-    full_name.short_description = _("Full name")
\ No newline at end of file
+    full_name.short_description = _("Full name")
+    full_name.admin_order_field = "first_name"
\ No newline at end of file
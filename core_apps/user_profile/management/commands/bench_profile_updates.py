@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core_apps.user_auth.models import User
+from core_apps.user_profile.models import Profile
+
+
+def legacy_save(profile: Profile) -> None:
+    """Profile.save() before validation was limited to changed fields: full_clean() and a full-row UPDATE."""
+    profile.full_clean()
+    profile.save(
+        update_fields=[field.name for field in profile._meta.concrete_fields if not field.primary_key]
+    )
+
+
+def current_save(profile: Profile) -> None:
+    profile.save()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare queries and throughput of bulk profile updates with full_clean() "
+        "and with validation of changed fields only. Runs in a rolled-back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = options["profiles"]
+
+        with override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]):
+            with transaction.atomic():
+                User.objects.bulk_create_users(
+                    (
+                        {
+                            "email": f"bench.profile.{n}@example.com",
+                            "password": "bench-password",
+                            "first_name": "Bench",
+                            "last_name": f"Profile{n}",
+                            "id_no": 500_000_000 + n,
+                            "security_question": User.SecurityQuestions.MAIDEN_NAME,
+                            "security_answer": "bench",
+                        }
+                        for n in range(count)
+                    ),
+                    hash_workers=0,
+                )
+
+                for label, save in (("full_clean", legacy_save), ("changed", current_save)):
+                    profiles = list(Profile.objects.filter(user__email__startswith="bench.profile."))
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        for n, profile in enumerate(profiles):
+                            profile.city = f"{label} {n}"
+                            profile.phone_number = "+14155552671"
+                            save(profile)
+                        elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{label:>10}: {len(queries) / len(profiles):.2f} queries/save, "
+                        f"{len(profiles) / elapsed:,.0f} saves/s"
+                    )
+
+                transaction.set_rollback(True)
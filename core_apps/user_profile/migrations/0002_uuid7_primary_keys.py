@@ -0,0 +1,34 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:32
+
+import core_apps.common.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_profile", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="nextofkin",
+            name="id",
+            field=models.UUIDField(
+                default=core_apps.common.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="profile",
+            name="id",
+            field=models.UUIDField(
+                default=core_apps.common.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
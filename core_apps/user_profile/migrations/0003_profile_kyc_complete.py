@@ -0,0 +1,67 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:48
+
+from django.db import migrations, models
+from django.db.models import BooleanField, Case, Exists, OuterRef, Q, Value, When
+
+# core_apps.user_profile.models.COMPLETENESS_FIELDS as of this migration.
+COMPLETENESS_FIELDS = (
+    "title",
+    "gender",
+    "date_of_birth",
+    "country_of_birth",
+    "place_of_birth",
+    "marital_status",
+    "means_of_identification",
+    "id_issue_date",
+    "id_expiry_date",
+    "nationality",
+    "phone_number",
+    "address",
+    "city",
+    "country",
+    "employment_status",
+    "photo",
+    "id_photo",
+    "signature_photo",
+)
+
+
+def backfill_kyc_complete(apps, schema_editor):
+    Profile = apps.get_model("user_profile", "Profile")
+    NextOfKin = apps.get_model("user_profile", "NextOfKin")
+
+    filled = Q()
+    for name in COMPLETENESS_FIELDS:
+        filled &= Q(**{f"{name}__isnull": False})
+        if not isinstance(Profile._meta.get_field(name), models.DateField):
+            filled &= ~Q(**{name: ""})
+
+    Profile.objects.using(schema_editor.connection.alias).update(
+        kyc_complete=Case(
+            When(filled & Q(Exists(NextOfKin.objects.filter(profile=OuterRef("pk")))), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_profile", "0002_uuid7_primary_keys"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="kyc_complete",
+            field=models.BooleanField(
+                db_index=True,
+                default=False,
+                editable=False,
+                help_text="Stored copy of is_complete_with_next_of_kin(), kept up to date on save.",
+                verbose_name="KYC Complete",
+            ),
+        ),
+        migrations.RunPython(backfill_kyc_complete, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# GIN trigram indexes on the expressions admin search (icontains) compiles to on
+# PostgreSQL: UPPER("column"::text). pg_trgm comes from user_auth 0005. Other
+# databases are left alone.
+INDEXES = {
+    "user_profile_profile_phone_number_trgm": ("user_profile_profile", "phone_number"),
+    "user_profile_nextofkin_first_name_trgm": ("user_profile_nextofkin", "first_name"),
+    "user_profile_nextofkin_last_name_trgm": ("user_profile_nextofkin", "last_name"),
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, (table, column) in INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} "
+            f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in INDEXES:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("user_auth", "0005_trigram_extension"),
+        ("user_profile", "0003_profile_kyc_complete"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
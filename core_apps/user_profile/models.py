@@ -1,21 +1,82 @@
-from typing import Any
+from typing import Any, Tuple
 
 from cloudinary.models import CloudinaryField
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import BooleanField, Case, Exists, OuterRef, Q, Value, When
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from phonenumber_field.modelfields import PhoneNumberField
 
-from core_apps.common.models import TimeStampedModel
+from core_apps.common.models import DirtyFieldsMixin, TimeStampedModel
 # from core_apps.accounts.models import BankAccount
 
 User = get_user_model()
 
+# Fields that must all be filled in before a profile counts as complete for KYC.
+COMPLETENESS_FIELDS: Tuple[str, ...] = (
+    "title",
+    "gender",
+    "date_of_birth",
+    "country_of_birth",
+    "place_of_birth",
+    "marital_status",
+    "means_of_identification",
+    "id_issue_date",
+    "id_expiry_date",
+    "nationality",
+    "phone_number",
+    "address",
+    "city",
+    "country",
+    "employment_status",
+    "photo",
+    "id_photo",
+    "signature_photo",
+)
 
-class Profile(TimeStampedModel):
+
+def required_fields_filled_q() -> Q:
+    """SQL version of "every COMPLETENESS_FIELDS value is truthy": not NULL, and not '' for text columns."""
+    condition = Q()
+    for name in COMPLETENESS_FIELDS:
+        condition &= Q(**{f"{name}__isnull": False})
+        if not isinstance(Profile._meta.get_field(name), models.DateField):
+            condition &= ~Q(**{name: ""})
+    return condition
+
+
+def completeness_expression() -> Case:
+    return Case(
+        When(
+            required_fields_filled_q() & Q(Exists(NextOfKin.objects.filter(profile=OuterRef("pk")))),
+            then=Value(True),
+        ),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+class ProfileQuerySet(models.QuerySet):
+    def with_completeness(self) -> "ProfileQuerySet":
+        """
+        Annotate ``has_next_of_kin`` and ``is_complete`` (the SQL equivalent of
+        ``is_complete_with_next_of_kin()``), so they can be read or filtered on
+        (``.filter(is_complete=False)``) without a query per profile.
+        """
+        return self.annotate(
+            has_next_of_kin=Exists(NextOfKin.objects.filter(profile=OuterRef("pk"))),
+            is_complete=completeness_expression(),
+        )
+
+    def refresh_kyc_complete(self) -> int:
+        """Recompute the stored ``kyc_complete`` flag of these profiles in one UPDATE."""
+        return self.update(kyc_complete=completeness_expression())
+
+
+class Profile(DirtyFieldsMixin, TimeStampedModel):
     class Salutation(models.TextChoices):
         MR = (
             "mr",
@@ -213,6 +274,15 @@ class Profile(TimeStampedModel):
     signature_photo_url = models.URLField(
         _("Signature Photo URL"), blank=True, null=True
     )
+    kyc_complete = models.BooleanField(
+        _("KYC Complete"),
+        default=False,
+        db_index=True,
+        editable=False,
+        help_text=_("Stored copy of is_complete_with_next_of_kin(), kept up to date on save."),
+    )
+
+    objects = ProfileQuerySet.as_manager()
 
     def clean(self) -> None:
         super().clean()
@@ -221,39 +291,32 @@ class Profile(TimeStampedModel):
                 raise ValidationError(_("ID expiry date must come after issue date."))
 
     def save(self, *args: Any, **kwargs: Any) -> None:
-        self.full_clean()
+        self.clean_changed_fields()
+        changed = set(COMPLETENESS_FIELDS) & set(self.get_dirty_fields())
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            changed &= set(update_fields)
+        if changed:
+            self.kyc_complete = self._required_fields_filled() and (
+                self.kyc_complete or (not self._state.adding and self.next_of_kin.exists())
+            )
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "kyc_complete"}
         super().save(*args, **kwargs)
-        
-        
-    def is_complete_with_next_of_kin(self):
-        required_fields = [
-            self.title,
-            self.gender,
-            self.date_of_birth,
-            self.country_of_birth,
-            self.place_of_birth,
-            self.marital_status,
-            self.means_of_identification,
-            self.id_issue_date,
-            self.id_expiry_date,
-            self.nationality,
-            self.phone_number,
-            self.address,
-            self.city,
-            self.country,
-            self.employment_status,
-            self.photo,
-            self.id_photo,
-            self.signature_photo,
-        ]
 
-        return all(required_fields) and self.next_of_kin.exists()
+    def _required_fields_filled(self) -> bool:
+        return all(getattr(self, name) for name in COMPLETENESS_FIELDS)
+
+    def is_complete_with_next_of_kin(self) -> bool:
+        if hasattr(self, "is_complete"):
+            return self.is_complete
+        return self._required_fields_filled() and self.next_of_kin.exists()
 
     def __str__(self) -> str:
         return f"{self.title} {self.user.first_name}'s Profile"
 
 
-class NextOfKin(TimeStampedModel):
+class NextOfKin(DirtyFieldsMixin, TimeStampedModel):
     class Salutation(models.TextChoices):
         MR = (
             "mr",
@@ -297,18 +360,29 @@ class NextOfKin(TimeStampedModel):
     country = CountryField(_("Country"))
     is_primary = models.BooleanField(_("Is Primary Next of Kin"), default=False)
 
-    def clean(self) -> None:
-        super().clean()
-        if self.is_primary:
-            primary_kin = NextOfKin.objects.filter(
-                profile=self.profile, is_primary=True
-            ).exclude(pk=self.pk)
-            if primary_kin.exists():
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        # The single primary next of kin is enforced by the unique_primary_next_of_kin
+        # index rather than a lookup before every save; a violation is reported as
+        # the same ValidationError full_clean() would give.
+        self.clean_changed_fields()
+        if not self.is_primary or not {"is_primary", "profile"} & set(self.get_dirty_fields()):
+            super().save(*args, **kwargs)
+            return
+        try:
+            with transaction.atomic(using=kwargs.get("using") or router.db_for_write(NextOfKin)):
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            if self._has_other_primary(kwargs.get("using")):
                 raise ValidationError(_("There can only be one primary next of kin."))
+            raise
 
-    def save(self, *args: Any, **kwargs: Any) -> None:
-        self.full_clean()
-        super().save(*args, **kwargs)
+    def _has_other_primary(self, using=None) -> bool:
+        return (
+            NextOfKin.objects.using(using or router.db_for_read(NextOfKin))
+            .filter(profile_id=self.profile_id, is_primary=True)
+            .exclude(pk=self.pk)
+            .exists()
+        )
 
     def __str__(self) -> str:
         return f"{self.first_name} {self.last_name} - Next of Kin for {self.profile.user.full_name}"
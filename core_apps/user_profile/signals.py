@@ -1,12 +1,26 @@
-from typing import Any, Type
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Type
 from django.db.models.base import Model
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from loguru import logger
 
 from config.settings.base import AUTH_USER_MODEL
-from core_apps.user_profile.models import Profile
+from core_apps.user_profile.models import NextOfKin, Profile
+
+_profile_sync_suppressed: ContextVar[bool] = ContextVar("profile_sync_suppressed", default=False)
+
+
+@contextmanager
+def suppress_profile_sync() -> Iterator[None]:
+    """Skip save_user_profile for User saves made inside this block (this thread/task only)."""
+    token = _profile_sync_suppressed.set(True)
+    try:
+        yield
+    finally:
+        _profile_sync_suppressed.reset(token)
 
 
 @receiver(post_save, sender=AUTH_USER_MODEL)
@@ -18,5 +32,32 @@ def create_user_profile(sender: Type[Model], instance: Model, created: bool, **k
 
 
 @receiver(post_save, sender=AUTH_USER_MODEL)
-def save_user_profile(sender: Type[Model], instance: Model, **kwargs: Any) -> None:
-    instance.profile.save()
\ No newline at end of file
+def save_user_profile(sender: Type[Model], instance: Model, created: bool, **kwargs: Any) -> None:
+    # Saving a user only carries along edits made to a profile that is already loaded
+    # on it (user.profile.city = ...; user.save()). The profile is never fetched just
+    # to be saved again, and an unchanged one isn't written. A save() of an unchanged
+    # user writes nothing and sends no post_save, so profile-only edits need
+    # profile.save().
+    if created or kwargs.get("raw") or _profile_sync_suppressed.get():
+        return
+
+    profile = sender.profile.related.get_cached_value(instance, default=None)
+    if profile is not None and profile.is_dirty():
+        profile.save()
+
+
+@receiver(post_save, sender=NextOfKin)
+@receiver(post_delete, sender=NextOfKin)
+def refresh_profile_kyc_complete(sender: Type[Model], instance: NextOfKin, **kwargs: Any) -> None:
+    # Only adding, removing or moving a next of kin can change whether a profile has
+    # one. A move is seen through the loaded values, which DirtyFieldsMixin only
+    # updates after post_save; both the old and the new profile are refreshed.
+    if kwargs.get("raw"):
+        return
+    profile_ids = {instance.profile_id}
+    if kwargs.get("signal") is post_save and not kwargs.get("created"):
+        stored = (getattr(instance, "_loaded_values", None) or {}).get("profile_id", instance.profile_id)
+        if stored == instance.profile_id:
+            return
+        profile_ids.add(stored)
+    Profile.objects.filter(pk__in=profile_ids).refresh_kyc_complete()
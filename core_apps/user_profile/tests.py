@@ -0,0 +1,119 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+
+from core_apps.common.testing import TEST_SETTINGS, make_user, next_of_kin_fields
+from core_apps.user_auth.models import User
+from core_apps.user_profile.models import NextOfKin, Profile
+from core_apps.user_profile.signals import suppress_profile_sync
+
+
+@override_settings(**TEST_SETTINGS)
+class ProfileSaveTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.get(pk=make_user().pk)
+
+    def test_save_writes_changed_columns_and_updated_at(self) -> None:
+        profile = self.user.profile
+        before = profile.updated_at
+        profile.city = "Srinagar"
+        profile.save()
+        profile.refresh_from_db()
+        self.assertEqual(profile.city, "Srinagar")
+        self.assertGreater(profile.updated_at, before)
+
+    def test_loaded_profile_saved_only_when_changed(self) -> None:
+        profile = self.user.profile
+
+        with self.assertNumQueries(0):
+            self.user.save()
+
+        # User UPDATE and Profile UPDATE; only the changed city is validated.
+        self.user.first_name = "Profiled"
+        profile.city = "Srinagar"
+        with self.assertNumQueries(2):
+            self.user.save()
+        profile.refresh_from_db(fields=["city"])
+        self.assertEqual(profile.city, "Srinagar")
+
+        self.user.first_name = "Suppressed"
+        profile.city = "Jammu"
+        with suppress_profile_sync(), self.assertNumQueries(1):
+            self.user.save()
+
+    def test_changed_fields_are_validated(self) -> None:
+        profile = self.user.profile
+        profile.id_expiry_date = date(2020, 1, 1)
+        profile.id_issue_date = date(2021, 1, 1)
+        with self.assertRaises(ValidationError):
+            profile.save()
+
+        profile.refresh_from_db()
+        profile.phone_number = "not a phone number"
+        with self.assertRaises(ValidationError):
+            profile.save()
+
+
+@override_settings(**TEST_SETTINGS)
+class NextOfKinTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = make_user()
+
+    def test_second_primary_next_of_kin_rejected_by_constraint(self) -> None:
+        fields = next_of_kin_fields(self.user.profile)
+        NextOfKin(**fields).save()
+
+        with self.assertRaisesMessage(ValidationError, "only be one primary"):
+            NextOfKin(**fields).save()
+        self.assertEqual(NextOfKin.objects.filter(is_primary=True).count(), 1)
+
+    def test_completeness_in_one_query(self) -> None:
+        make_user(email="other.customer@example.com", id_no=987654321)
+        profile = self.user.profile
+        profile.photo = "bank_photos/photo"
+        profile.id_photo = "bank_photos/id"
+        profile.signature_photo = "bank_photos/signature"
+        profile.save()
+        self.assertFalse(profile.kyc_complete)
+
+        NextOfKin(**next_of_kin_fields(self.user.profile)).save()
+        profile.refresh_from_db()
+        self.assertTrue(profile.kyc_complete)
+
+        with self.assertNumQueries(1):
+            rows = {p.user_id: (p.has_next_of_kin, p.is_complete) for p in Profile.objects.with_completeness()}
+        self.assertEqual(rows[self.user.pk], (True, True))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(
+            list(Profile.objects.with_completeness().filter(is_complete=True).values_list("user_id", flat=True)),
+            [self.user.pk],
+        )
+        self.assertEqual(Profile.objects.filter(kyc_complete=True).count(), 1)
+
+        profile.signature_photo = None
+        profile.save()
+        self.assertFalse(Profile.objects.get(pk=profile.pk).kyc_complete)
+
+        profile.signature_photo = "bank_photos/signature"
+        profile.save(update_fields=["signature_photo"])
+        self.assertTrue(Profile.objects.get(pk=profile.pk).kyc_complete)
+
+    def test_moving_next_of_kin_refreshes_both_profiles(self) -> None:
+        other = make_user(email="other.customer@example.com", id_no=987654321)
+        for profile in (self.user.profile, other.profile):
+            profile.photo = "bank_photos/photo"
+            profile.id_photo = "bank_photos/id"
+            profile.signature_photo = "bank_photos/signature"
+            profile.save()
+        NextOfKin(**next_of_kin_fields(self.user.profile)).save()
+
+        kin = NextOfKin.objects.get(profile=self.user.profile)
+        kin.profile = other.profile
+        kin.save()
+
+        complete = dict(Profile.objects.values_list("user_id", "kyc_complete"))
+        self.assertEqual(complete, {self.user.pk: False, other.pk: True})
@@ -0,0 +1,15 @@
+#!/bin/bash
+
+set -o errexit
+
+set -o pipefail
+
+set -o nounset
+
+## config/wsgi.py and manage.py fall back to config.settings.local, which must never serve production
+export DJANGO_SETTINGS_MODULE="${DJANGO_SETTINGS_MODULE:-config.settings.production}"
+
+## Run once per deploy, as a one-off container, before the new api containers start (make release). The database is migrated forwards while the old code is still serving, so migrations
+#  must keep working with the previous release's code (add columns nullable or with defaults, drop them a release later)
+python manage.py migrate --no-input
+python manage.py collectstatic --no-input
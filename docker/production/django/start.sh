@@ -0,0 +1,13 @@
+#!/bin/bash
+
+set -o errexit
+
+set -o pipefail
+
+set -o nounset
+
+## config/wsgi.py and manage.py fall back to config.settings.local, which must never serve production
+export DJANGO_SETTINGS_MODULE="${DJANGO_SETTINGS_MODULE:-config.settings.production}"
+
+## Only the server starts here. Migrations and collectstatic are a release step (release.sh), run once per deploy before the new containers start, not by every container on every restart
+exec gunicorn config.wsgi:application --config /app/config/gunicorn.py
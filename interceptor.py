@@ -15,33 +15,71 @@
 
 from loguru import logger
 import logging ## importing the built in loggin module(not by loguru)
+import threading
 
 
 # So, if one part of your code or a third-party library uses the standard logging module, and another uses Loguru, their logs will not automatically appear together.
 # This code solves that problem. It defines a special handler (called InterceptHandler) that catches every message sent to the standard logging system and redirects it to Loguru’s logger.
 # In simpler words: It acts like a “bridge” that takes logs from Python’s built-in logging and passes them to Loguru’s logger, so all your logs end up in one consistent format and output.
 
-class InterceptHandler(logging.Handler):
-    
-    def emit(self, record):
-        
+
+_LEVELS = {}   ## stdlib level number -> loguru level name, filled the first time each level is seen. Looking the level up in loguru (and catching the ValueError for levels loguru
+               # doesn't know) on every record was the most expensive part of emit()
+
+_current = threading.local()   ## the stdlib LogRecord being forwarded right now, read by _use_stdlib_caller below
+
+
+def _loguru_level(record):
+
+    try:
+
+        return _LEVELS[record.levelno]
+
+    except KeyError:
+
         try:
-            
+
             level = logger.level(record.levelname).name
-            
-        except:
-            
+
+        except ValueError:   ## a custom stdlib level loguru has no name for: log it by number
+
             level = record.levelno
-            
-        frame, depth = logging.currentframe(), 2
-        
-        while frame.f_code.co_filename == logging.__file__:
-            
-            frame = frame.f_back
-            depth += 1
-            
-        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
-        
-        
-            
-            
\ No newline at end of file
+
+        _LEVELS[record.levelno] = level
+
+        return level
+
+
+def _use_stdlib_caller(loguru_record):   ## The stdlib LogRecord already knows where the message came from (logger name, function, line), so instead of walking the Python stack back
+                                          # out of the logging module on every record, the {name}:{function}:{line} of the loguru record are simply copied from it
+
+    record = getattr(_current, "record", None)
+
+    if record is not None:
+
+        loguru_record["name"] = record.name
+
+        loguru_record["function"] = record.funcName
+
+        loguru_record["line"] = record.lineno
+
+        loguru_record["module"] = record.module
+
+
+_stdlib_logger = logger.patch(_use_stdlib_caller)
+
+
+class InterceptHandler(logging.Handler):   ## Records below the root logger level (LOG_LEVEL in settings, DEBUG by default) are dropped by the logging module before a LogRecord is even
+                                            # created, and loguru drops anything below its lowest sink level before building its own record
+
+    def emit(self, record):
+
+        _current.record = record
+
+        try:
+
+            _stdlib_logger.opt(exception=record.exc_info).log(_loguru_level(record), record.getMessage())
+
+        finally:
+
+            _current.record = None